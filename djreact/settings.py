@@ -50,6 +50,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "rackcity.middleware.AuditLogMiddleware",
 ]
 
 
@@ -126,3 +127,23 @@ ACCOUNT_EMAIL_VERIFICATION = "none"
 
 SECURE_SSL_REDIRECT = True
 SECURE_REDIRECT_EXEMPT = ['localhost', '127.0.0.1']
+
+# A cache shared by all workers (e.g. memcached) can be configured through
+# CACHE_BACKEND and CACHE_LOCATION; defaults to a per-process memory cache.
+# Rack usage reports, PDU port states and change plan diffs are only cached
+# across requests with a shared cache.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
+# Seconds for which PDU port states read from the network controller are reused
+PDU_CACHE_TTL = int(os.environ.get("PDU_CACHE_TTL", 10))
+
+# Whether audit logs are written by a background thread instead of before
+# each response is returned
+AUDIT_LOG_ASYNC = os.environ.get("AUDIT_LOG_ASYNC", "").lower() == "true"
@@ -4,8 +4,10 @@ from .asset_serializers import (
     AssetCPSerializer,
     RecursiveAssetSerializer,
     BulkAssetSerializer,
+    ImportAssetSerializer,
     RecursiveAssetCPSerializer,
     ChassisSerializer,
+    annotate_bulk_asset_relations,
     normalize_bulk_asset_data,
     serialize_power_connections,
 )
@@ -1,6 +1,13 @@
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
-from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import (
+    CharField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Cast, Concat
 from rackcity.models import (
     Asset,
     AssetCP,
@@ -9,14 +16,15 @@ from rackcity.models import (
     NetworkPort,
     NetworkPortCP,
 )
+from rackcity.models.asset import validate_hostname
 from . import SiteSerializer
 from .it_model_serializers import ITModelSerializer
 from .rack_serializers import RackSerializer
 from .change_plan_serializers import GetChangePlanSerializer
-from rackcity.api.serializers.fields import RCIntegerField
-import copy
+from rackcity.api.serializers.fields import PreloadedRelatedField, RCIntegerField
+from rackcity.utils.network_graph_utils import get_network_graph_index
 
-from ...utils.asset_changes_utils import get_changes_on_asset
+from ...utils.asset_changes_utils import get_change_plan_diff, get_changes_on_assets
 
 
 class AssetCPSerializer(serializers.ModelSerializer):
@@ -99,6 +107,36 @@ class AssetSerializer(serializers.ModelSerializer):
         )
 
 
+class ImportAssetSerializer(AssetSerializer):
+    """
+    Validates an asset of a bulk import like AssetSerializer, without
+    running any queries: related objects are looked up in
+    context["preloaded"], owners in context["usernames"], and hostname and
+    asset number uniqueness are left to the import.
+    """
+
+    hostname = serializers.CharField(
+        validators=[validate_hostname], required=False, allow_null=True
+    )
+    asset_number = serializers.IntegerField(
+        min_value=100000, max_value=999999, required=False
+    )
+    model = PreloadedRelatedField()
+    rack = PreloadedRelatedField(allow_null=True, required=False)
+    chassis = PreloadedRelatedField(allow_null=True, required=False)
+    offline_storage_site = PreloadedRelatedField(allow_null=True, required=False)
+    owner = serializers.CharField(
+        max_length=150, allow_null=True, allow_blank=True, required=False
+    )
+
+    def validate_owner(self, value):
+        if value and value not in self.context["usernames"]:
+            raise serializers.ValidationError(
+                "There is no existing user with the username '" + value + "'."
+            )
+        return value
+
+
 class ChassisSerializer(serializers.ModelSerializer):
     """
     Serializers the information we want for a chassis that a blade is in (only used for serializing info to be sent)
@@ -185,6 +223,20 @@ class BladeCPSerializer(serializers.ModelSerializer):
         )
 
 
+class RecursiveAssetListSerializer(serializers.ListSerializer):
+    """
+    Serializes many assets at once. Every relation read by
+    RecursiveAssetSerializer is loaded for the whole page in a fixed number
+    of queries before any asset is serialized, so the number of queries does
+    not grow with the number of assets.
+    """
+
+    def to_representation(self, data):
+        assets = list(data.all() if hasattr(data, "all") else data)
+        prefetch_recursive_asset_relations(assets)
+        return [self.child.to_representation(asset) for asset in assets]
+
+
 class RecursiveAssetSerializer(serializers.ModelSerializer):
     """
     Recursively serializes all fields on Asset model, where model and
@@ -233,12 +285,13 @@ class RecursiveAssetSerializer(serializers.ModelSerializer):
             "display_color",
             "memory_gb",
         )
+        list_serializer_class = RecursiveAssetListSerializer
 
     def get_mac_addresses(self, asset):
         return serialize_mac_addresses(NetworkPort, asset)
 
     def get_network_graph(self, asset):
-        return generate_network_graph(asset)
+        return generate_network_graph(asset, self.context)
 
     def get_power_connections(self, asset):
         return serialize_power_connections(PowerPort, asset)
@@ -350,6 +403,10 @@ class BulkAssetSerializer(serializers.ModelSerializer):
         return self.power_port_connection(asset, port_number=2)
 
     def power_port_connection(self, asset, port_number):
+        annotated_power_port_connection = "power_port_connection_" + str(port_number)
+        if hasattr(asset, annotated_power_port_connection):
+            # annotated by annotate_bulk_asset_relations
+            return getattr(asset, annotated_power_port_connection)
         power_ports = PowerPort.objects.filter(asset=asset.id)
         if not power_ports or len(power_ports) < port_number:
             return None
@@ -423,7 +480,7 @@ class RecursiveAssetCPSerializer(serializers.ModelSerializer):
         return serialize_mac_addresses(NetworkPortCP, assetCP)
 
     def get_network_graph(self, assetCP):
-        return generate_network_graph(assetCP)
+        return generate_network_graph(assetCP, self.context)
 
     def get_power_connections(self, assetCP):
         return serialize_power_connections(PowerPortCP, assetCP)
@@ -441,12 +498,7 @@ class RecursiveAssetCPSerializer(serializers.ModelSerializer):
         return get_offline_storage_site_of_asset(assetCP)
 
     def get_mark_as_cp(self, assetCP):
-        if assetCP.related_asset:
-            return (
-                len(get_changes_on_asset(assetCP.related_asset, assetCP)) > 0
-                or assetCP.is_decommissioned
-            )
-        return True
+        return mark_asset_cp(assetCP, self.context)
 
 
 class GetDecommissionedAssetCPSerializer(serializers.ModelSerializer):
@@ -492,7 +544,7 @@ class GetDecommissionedAssetCPSerializer(serializers.ModelSerializer):
         return get_datacenter_of_asset(assetCP)
 
     def get_network_graph(self, assetCP):
-        return generate_network_graph(assetCP)
+        return generate_network_graph(assetCP, self.context)
 
     def get_decommissioning_user(self, assetCP):
         return assetCP.change_plan.owner.username
@@ -507,12 +559,7 @@ class GetDecommissionedAssetCPSerializer(serializers.ModelSerializer):
         return serialize_network_connections(NetworkPortCP, assetCP)
 
     def get_mark_as_cp(self, assetCP):
-        if assetCP.related_asset:
-            return (
-                    len(get_changes_on_asset(assetCP.related_asset, assetCP)) > 0
-                    or assetCP.is_decommissioned
-            )
-        return True
+        return mark_asset_cp(assetCP, self.context)
 
 def normalize_bulk_asset_data(bulk_asset_data):
     power_connections = {}
@@ -544,13 +591,75 @@ def normalize_bulk_asset_data(bulk_asset_data):
     return bulk_asset_data
 
 
+def prefetch_recursive_asset_relations(assets):
+    """
+    Loads every relation read by RecursiveAssetSerializer for all given
+    assets, using one query per relation rather than queries per asset.
+    """
+    prefetch_related_objects(
+        assets,
+        "model",
+        "rack__datacenter",
+        "effective_site",
+        "chassis__model",
+        "chassis__rack__datacenter",
+        Prefetch("chassis__asset_set", queryset=Asset.objects.select_related("model")),
+        Prefetch("asset_set", queryset=Asset.objects.select_related("model")),
+        Prefetch(
+            "networkport_set",
+            queryset=NetworkPort.objects.select_related("connected_port__asset"),
+        ),
+        Prefetch(
+            "powerport_set",
+            queryset=PowerPort.objects.select_related("power_connection"),
+        ),
+    )
+
+
+def annotate_bulk_asset_relations(assets):
+    """
+    Selects every relation read by BulkAssetSerializer, and annotates the
+    connection of each exported power port, so that assets can be serialized
+    as they are read from the database without queries per asset.
+    """
+    return assets.select_related(
+        "model",
+        "rack__datacenter",
+        "effective_site",
+        "chassis__rack__datacenter",
+    ).annotate(
+        **{
+            "power_port_connection_"
+            + port_name: Subquery(
+                PowerPort.objects.filter(
+                    asset=OuterRef("pk"),
+                    port_name=port_name,
+                    power_connection__isnull=False,
+                )
+                .annotate(
+                    connection=Concat(
+                        "power_connection__left_right",
+                        Cast("power_connection__port_number", CharField()),
+                    )
+                )
+                .values("connection")[:1]
+            )
+            for port_name in ("1", "2")
+        }
+    )
+
+
+def get_ports_of_asset(port_model, asset):
+    """
+    Returns all ports of type port_model on asset. Ports are read through
+    the asset's related manager, so ports already loaded with
+    prefetch_related are reused without another query.
+    """
+    return getattr(asset, port_model._meta.model_name + "_set").all()
+
+
 def serialize_mac_addresses(network_port_model, asset):
-    try:
-        ports = network_port_model.objects.filter(
-            asset=asset.id, change_plan=asset.change_plan.id
-        )
-    except AttributeError:
-        ports = network_port_model.objects.filter(asset=asset.id)
+    ports = get_ports_of_asset(network_port_model, asset)
     mac_addresses = {}
     for port in ports:
         if port.mac_address:
@@ -559,12 +668,7 @@ def serialize_mac_addresses(network_port_model, asset):
 
 
 def serialize_network_connections(network_port_model, asset):
-    try:
-        source_ports = network_port_model.objects.filter(
-            asset=asset.id, change_plan=asset.change_plan.id
-        )
-    except AttributeError:
-        source_ports = network_port_model.objects.filter(asset=asset.id)
+    source_ports = get_ports_of_asset(network_port_model, asset)
     network_connections = []
     for source_port in source_ports:
         if source_port.connected_port:
@@ -579,12 +683,7 @@ def serialize_network_connections(network_port_model, asset):
 
 
 def serialize_power_connections(power_port_model, asset):
-    try:
-        ports = power_port_model.objects.filter(
-            asset=asset.id, change_plan=asset.change_plan.id
-        )
-    except AttributeError:
-        ports = power_port_model.objects.filter(asset=asset.id)
+    ports = get_ports_of_asset(power_port_model, asset)
     power_connections = {}
     for port in ports:
         if port.power_connection:
@@ -595,11 +694,34 @@ def serialize_power_connections(power_port_model, asset):
     return power_connections
 
 
+def mark_asset_cp(asset_cp, context=None):
+    """
+    Returns whether an AssetCP differs from its live asset. When given a
+    serializer context, the diff of the AssetCP's change plan is looked up
+    once and kept in context["change_plan_diff"] for the other AssetCPs.
+    """
+    if not asset_cp.related_asset_id:
+        return True
+    if asset_cp.is_decommissioned:
+        return True
+    if context is None:
+        context = {}
+    if asset_cp.id not in context.get("change_plan_diff", {}):
+        context["change_plan_diff"] = get_change_plan_diff(asset_cp.change_plan)
+    asset_cp_diff = context["change_plan_diff"].get(asset_cp.id)
+    if asset_cp_diff is None:
+        # added to the change plan after its diff was cached
+        changes = get_changes_on_assets([asset_cp])[asset_cp.id]
+    else:
+        changes = asset_cp_diff["changes"]
+    return len(changes) > 0
+
+
 def get_blades_in_chassis(asset):
     if not asset.model.is_blade_chassis():
         return []
 
-    blades = Asset.objects.filter(chassis=asset.id)
+    blades = asset.asset_set.all()
     serializer = BladeSerializer(blades, many=True,)
     return serializer.data
 
@@ -614,137 +736,30 @@ def get_blades_in_chassis_cp(asset_cp):
     return serializer.data
 
 
-def generate_network_graph(asset):
-    try:
-        nodes = []
-        if hasattr(asset, "related_asset") and asset.related_asset:
-
-            route_id = asset.related_asset.id
-        else:
-            route_id = asset.id
-        nodes.append({"id": asset.id, "route_id": route_id, "label": asset.hostname})
-        edges = []
-        # neighbors of distance one
-        change_plan = None
-
-        try:
-            change_plan = asset.change_plan
-        except AttributeError:
-            change_plan = None
-        [nodes, edges] = get_neighbor_assets(
-            asset.hostname, asset.id, nodes, edges, change_plan
+def generate_network_graph(asset, context=None):
+    """
+    Returns the network graph of assets within two hops of the asset. When
+    given a serializer context, the network graph index is looked up once and
+    reused for every asset serialized with that context.
+    """
+    if context is None:
+        context = {}
+    if "network_graph_index" not in context:
+        context["network_graph_index"] = get_network_graph_index(
+            getattr(asset, "change_plan", None)
         )
-
-        # neighbors of distance two
-        nodes_copy = copy.deepcopy(nodes)
-        for node in nodes_copy:
-            # ignore current asset, already found neighbors
-            if node["label"] != asset.hostname:
-                [nodes, edges] = get_neighbor_assets(
-                    node["label"], node["id"], nodes, edges, change_plan
-                )
-        return {"nodes": nodes, "edges": edges}
-    except ObjectDoesNotExist:
-        return
-
-
-def get_neighbor_assets(hostname, asset_id, nodes, edges, change_plan=None):
-    try:
-        source_ports = NetworkPort.objects.filter(asset=asset_id)
-        if change_plan:
-            if AssetCP.objects.filter(change_plan=change_plan, id=asset_id).exists():
-                source_ports = NetworkPortCP.objects.filter(
-                    asset=asset_id, change_plan=change_plan.id
-                )
-        for source_port in source_ports:
-            if source_port.connected_port:
-                destination_port_asset = source_port.connected_port.asset
-                if (
-                    hasattr(destination_port_asset, "related_asset")
-                    and destination_port_asset.related_asset
-                ):
-                    route_id = destination_port_asset.related_asset.id
-                else:
-                    route_id = destination_port_asset.id
-                node = {
-                    "id": destination_port_asset.id,
-                    "route_id": route_id,
-                    "label": destination_port_asset.hostname,
-                }
-                if node not in nodes:
-                    nodes.append(node)
-                edges.append(
-                    {"from": source_port.asset.id, "to": destination_port_asset.id}
-                )
-
-        nodes, edges = add_chassis_to_graph(asset_id, nodes, edges, change_plan)
-        nodes, edges = add_blades_to_graph(asset_id, nodes, edges, change_plan)
-        return nodes, edges
-    except ObjectDoesNotExist:
-        return
-
-
-def add_blades_to_graph(chassis_id, nodes, edges, change_plan=None):
-    if change_plan:
-        blades = AssetCP.objects.filter(chassis=chassis_id, change_plan=change_plan)
-    else:
-        blades = Asset.objects.filter(chassis=chassis_id)
-    for blade in blades:
-        if hasattr(blade, "related_asset") and blade.related_asset:
-            route_id = blade.related_asset.id
-        else:
-            route_id = blade.id
-        node = {
-            "id": blade.id,
-            "route_id": route_id,
-            "label": blade.hostname,
-        }
-        if node not in nodes:
-            nodes.append(node)
-        edges.append({"from": chassis_id, "to": blade.id})
-    return nodes, edges
-
-
-def add_chassis_to_graph(blade_id, nodes, edges, change_plan=None):
-    if change_plan:
-        chassis = AssetCP.objects.get(id=blade_id).chassis
-    else:
-        chassis = Asset.objects.get(id=blade_id).chassis
-    if not chassis:
-        return nodes, edges
-    if hasattr(chassis, "related_asset") and chassis.related_asset:
-        route_id = chassis.related_asset.id
-    else:
-        route_id = chassis.id
-    node = {
-        "id": chassis.id,
-        "route_id": route_id,
-        "label": chassis.hostname,
-    }
-    if node not in nodes:
-        nodes.append(node)
-    edges.append({"from": blade_id, "to": chassis.id})
-    return nodes, edges
+    return context["network_graph_index"].get_neighborhood(asset.id, hops=2)
 
 
 def get_datacenter_of_asset(asset):
-    datacenter = None
-    if asset.rack:
-        datacenter = asset.rack.datacenter
-    if asset.chassis and asset.chassis.rack:
-        datacenter = asset.chassis.rack.datacenter
-    if datacenter:
-        return SiteSerializer(datacenter).data
+    if asset.effective_site_id and not asset.is_offline:
+        return SiteSerializer(asset.effective_site).data
     else:
         return None
 
+
 def get_offline_storage_site_of_asset(asset):
-    offline_storage_site = None
-    if asset.offline_storage_site:
-        offline_storage_site = asset.offline_storage_site
-    if asset.chassis and asset.chassis.offline_storage_site:
-        offline_storage_site = asset.chassis.offline_storage_site
-    if offline_storage_site:
-        return SiteSerializer(offline_storage_site).data
+    if asset.is_offline:
+        return SiteSerializer(asset.effective_site).data
     else:
         return None
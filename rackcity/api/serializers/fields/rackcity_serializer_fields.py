@@ -1,4 +1,4 @@
-from rest_framework.serializers import IntegerField
+from rest_framework.serializers import IntegerField, PrimaryKeyRelatedField
 from rest_framework.fields import lazy_format, MaxValueValidator, MinValueValidator
 
 
@@ -28,3 +28,24 @@ class RCIntegerField(IntegerField):
         except (ValueError, TypeError):
             self.fail("invalid")
         return data
+
+
+class PreloadedRelatedField(PrimaryKeyRelatedField):
+    """
+    A primary key related field that looks related objects up in
+    context["preloaded"][field_name], a dict of objects keyed by id, instead
+    of querying for each one.
+    """
+
+    def get_queryset(self):
+        return None
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return self.context["preloaded"][self.field_name][int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
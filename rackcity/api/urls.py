@@ -34,6 +34,7 @@ urlpatterns = [
     path("assets/pages-offline-storage", views.offline_storage_site_page_count),
     path("assets/fields", views.asset_fields),
     path("assets/asset-number", views.asset_number),
+    path("assets/search", views.asset_search),
     path("assets/decommission", views.decommission_asset),
     path("assets/asset-barcode", views.get_asset_from_barcode),
     path("racks/get", views.rack_get),
@@ -44,6 +45,7 @@ urlpatterns = [
     path("iamadmin", views.i_am_admin),
     path("report/global", views.report_rack_usage_global),
     path("report/datacenter/<int:id>", views.report_rack_usage_datacenter),
+    path("report/history", views.report_rack_usage_history),
     path("usernames", views.usernames),
     path("sites/add", views.site_create),
     path("sites/delete", views.site_delete),
@@ -66,14 +68,19 @@ urlpatterns = [
     path("users/groups", views.all_user_groups),
     path("users/permissions/mine", views.user_get_my_groups),
     path("rack-power/status/<int:id>", views.pdu_power_status),
+    path("rack-power/status-bulk", views.pdu_power_status_bulk),
     path("rack-power/on", views.pdu_power_on),
     path("rack-power/off", views.pdu_power_off),
     path("rack-power/cycle", views.pdu_power_cycle),
     path("rack-power/availability", views.pdu_port_availability),
+    path("rack-power/cache-stats", views.pdu_cache_stats),
     path("chassis-power/status", views.chassis_power_status),
+    path("chassis-power/status-bulk", views.chassis_power_status_bulk),
     path("chassis-power/on", views.chassis_power_on),
     path("chassis-power/off", views.chassis_power_off),
     path("chassis-power/cycle", views.chassis_power_cycle),
+    path("power-batch/start", views.power_batch_start),
+    path("power-batch/status/<str:job_id>", views.power_batch_status),
     path("change-plans/get-many", views.change_plan_many),
     path("change-plans/add", views.change_plan_add),
     path("change-plans/modify", views.change_plan_modify),
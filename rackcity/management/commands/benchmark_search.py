@@ -0,0 +1,195 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+import json
+import statistics
+import time
+from rackcity.models import Asset, AssetID, ITModel, Log, Site
+from rackcity.models.asset import get_available_asset_numbers
+from rackcity.models.model_utils import ModelType
+from rackcity.utils.query_utils import get_filtered_query, get_sorted_query
+from rackcity.utils.search_utils import get_asset_typeahead
+
+# Rows inserted per statement while creating benchmark data
+BENCHMARK_BATCH_SIZE = 10000
+# Objects loaded by each benchmarked query, as on one page of a table
+BENCHMARK_PAGE_SIZE = 10
+VENDORS = ["Dell", "Lenovo", "Cisco", "Supermicro", "Juniper", "Arista"]
+OWNERS = ["admin", "alice", "bob", "carol", "dave"]
+WORDS = ["database", "backup", "web", "cache", "queue", "storage", "build"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times text filters, search filters and typeahead search over "
+        "generated assets and logs. The generated data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--assets", type=int, default=100000)
+        parser.add_argument("--logs", type=int, default=1000000)
+        parser.add_argument(
+            "--runs", type=int, default=5, help="Times to run each query."
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            self.create_assets(options["assets"])
+            self.create_logs(options["logs"])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            self.stdout.write(
+                "Created "
+                + str(options["assets"])
+                + " assets and "
+                + str(options["logs"])
+                + " logs in "
+                + format(time.perf_counter() - start, ".1f")
+                + " s"
+            )
+            for label, get_query in self.get_benchmarks():
+                self.benchmark(label, get_query, options["runs"])
+            transaction.set_rollback(True)
+
+    def create_assets(self, count):
+        site = Site.objects.create(
+            name="Benchmark storage", abbreviation="bnch", is_storage=True
+        )
+        models = ITModel.objects.bulk_create(
+            [
+                ITModel(
+                    vendor=vendor,
+                    model_number="BENCH-" + str(model_index),
+                    height=1,
+                    model_type=ModelType.RACKMOUNT_ASSET.value,
+                )
+                for vendor in VENDORS
+                for model_index in range(10)
+            ]
+        )
+        asset_numbers = get_available_asset_numbers(count)
+        for start in range(0, count, BENCHMARK_BATCH_SIZE):
+            indices = range(start, min(start + BENCHMARK_BATCH_SIZE, count))
+            asset_ids = AssetID.objects.bulk_create([AssetID() for _ in indices])
+            assets = [
+                Asset(
+                    id=asset_id.id,
+                    assetid_ptr_id=asset_id.id,
+                    hostname="benchmark-" + str(index),
+                    asset_number=asset_numbers[index],
+                    owner=OWNERS[index % len(OWNERS)],
+                    comment=" ".join(
+                        [WORDS[index % len(WORDS)], WORDS[index // 7 % len(WORDS)]]
+                    ),
+                    model=models[index % len(models)],
+                    offline_storage_site=site,
+                )
+                for index, asset_id in zip(indices, asset_ids)
+            ]
+            Asset.objects._insert(
+                assets, fields=Asset._meta.local_concrete_fields, using=Asset.objects.db
+            )
+
+    def create_logs(self, count):
+        now = timezone.now()
+        for start in range(0, count, BENCHMARK_BATCH_SIZE):
+            Log.objects.bulk_create(
+                [
+                    Log(
+                        date=now - timedelta(seconds=index),
+                        log_content="["
+                        + str(now - timedelta(seconds=index))
+                        + "] asset "
+                        + str(100000 + index % 900000)
+                        + " (benchmark-"
+                        + str(index % 100000)
+                        + "): user "
+                        + OWNERS[index % len(OWNERS)]
+                        + " modified this asset",
+                    )
+                    for index in range(start, min(start + BENCHMARK_BATCH_SIZE, count))
+                ]
+            )
+
+    def get_benchmarks(self):
+        def get_filtered(object_query, filter_type, value, default_order=None):
+            filter_dict = {"value": value}
+            if filter_type == "text":
+                filter_dict["match_type"] = "contains"
+            field = "hostname" if object_query.model is Asset else "log_content"
+            object_query, _ = get_filtered_query(
+                object_query,
+                {
+                    "filters": [
+                        {
+                            "field": field,
+                            "filter_type": filter_type,
+                            "filter": filter_dict,
+                        }
+                    ]
+                },
+            )
+            object_query, _ = get_sorted_query(
+                object_query, {}, default_order=default_order
+            )
+            return object_query
+
+        return [
+            (
+                "asset text filter",
+                lambda: get_filtered(Asset.objects.all(), "text", "benchmark-4217"),
+            ),
+            (
+                "asset search filter",
+                lambda: get_filtered(Asset.objects.all(), "search", "benchmark 4217"),
+            ),
+            (
+                "asset search filter by model",
+                lambda: get_filtered(Asset.objects.all(), "search", "supermicro"),
+            ),
+            ("asset typeahead", lambda: get_asset_typeahead("benchmark-4217")),
+            (
+                "log text filter",
+                lambda: get_filtered(
+                    Log.objects.all(), "text", "benchmark-4217", "-date"
+                ),
+            ),
+            (
+                "log search filter",
+                lambda: get_filtered(
+                    Log.objects.all(), "search", "benchmark 4217", "-date"
+                ),
+            ),
+        ]
+
+    def benchmark(self, label, get_query, runs):
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            list(get_query()[:BENCHMARK_PAGE_SIZE])
+            durations.append(time.perf_counter() - start)
+        self.stdout.write(
+            label
+            + ": median "
+            + format(statistics.median(durations) * 1000, ".1f")
+            + " ms, indexes: "
+            + (", ".join(self.get_index_names(get_query())) or "none")
+        )
+
+    def get_index_names(self, object_query):
+        sql, params = object_query[:BENCHMARK_PAGE_SIZE].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        index_names = []
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if "Index Name" in node and node["Index Name"] not in index_names:
+                index_names.append(node["Index Name"])
+            nodes.extend(node.get("Plans", []))
+        return index_names
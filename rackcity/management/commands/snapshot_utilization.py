@@ -0,0 +1,54 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+import time
+from rackcity.models import UtilizationSnapshot
+from rackcity.utils.report_utils import take_utilization_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Saves the current rack usage of every datacenter as utilization "
+        "snapshots, for report/history. With --interval, keeps taking "
+        "snapshots until stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Seconds to wait between snapshots; takes one if omitted.",
+        )
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=None,
+            help="Deletes snapshots older than this many days.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            self.take_snapshot(options["keep_days"])
+            if interval is None:
+                return
+            time.sleep(interval)
+
+    def take_snapshot(self, keep_days):
+        now = timezone.now()
+        with transaction.atomic():
+            snapshots = take_utilization_snapshot(now)
+            num_deleted = 0
+            if keep_days is not None:
+                num_deleted, _ = UtilizationSnapshot.objects.filter(
+                    date__lt=now - timedelta(days=keep_days)
+                ).delete()
+        self.stdout.write(
+            "Saved "
+            + str(len(snapshots))
+            + " utilization snapshot rows, deleted "
+            + str(num_deleted)
+            + " old rows."
+        )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from requests.exceptions import ConnectionError
+import time
+from rackcity.models import Rack
+from rackcity.utils.cache_utils import is_cache_shared
+from rackcity.utils.pdu_utils import (
+    get_rack_pdu_ext,
+    get_many_pdu_port_states,
+    get_pdu_cache_stats,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetches the PDU port states of every network controlled rack into "
+        "the PDU cache. With --interval, keeps refreshing them until stopped. "
+        "Needs a cache shared with the web workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Seconds to wait between refreshes; refreshes once if omitted.",
+        )
+
+    def handle(self, *args, **options):
+        if not is_cache_shared():
+            raise CommandError(
+                "The default cache is not shared with the web workers; set "
+                "CACHE_BACKEND to a shared backend such as memcached."
+            )
+        interval = options["interval"]
+        while True:
+            self.warm_pdu_cache()
+            if interval is None:
+                return
+            time.sleep(interval)
+
+    def warm_pdu_cache(self):
+        pdu_exts = [
+            get_rack_pdu_ext(rack, left_right)
+            for rack in Rack.objects.filter(is_network_controlled=True)
+            for left_right in ("L", "R")
+        ]
+        try:
+            get_many_pdu_port_states(pdu_exts, refresh=True)
+        except ConnectionError as error:
+            self.stderr.write(str(error))
+            return
+        stats = get_pdu_cache_stats()
+        self.stdout.write(
+            "Refreshed "
+            + str(len(pdu_exts))
+            + " PDUs. Cache hits: "
+            + str(stats["hits"])
+            + ", misses: "
+            + str(stats["misses"])
+        )
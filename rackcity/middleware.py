@@ -0,0 +1,19 @@
+from rackcity.utils.log_utils import buffer_logs, discard_buffered_logs
+
+
+class AuditLogMiddleware:
+    """
+    Writes the audit logs created while handling a request with one bulk
+    insert once the response is ready, instead of one insert per log. The
+    logs are dropped if the view raises.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffer_logs():
+            return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        discard_buffered_logs()
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rackcity', '0058_auto_20200419_1637'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetNumberReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_number', models.IntegerField(unique=True)),
+                ('reservation_id', models.CharField(db_index=True, max_length=32)),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'asset number reservation',
+                'ordering': ['asset_number'],
+            },
+        ),
+    ]
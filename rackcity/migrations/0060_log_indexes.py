@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rackcity', '0059_assetnumberreservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['date', 'id'], name='log_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['related_asset', 'date', 'id'], name='log_related_asset_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['related_model', 'date', 'id'], name='log_related_model_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['user', 'date', 'id'], name='log_user_date_idx'),
+        ),
+    ]
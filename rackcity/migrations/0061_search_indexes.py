@@ -0,0 +1,71 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:05
+
+from django.db import migrations
+
+# Trigram indexes serve the icontains lookups of text filters, which compare
+# UPPER(column) LIKE UPPER(value)
+TRIGRAM_INDEXES = [
+    ("asset_hostname_trgm_idx", "rackcity_asset", "hostname"),
+    ("asset_owner_trgm_idx", "rackcity_asset", "owner"),
+    ("asset_comment_trgm_idx", "rackcity_asset", "comment"),
+    ("itmodel_vendor_trgm_idx", "rackcity_itmodel", "vendor"),
+    ("itmodel_model_number_trgm_idx", "rackcity_itmodel", "model_number"),
+    ("log_content_trgm_idx", "rackcity_log", "log_content"),
+]
+
+# Search vector indexes serve search filters, and must match
+# rackcity.utils.search_utils.get_search_vector
+SEARCH_INDEXES = [
+    ("asset_search_idx", "rackcity_asset", ["hostname", "owner", "comment"]),
+    ("itmodel_search_idx", "rackcity_itmodel", ["vendor", "model_number"]),
+    ("log_search_idx", "rackcity_log", ["log_content"]),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # pg_trgm ships with PostgreSQL's contrib modules, which some servers
+    # lack; text filters work without the indexes, only slower
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS " + name + " ON " + table
+            + " USING gin (UPPER(" + column + "::text) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute("DROP INDEX CONCURRENTLY IF EXISTS " + name)
+
+
+def create_search_index(name, table, columns):
+    return migrations.RunSQL(
+        "CREATE INDEX CONCURRENTLY " + name + " ON " + table
+        + " USING gin (to_tsvector('simple'::regconfig, "
+        + " || ' ' || ".join("COALESCE(" + column + ", '')" for column in columns)
+        + "))",
+        reverse_sql="DROP INDEX CONCURRENTLY " + name,
+    )
+
+
+class Migration(migrations.Migration):
+
+    # indexes are built concurrently so that tables stay writable meanwhile
+    atomic = False
+
+    dependencies = [
+        ('rackcity', '0060_log_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ] + [
+        create_search_index(name, table, columns)
+        for name, table, columns in SEARCH_INDEXES
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.1.14 on 2026-10-18 11:44
+
+from django.db import migrations, models
+from django.db.models import Case, Exists, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def set_asset_locations(apps, schema_editor):
+    # as rackcity.models.asset.update_asset_locations does
+    Rack = apps.get_model('rackcity', 'Rack')
+    for model_name in ('Asset', 'AssetCP'):
+        model = apps.get_model('rackcity', model_name)
+        chassis = model.objects.filter(pk=OuterRef('chassis_id')).order_by()
+        model.objects.update(
+            effective_site=Coalesce(
+                Subquery(chassis.values('offline_storage_site')[:1]),
+                F('offline_storage_site'),
+                Subquery(chassis.values('rack__datacenter')[:1]),
+                Subquery(
+                    Rack.objects.filter(id=OuterRef('rack_id')).order_by().values('datacenter')[:1]
+                ),
+            ),
+            is_offline=Case(
+                When(offline_storage_site__isnull=False, then=Value(True)),
+                When(
+                    Exists(chassis.filter(offline_storage_site__isnull=False)),
+                    then=Value(True),
+                ),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rackcity', '0061_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='effective_site',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rackcity.site'),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='is_offline',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='assetcp',
+            name='effective_site',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rackcity.site'),
+        ),
+        migrations.AddField(
+            model_name='assetcp',
+            name='is_offline',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['is_offline', 'effective_site'], name='asset_location_idx'),
+        ),
+        migrations.RunPython(set_asset_locations, migrations.RunPython.noop),
+    ]
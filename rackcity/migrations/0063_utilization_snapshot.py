@@ -0,0 +1,38 @@
+# Generated by Django 3.1.14 on 2026-10-18 11:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rackcity', '0062_asset_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UtilizationSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('category', models.CharField(choices=[('datacenter', 'datacenter'), ('vendor', 'vendor'), ('owner', 'owner'), ('model', 'model')], max_length=10)),
+                ('name', models.CharField(blank=True, max_length=301)),
+                ('used_rack_slots', models.PositiveIntegerField()),
+                ('total_rack_slots', models.PositiveIntegerField(default=0)),
+                ('datacenter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rackcity.site')),
+            ],
+            options={
+                'verbose_name': 'utilization snapshot',
+                'ordering': ['date', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='utilizationsnapshot',
+            index=models.Index(fields=['category', 'date'], name='utilization_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='utilizationsnapshot',
+            index=models.Index(fields=['datacenter', 'category', 'date'], name='utilization_datacenter_idx'),
+        ),
+    ]
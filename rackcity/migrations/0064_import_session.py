@@ -0,0 +1,30 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('rackcity', '0063_utilization_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportSession',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('import_id', models.CharField(max_length=32, unique=True)),
+                ('element_type', models.CharField(max_length=50)),
+                ('expires', models.DateTimeField(db_index=True)),
+                ('rows', models.BinaryField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'import session',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:05
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rackcity', '0064_import_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PowerBatchJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=32, unique=True)),
+                ('action', models.CharField(max_length=10)),
+                ('status', models.CharField(max_length=10)),
+                ('results', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'power batch job',
+            },
+        ),
+    ]
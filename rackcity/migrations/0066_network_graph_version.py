@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rackcity', '0065_power_batch_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NetworkGraphVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'network graph version',
+            },
+        ),
+    ]
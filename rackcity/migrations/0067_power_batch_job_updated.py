@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rackcity', '0066_network_graph_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='powerbatchjob',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
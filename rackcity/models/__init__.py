@@ -1,11 +1,16 @@
 from .asset import Asset, AbstractAsset, AssetCP, AssetID, validate_location_type
+from .asset_number_reservation import AssetNumberReservation
+from .import_session import ImportSession
 from .log import Log
 from .it_model import ITModel, validate_ports, validate_height
 from .rack import Rack
 from .site import Site
+from .network_graph_version import NetworkGraphVersion
 from .network_port import NetworkPort, NetworkPortCP
 from .power_port import PowerPort, PowerPortCP
 from .pdu_port import PDUPort, PDUPortCP
 from .decommissioned_asset import DecommissionedAsset
 from .change_plan import ChangePlan
 from .permission import RackCityPermission
+from .power_batch_job import PowerBatchJob
+from .utilization_snapshot import UtilizationSnapshot, UtilizationCategory
@@ -1,24 +1,168 @@
+from .asset_number_reservation import AssetNumberReservation
 from .change_plan import ChangePlan
 from .decommissioned_asset import DecommissionedAsset
 from .it_model import ITModel
 from .rack import Rack
 from .site import Site
+from datetime import timedelta
 from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import Q
+from django.db import connection, models
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from rackcity.models.model_utils import validate_display_color
 from rackcity.models.fields import RCPositiveIntegerField
 import re
+from uuid import uuid4
+
+MIN_ASSET_NUMBER = 100000
+MAX_ASSET_NUMBER = 999999
+# Seconds for which an allocated asset number is held
+ASSET_NUMBER_RESERVATION_TIMEOUT = 10 * 60
+# Rows per INSERT statement when reserving asset numbers
+ASSET_NUMBER_RESERVATION_BATCH_SIZE = 1000
+# Fields derived from the location of an asset, which are not changes of
+# their own
+ASSET_LOCATION_FIELDS = ("effective_site", "is_offline")
 
 
 def get_next_available_asset_number():
-    for asset_number in range(100000, 999999):
-        try:
-            Asset.objects.get(asset_number=asset_number)
-        except ObjectDoesNotExist:
-            return asset_number
+    """
+    Returns the lowest available asset number, without reserving it. Raises
+    ValidationError if there are no asset numbers left.
+    """
+    asset_numbers = get_available_asset_numbers(1)
+    if not asset_numbers:
+        raise ValidationError("There are not enough asset numbers available.")
+    return asset_numbers[0]
+
+
+def get_available_asset_numbers(count, excluded_asset_numbers=()):
+    """
+    Returns up to count of the lowest asset numbers that are not used by an
+    asset, an asset on an open change plan, a decommissioned asset or an
+    unexpired reservation, and are not in excluded_asset_numbers. The gaps
+    between used asset numbers are found with one query.
+    """
+    excluded_asset_numbers = set(excluded_asset_numbers)
+    used_asset_number_queries = [
+        Asset.objects.values("asset_number"),
+        AssetCP.objects.filter(
+            change_plan__execution_time=None, asset_number__isnull=False
+        ).values("asset_number"),
+        DecommissionedAsset.objects.values("asset_number"),
+        AssetNumberReservation.objects.filter(expires__gt=timezone.now()).values(
+            "asset_number"
+        ),
+    ]
+    used_asset_number_sqls = []
+    params = [MIN_ASSET_NUMBER - 1, MAX_ASSET_NUMBER + 1]
+    for query in used_asset_number_queries:
+        sql, query_params = query.order_by().query.sql_with_params()
+        used_asset_number_sqls.append("(" + sql + ")")
+        params.extend(query_params)
+    # every gap holds at least one asset number
+    params.append(count + len(excluded_asset_numbers))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT asset_number + 1, next_asset_number - 1 FROM ("
+            + "SELECT asset_number, LEAD(asset_number) OVER "
+            + "(ORDER BY asset_number) AS next_asset_number FROM ("
+            + " UNION ".join(["SELECT %s", "SELECT %s"] + used_asset_number_sqls)
+            + ") AS used_asset_numbers (asset_number)"
+            + ") AS gaps WHERE next_asset_number > asset_number + 1 "
+            + "ORDER BY asset_number LIMIT %s",
+            params,
+        )
+        gaps = cursor.fetchall()
+    asset_numbers = []
+    for gap_start, gap_end in gaps:
+        for asset_number in range(gap_start, gap_end + 1):
+            if len(asset_numbers) == count:
+                return asset_numbers
+            if asset_number not in excluded_asset_numbers:
+                asset_numbers.append(asset_number)
+    return asset_numbers
+
+
+def reserve_asset_numbers(
+    count, excluded_asset_numbers=(), timeout=ASSET_NUMBER_RESERVATION_TIMEOUT
+):
+    """
+    Reserves count of the lowest available asset numbers for timeout seconds
+    and returns them in increasing order. An asset number is only ever
+    reserved by one request at a time, so concurrent requests never get the
+    same asset numbers. Raises ValidationError if there are not enough asset
+    numbers left.
+    """
+    reservation_id = uuid4().hex
+    expires = timezone.now() + timedelta(seconds=timeout)
+    excluded_asset_numbers = set(excluded_asset_numbers)
+    reserved_asset_numbers = []
+    while len(reserved_asset_numbers) < count:
+        AssetNumberReservation.objects.filter(expires__lte=timezone.now()).delete()
+        asset_numbers = get_available_asset_numbers(
+            count - len(reserved_asset_numbers),
+            excluded_asset_numbers.union(reserved_asset_numbers),
+        )
+        if len(asset_numbers) < count - len(reserved_asset_numbers):
+            raise ValidationError("There are not enough asset numbers available.")
+        # asset numbers reserved by a concurrent request in the meantime are
+        # skipped, and replaced on the next pass
+        AssetNumberReservation.objects.bulk_create(
+            [
+                AssetNumberReservation(
+                    asset_number=asset_number,
+                    reservation_id=reservation_id,
+                    expires=expires,
+                )
+                for asset_number in asset_numbers
+            ],
+            batch_size=ASSET_NUMBER_RESERVATION_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        reserved_asset_numbers = list(
+            AssetNumberReservation.objects.filter(
+                reservation_id=reservation_id
+            ).values_list("asset_number", flat=True)
+        )
+    return reserved_asset_numbers
+
+
+def release_asset_numbers(asset_numbers):
+    """
+    Deletes the reservations of asset numbers that assets now use.
+    """
+    AssetNumberReservation.objects.filter(asset_number__in=asset_numbers).delete()
+
+
+def insert_assets(assets, batch_size):
+    """
+    Inserts the rows of new assets whose AssetID parent rows already exist,
+    batch_size rows per INSERT, and releases the reservations of their asset
+    numbers. bulk_create does not support multi-table inheritance, so this
+    is the one place that inserts asset rows directly. Like bulk_create, it
+    skips save(), its validation and its signals: callers validate the
+    assets first and record the changes to them.
+    """
+    for start in range(0, len(assets), batch_size):
+        Asset.objects._insert(
+            assets[start : start + batch_size],
+            fields=Asset._meta.local_concrete_fields,
+            using=Asset.objects.db,
+        )
+    release_asset_numbers([asset.asset_number for asset in assets])
 
 
 def get_assets_for_cp(change_plan, show_decommissioned=False):
@@ -32,14 +176,29 @@ def get_assets_for_cp(change_plan, show_decommissioned=False):
     if change_plan is None:
         return (assets, None)
     assetsCP = AssetCP.objects.filter(change_plan=change_plan)
-    for assetCP in assetsCP:
-        if (assetCP.related_asset) and (assetCP.related_asset) in assets:
-            assets = assets.filter(~Q(id=assetCP.related_asset.id))
+    assets = exclude_assets_modified_in_cp(assets, assetsCP)
     if not show_decommissioned:
         assetsCP = assetsCP.filter(is_decommissioned=False)
     return (assets, assetsCP)
 
 
+def exclude_assets_modified_in_cp(assets, assets_cp):
+    """
+    Removes every asset that has a related AssetCP in assets_cp from the Asset
+    query, using a single subquery so that no query is run until the
+    returned query is evaluated.
+    """
+    return assets.filter(
+        ~Q(
+            id__in=Subquery(
+                assets_cp.filter(related_asset__isnull=False).values(
+                    "related_asset_id"
+                )
+            )
+        )
+    )
+
+
 def validate_hostname(value):
     hostname_pattern = re.compile("[A-Za-z]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?")
     if value and hostname_pattern.fullmatch(value) is None:
@@ -150,6 +309,53 @@ def validate_location_type(
             )
 
 
+def get_asset_location(asset):
+    """
+    Returns the id of the site an asset is in and whether the site is
+    offline storage, from its location fields. Blades in a chassis are where
+    the chassis is, unless only the blade is in offline storage.
+    """
+    if asset.chassis_id:
+        chassis = asset.chassis
+        if chassis.is_offline or not asset.offline_storage_site_id:
+            return chassis.effective_site_id, chassis.is_offline
+    if asset.offline_storage_site_id:
+        return asset.offline_storage_site_id, True
+    if asset.rack_id:
+        return asset.rack.datacenter_id, False
+    return None, False
+
+
+def update_asset_locations(assets):
+    """
+    Sets the effective site and offline flag of assets, a queryset of Asset
+    or AssetCP, from their location fields and those of their chassis with
+    one query, as get_asset_location does.
+    """
+    chassis = assets.model.objects.filter(pk=OuterRef("chassis_id")).order_by()
+    assets.update(
+        effective_site=Coalesce(
+            Subquery(chassis.values("offline_storage_site")[:1]),
+            F("offline_storage_site"),
+            Subquery(chassis.values("rack__datacenter")[:1]),
+            Subquery(
+                Rack.objects.filter(id=OuterRef("rack_id"))
+                .order_by()
+                .values("datacenter")[:1]
+            ),
+        ),
+        is_offline=Case(
+            When(offline_storage_site__isnull=False, then=Value(True)),
+            When(
+                Exists(chassis.filter(offline_storage_site__isnull=False)),
+                then=Value(True),
+            ),
+            default=Value(False),
+            output_field=models.BooleanField(),
+        ),
+    )
+
+
 class AssetID(models.Model):
     id = models.AutoField(primary_key=True)
 
@@ -174,10 +380,29 @@ class AbstractAsset(AssetID):
         null=True,
         blank=True,
     )
+    # maintained from the location fields on save and by
+    # update_asset_locations, so that assets can be filtered by site without
+    # joining their chassis and rack
+    effective_site = models.ForeignKey(
+        Site,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    is_offline = models.BooleanField(default=False, editable=False)
 
     class Meta:
         abstract = True
 
+    def set_location(self):
+        self.effective_site_id, self.is_offline = get_asset_location(self)
+
+    def update_blade_locations(self):
+        if self.model and self.model.is_blade_chassis():
+            update_asset_locations(type(self).objects.filter(chassis=self))
+
 
 class Asset(AbstractAsset):
     hostname = models.CharField(
@@ -213,6 +438,11 @@ class Asset(AbstractAsset):
     class Meta:
         ordering = ["asset_number"]
         verbose_name = "asset"
+        indexes = [
+            models.Index(
+                fields=["is_offline", "effective_site"], name="asset_location_idx"
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         try:
@@ -232,7 +462,9 @@ class Asset(AbstractAsset):
         else:
             if self.asset_number is None:
                 self.asset_number = get_next_available_asset_number()
+            self.set_location()
             super(Asset, self).save(*args, **kwargs)
+            self.update_blade_locations()
             self.add_network_ports()
             self.add_power_ports()
 
@@ -376,7 +608,9 @@ class AssetCP(AbstractAsset):
         except ValidationError as valid_error:
             raise valid_error
         else:
+            self.set_location()
             super(AssetCP, self).save(*args, **kwargs)
+            self.update_blade_locations()
             self.add_network_ports()
 
             self.add_power_ports()
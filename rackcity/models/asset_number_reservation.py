@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class AssetNumberReservation(models.Model):
+    """
+    An asset number held for an asset that is about to be created, so that
+    it is not suggested or allocated to anyone else until it expires.
+    """
+
+    asset_number = models.IntegerField(unique=True)
+    reservation_id = models.CharField(max_length=32, db_index=True)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["asset_number"]
+        verbose_name = "asset number reservation"
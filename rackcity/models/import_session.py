@@ -0,0 +1,18 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+
+class ImportSession(models.Model):
+    """
+    The compressed rows of a bulk upload that modify existing records, kept
+    until the user who uploaded them approves them or they expire.
+    """
+
+    import_id = models.CharField(max_length=32, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    element_type = models.CharField(max_length=50)
+    expires = models.DateTimeField(db_index=True)
+    rows = models.BinaryField()
+
+    class Meta:
+        verbose_name = "import session"
@@ -24,3 +24,17 @@ class Log(models.Model):
         null=True,
         blank=True,
     )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "id"], name="log_date_idx"),
+            models.Index(
+                fields=["related_asset", "date", "id"],
+                name="log_related_asset_date_idx",
+            ),
+            models.Index(
+                fields=["related_model", "date", "id"],
+                name="log_related_model_date_idx",
+            ),
+            models.Index(fields=["user", "date", "id"], name="log_user_date_idx"),
+        ]
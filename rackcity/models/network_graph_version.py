@@ -0,0 +1,13 @@
+from django.db import models
+
+
+class NetworkGraphVersion(models.Model):
+    """
+    A single row counting the committed changes to the network graph, so
+    every worker can tell when its network graph index is out of date.
+    """
+
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "network graph version"
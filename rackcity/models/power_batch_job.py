@@ -0,0 +1,19 @@
+from django.contrib.postgres.fields import JSONField
+from django.db import models
+
+
+class PowerBatchJob(models.Model):
+    """
+    Progress and per-port results of a batch power operation, which any
+    worker can look up while the operation runs in the background.
+    """
+
+    job_id = models.CharField(max_length=32, unique=True)
+    action = models.CharField(max_length=10)
+    status = models.CharField(max_length=10)
+    results = JSONField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "power batch job"
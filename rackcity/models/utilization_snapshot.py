@@ -0,0 +1,41 @@
+from django.db import models
+from enum import Enum
+from .site import Site
+
+
+class UtilizationCategory(Enum):
+    DATACENTER = "datacenter"
+    VENDOR = "vendor"
+    OWNER = "owner"
+    MODEL = "model"
+
+
+UTILIZATION_CATEGORY_CHOICES = [
+    (category.value, category.value) for category in UtilizationCategory
+]
+
+
+class UtilizationSnapshot(models.Model):
+    """
+    The rack slots of a datacenter used by one vendor, owner or model, or by
+    all of its racked assets, when a snapshot of rack usage was taken. Only
+    datacenter rows record the rack slots of the datacenter.
+    """
+
+    date = models.DateTimeField()
+    datacenter = models.ForeignKey(Site, on_delete=models.CASCADE, related_name="+")
+    category = models.CharField(max_length=10, choices=UTILIZATION_CATEGORY_CHOICES)
+    name = models.CharField(max_length=301, blank=True)
+    used_rack_slots = models.PositiveIntegerField()
+    total_rack_slots = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["date", "id"]
+        verbose_name = "utilization snapshot"
+        indexes = [
+            models.Index(fields=["category", "date"], name="utilization_category_idx"),
+            models.Index(
+                fields=["datacenter", "category", "date"],
+                name="utilization_datacenter_idx",
+            ),
+        ]
@@ -1,3 +1,2046 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    override_settings,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import gzip
+import json
+import os
+import requests
+from rest_framework.test import APIClient
+import sys
+import tempfile
+import threading
+from unittest import mock
+from rackcity.utils.bcman_utils import (
+    BCMANSession,
+    BCMANSessionPool,
+    get_bcman_blade_power_states,
+    make_bcman_request,
+)
+from rackcity.api.serializers import (
+    BulkAssetSerializer,
+    normalize_bulk_asset_data,
+    RecursiveAssetSerializer,
+)
+from rackcity.middleware import AuditLogMiddleware
+from rackcity.models import (
+    Asset,
+    AssetCP,
+    AssetNumberReservation,
+    ChangePlan,
+    DecommissionedAsset,
+    ImportSession,
+    ITModel,
+    Log,
+    NetworkPort,
+    NetworkPortCP,
+    PDUPort,
+    PDUPortCP,
+    PowerBatchJob,
+    PowerPort,
+    PowerPortCP,
+    Rack,
+    Site,
+)
+from rackcity.models.asset import (
+    get_assets_for_cp,
+    get_next_available_asset_number,
+    release_asset_numbers,
+    reserve_asset_numbers,
+    update_asset_locations,
+)
+from rackcity.models.model_utils import DEFAULT_DISPLAY_COLOR, ModelType
+from rackcity.utils.asset_changes_utils import (
+    compute_change_plan_diff,
+    get_change_plan_diff,
+)
+from rackcity.utils.asset_import_utils import (
+    AssetImport,
+    approve_asset_modifications,
+)
+from rackcity.utils.change_planner_utils import (
+    detect_conflicts_cp,
+    get_racked_assets_for_cp,
+)
+from rackcity.utils.exceptions import ImportSessionException, LocationException
+from rackcity.utils.import_session_utils import (
+    IMPORT_SESSION_MAX_BYTES,
+    pop_staged_rows,
+    stage_import,
+)
+from rackcity.utils.log_utils import (
+    Action,
+    ElementType,
+    buffer_logs,
+    log_action,
+    log_delete,
+)
+from rackcity.utils.network_graph_utils import (
+    get_network_graph_index,
+    get_network_graph_version,
+    increment_network_graph_version,
+    live_network_graph_index,
+)
+from rackcity.utils.pdu_utils import (
+    get_pdu_cache_stats,
+    get_pdu_port_states,
+    invalidate_pdu_port_states,
+    parse_pdu_port_states,
+    pdu_session,
+    set_pdu_port_power,
+)
+from rackcity.utils.power_job_utils import (
+    get_power_job,
+    POWER_JOB_STALE_ERROR,
+    POWER_JOB_STALE_TIMEOUT,
+    PowerJob,
+)
+from rackcity.utils.query_utils import (
+    assets_offline_queryset,
+    assets_online_queryset,
+    get_filtered_query,
+    get_merged_page,
+)
+from rackcity.utils.rack_utils import get_rack_elevation_response
+from rackcity.utils.report_utils import take_utilization_snapshot
+from rackcity.utils.rackcity_utils import validate_asset_location_in_rack
+from rackcity.views.power_views import get_pdu_power_status
 
-# Create your tests here.
+
+class RecursiveAssetSerializerQueryTests(TestCase):
+    """
+    Serializing a page of assets must take a fixed number of queries,
+    however many assets, ports, connections and blades are on the page.
+    """
+
+    QUERY_BUDGET = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research Triangle")
+        cls.rack = Rack.objects.create(
+            datacenter=datacenter, row_letter="A", rack_num=1
+        )
+        cls.server_model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R710",
+            height=1,
+            network_ports=["eth0", "eth1"],
+            num_power_ports=2,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        cls.chassis_model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="M1000e",
+            height=2,
+            num_power_ports=2,
+            model_type=ModelType.BLADE_CHASSIS.value,
+        )
+        cls.blade_model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="M610",
+            model_type=ModelType.BLADE_ASSET.value,
+        )
+        cls.next_position = 1
+
+    def add_page(self, size):
+        previous_server = None
+        for index in range(size):
+            server = Asset.objects.create(
+                hostname="server" + str(self.next_position),
+                model=self.server_model,
+                rack=self.rack,
+                rack_position=self.next_position,
+            )
+            self.next_position += 1
+            if previous_server:
+                NetworkPort.objects.get(
+                    asset=server, port_name="eth0"
+                ).create_network_connection(
+                    NetworkPort.objects.get(asset=previous_server, port_name="eth1")
+                )
+            previous_server = server
+            chassis = Asset.objects.create(
+                hostname="chassis" + str(self.next_position),
+                model=self.chassis_model,
+                rack=self.rack,
+                rack_position=self.next_position,
+            )
+            self.next_position += 2
+            for slot in range(1, 3):
+                Asset.objects.create(
+                    hostname="blade" + str(chassis.id) + "s" + str(slot),
+                    model=self.blade_model,
+                    chassis=chassis,
+                    chassis_slot=slot,
+                )
+
+    def count_serialization_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            RecursiveAssetSerializer(Asset.objects.all(), many=True).data
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.add_page(2)
+        small_page_queries = self.count_serialization_queries()
+        self.add_page(6)
+        large_page_queries = self.count_serialization_queries()
+        self.assertEqual(small_page_queries, large_page_queries)
+        self.assertLessEqual(large_page_queries, self.QUERY_BUDGET)
+
+
+class NetworkGraphIndexTests(TransactionTestCase):
+    def setUp(self):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research")
+        self.rack = Rack.objects.create(
+            datacenter=datacenter, row_letter="A", rack_num=1
+        )
+        self.model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R710",
+            height=1,
+            network_ports=["eth0"],
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        self.server = Asset.objects.create(
+            hostname="server1", model=self.model, rack=self.rack, rack_position=1
+        )
+        # the database of an earlier test may have had the same version
+        live_network_graph_index.is_built = False
+        get_network_graph_index()
+
+    def create_connected_server(self):
+        server = Asset.objects.create(
+            hostname="server2", model=self.model, rack=self.rack, rack_position=2
+        )
+        NetworkPort.objects.get(asset=server).create_network_connection(
+            NetworkPort.objects.get(asset=self.server)
+        )
+        return server
+
+    def test_committed_change_updates_index(self):
+        with transaction.atomic():
+            server = self.create_connected_server()
+        with self.assertNumQueries(1):
+            index = get_network_graph_index()
+        self.assertIs(index, live_network_graph_index)
+        self.assertEqual(index.get_connected_asset_ids(self.server.id), [server.id])
+
+    def test_rolled_back_change_is_dropped(self):
+        try:
+            with transaction.atomic():
+                server = self.create_connected_server()
+                # pending changes are applied to a copy, not rebuilt
+                with self.assertNumQueries(1):
+                    index = get_network_graph_index()
+                self.assertIsNot(index, live_network_graph_index)
+                self.assertIsNone(live_network_graph_index.get_node(server.id))
+                self.assertEqual(
+                    index.get_connected_asset_ids(self.server.id), [server.id]
+                )
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with self.assertNumQueries(1):
+            index = get_network_graph_index()
+        self.assertIsNone(index.get_node(server.id))
+        self.assertEqual(index.get_connected_asset_ids(self.server.id), [])
+
+    def test_version_is_incremented_on_commit(self):
+        version = get_network_graph_version()
+        with transaction.atomic():
+            self.create_connected_server()
+            self.assertEqual(get_network_graph_version(), version)
+        self.assertEqual(get_network_graph_version(), version + 1)
+        self.assertEqual(live_network_graph_index.version, version + 1)
+
+    def test_change_from_other_process_rebuilds_index(self):
+        increment_network_graph_version()
+        with self.assertNumQueries(3):
+            get_network_graph_index()
+        with self.assertNumQueries(1):
+            get_network_graph_index()
+
+
+class RackLocationValidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research Triangle")
+        cls.rack = Rack.objects.create(datacenter=datacenter, row_letter="B", rack_num=2)
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=2,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        cls.asset = Asset.objects.create(
+            hostname="server1", model=model, rack=cls.rack, rack_position=10
+        )
+        for rack_position in range(20, 40, 2):
+            Asset.objects.create(model=model, rack=cls.rack, rack_position=rack_position)
+
+    def test_overlapping_location_conflicts(self):
+        with self.assertRaisesMessage(
+            LocationException, str(self.asset.asset_number)
+        ):
+            validate_asset_location_in_rack(self.rack.id, 11, 1)
+
+    def test_adjacent_location_and_own_location_do_not_conflict(self):
+        with self.assertNumQueries(2):
+            validate_asset_location_in_rack(self.rack.id, 12, 1)
+        validate_asset_location_in_rack(self.rack.id, 11, 1, asset_id=self.asset.id)
+
+    def test_location_outside_of_rack(self):
+        with self.assertRaisesMessage(LocationException, "outside of rack"):
+            validate_asset_location_in_rack(self.rack.id, 42, 2)
+
+
+class ChangePlanAssetsQueryTests(TestCase):
+    NUM_ASSETS = 40
+    NUM_MODIFIED = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research Triangle")
+        rack = Rack.objects.create(datacenter=datacenter, row_letter="C", rack_num=3)
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        owner = User.objects.create(username="planner")
+        cls.change_plan = ChangePlan.objects.create(name="plan", owner=owner)
+        cls.modified_ids = set()
+        for rack_position in range(1, cls.NUM_ASSETS + 1):
+            asset = Asset.objects.create(
+                model=model, rack=rack, rack_position=rack_position
+            )
+            if rack_position <= cls.NUM_MODIFIED:
+                AssetCP.objects.create(
+                    related_asset=asset,
+                    change_plan=cls.change_plan,
+                    model=model,
+                    rack=rack,
+                    rack_position=rack_position,
+                    is_decommissioned=rack_position == 1,
+                )
+                cls.modified_ids.add(asset.id)
+
+    def assert_overlay(self, assets, assets_cp):
+        self.assertEqual(len(assets), self.NUM_ASSETS - self.NUM_MODIFIED)
+        self.assertFalse(self.modified_ids & {asset.id for asset in assets})
+        self.assertEqual(len(assets_cp), self.NUM_MODIFIED - 1)
+
+    def test_assets_for_cp_queries_do_not_grow_with_plan(self):
+        with self.assertNumQueries(2):
+            assets, assets_cp = get_assets_for_cp(self.change_plan)
+            self.assert_overlay(list(assets), list(assets_cp))
+
+    def test_racked_assets_for_cp_queries_do_not_grow_with_plan(self):
+        with self.assertNumQueries(2):
+            assets, assets_cp = get_racked_assets_for_cp(self.change_plan)
+            self.assert_overlay(list(assets), list(assets_cp))
+
+    def test_merged_page_sorts_across_live_and_plan_assets(self):
+        assets, assets_cp = get_racked_assets_for_cp(self.change_plan)
+        data = {"sort_by": [{"field": "rack_position", "ascending": False}]}
+        with self.assertNumQueries(3):
+            page = get_merged_page([assets_cp, assets], data, "asset_number", 2, 10)
+        self.assertEqual(
+            [(type(asset), asset.rack_position) for asset in page],
+            [(Asset, position) for position in range(30, 25, -1)]
+            + [(AssetCP, position) for position in range(25, 20, -1)],
+        )
+        with self.assertRaisesMessage(Exception, "does not exist"):
+            get_merged_page([assets_cp, assets], data, "asset_number", 6, 10)
+
+    def test_merged_page_sorts_by_json_keys_of_decommissioned_assets(self):
+        for asset_number, vendor in ((100001, "HP"), (100002, "Apple")):
+            DecommissionedAsset.objects.create(
+                live_id=asset_number,
+                decommissioning_user="planner",
+                asset_number=asset_number,
+                model={"vendor": vendor, "model_number": "X"},
+                power_connections={},
+                network_connections=[],
+                network_graph={},
+            )
+        assets_cp = AssetCP.objects.filter(
+            change_plan=self.change_plan, rack_position__lte=2
+        )
+        data = {"sort_by": [{"field": "model__vendor", "ascending": True}]}
+        page = get_merged_page(
+            [assets_cp, DecommissionedAsset.objects.all()], data, "asset_number"
+        )
+        self.assertEqual(
+            [
+                asset.model["vendor"]
+                if isinstance(asset, DecommissionedAsset)
+                else asset.model.vendor
+                for asset in page
+            ],
+            ["Apple", "Dell", "Dell", "HP"],
+        )
+
+    def test_rack_elevation_loads_all_racks_at_once(self):
+        with self.assertNumQueries(3):
+            response = get_rack_elevation_response(
+                Rack.objects.all(), self.change_plan
+            )
+        (rack,) = json.loads(response.content)["racks"]
+        self.assertEqual(
+            [
+                (slot["rack_position"], slot["is_change_plan"])
+                for slot in rack["assets"]
+            ],
+            [(position, position <= self.NUM_MODIFIED) for position in range(2, 41)],
+        )
+
+
+class AssetImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research Triangle")
+        Rack.objects.create(datacenter=datacenter, row_letter="A", rack_num=1)
+        ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=2,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+            network_ports=["eth0", "eth1"],
+            num_power_ports=2,
+        )
+        ITModel.objects.create(
+            vendor="Dell",
+            model_number="M1000e",
+            height=10,
+            model_type=ModelType.BLADE_CHASSIS.value,
+        )
+        ITModel.objects.create(
+            vendor="Dell",
+            model_number="M630",
+            model_type=ModelType.BLADE_ASSET.value,
+            num_power_ports=0,
+        )
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+
+    def get_asset_datas(self, num_servers):
+        asset_datas = [
+            {
+                "vendor": "Dell",
+                "model_number": "R720",
+                "datacenter": "RTP1",
+                "rack": "A1",
+                "rack_position": str(1 + 2 * index),
+                "hostname": "server" + str(index),
+                "power_port_connection_1": "L" + str(index + 1),
+            }
+            for index in range(num_servers)
+        ] + [
+            {
+                "asset_number": "300000",
+                "vendor": "Dell",
+                "model_number": "M1000e",
+                "datacenter": "RTP1",
+                "rack": "A1",
+                "rack_position": "30",
+            },
+            {
+                "vendor": "Dell",
+                "model_number": "M630",
+                "chassis_number": "300000",
+                "chassis_slot": "1",
+            },
+        ]
+        return [
+            normalize_bulk_asset_data(
+                dict(dict.fromkeys(BulkAssetSerializer.Meta.fields, ""), **data)
+            )
+            for data in asset_datas
+        ]
+
+    def run_import(self, num_servers):
+        asset_import = AssetImport(self.user, self.get_asset_datas(num_servers))
+        with CaptureQueriesContext(connection) as context:
+            self.assertIsNone(asset_import.validate())
+            num_added, warning_message = asset_import.add_assets()
+        self.assertEqual(num_added, num_servers + 2)
+        self.assertEqual(warning_message, "")
+        return len(context.captured_queries)
+
+    def delete_assets(self):
+        Asset.objects.filter(chassis__isnull=False).delete()
+        Asset.objects.all().delete()
+
+    def test_import_queries_do_not_grow_with_import_size(self):
+        num_queries = self.run_import(2)
+        self.delete_assets()
+        self.assertEqual(self.run_import(12), num_queries)
+
+    def test_blade_is_placed_in_chassis_from_same_import(self):
+        self.run_import(1)
+        blade = Asset.objects.get(model__model_number="M630")
+        self.assertEqual(blade.chassis.asset_number, 300000)
+        self.assertFalse(AssetNumberReservation.objects.exists())
+        server = Asset.objects.get(hostname="server0")
+        self.assertEqual(NetworkPort.objects.filter(asset=server).count(), 2)
+        power_port = PowerPort.objects.get(asset=server, port_name="1")
+        self.assertEqual(power_port.power_connection.port_number, 1)
+
+    def test_approved_modifications_are_applied_from_staged_import(self):
+        self.run_import(2)
+        asset_datas = self.get_asset_datas(2)[:2]
+        for asset_data, asset in zip(asset_datas, Asset.objects.order_by("id")):
+            asset_data["asset_number"] = str(asset.asset_number)
+            asset_data["comment"] = "moved"
+            asset_data["power_connections"] = {
+                "2": {"left_right": "R", "port_number": asset.rack_position}
+            }
+        asset_import = AssetImport(self.user, asset_datas)
+        self.assertIsNone(asset_import.validate())
+        asset_import.get_modifications_to_approve()
+        import_id = stage_import(
+            self.user, ElementType.ASSET, asset_import.staged_modifications
+        )
+        approved_id = Asset.objects.get(hostname="server1").id
+        with self.assertRaises(ImportSessionException):
+            pop_staged_rows(self.user, ElementType.MODEL, import_id, [approved_id])
+        staged_rows = pop_staged_rows(
+            self.user, ElementType.ASSET, import_id, [approved_id]
+        )
+        with self.assertNumQueries(9):
+            self.assertEqual(approve_asset_modifications(staged_rows), "")
+        self.assertEqual(
+            list(Asset.objects.order_by("id").values_list("comment", flat=True)),
+            ["", "moved", "", ""],
+        )
+        power_port = PowerPort.objects.get(asset_id=approved_id, port_name="2")
+        self.assertEqual(power_port.power_connection.left_right, "R")
+        with self.assertRaises(ImportSessionException):
+            pop_staged_rows(self.user, ElementType.ASSET, import_id, [approved_id])
+
+
+class ImportSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+        cls.other_user = User.objects.create(username="other")
+
+    def test_session_belongs_to_its_user(self):
+        import_id = stage_import(self.user, ElementType.MODEL, {1: {"height": 2}})
+        with self.assertRaises(ImportSessionException):
+            pop_staged_rows(self.other_user, ElementType.MODEL, import_id, [1])
+        self.assertEqual(
+            pop_staged_rows(self.user, ElementType.MODEL, import_id, [1]),
+            [{"height": 2}],
+        )
+        self.assertFalse(ImportSession.objects.exists())
+
+    def test_expired_session_cannot_be_approved(self):
+        import_id = stage_import(self.user, ElementType.MODEL, {1: {"height": 2}})
+        ImportSession.objects.update(expires=timezone.now())
+        with self.assertRaises(ImportSessionException):
+            pop_staged_rows(self.user, ElementType.MODEL, import_id, [1])
+        stage_import(self.user, ElementType.MODEL, {2: {"height": 3}})
+        self.assertEqual(ImportSession.objects.count(), 1)
+
+    def test_approved_model_is_validated(self):
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R710",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        import_id = stage_import(
+            self.user,
+            ElementType.MODEL,
+            {model.id: {"id": model.id, "fields": {"display_color": "blue"}}},
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            "/api/models/bulk-approve",
+            {"import_id": import_id, "approved_modifications": [model.id]},
+            format="json",
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 400)
+        model.refresh_from_db()
+        self.assertEqual(model.display_color, DEFAULT_DISPLAY_COLOR)
+
+    def test_approved_mac_address_is_validated(self):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research")
+        rack = Rack.objects.create(datacenter=datacenter, row_letter="A", rack_num=1)
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R710",
+            height=1,
+            network_ports=["eth0"],
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        asset = Asset.objects.create(
+            hostname="server1", model=model, rack=rack, rack_position=1
+        )
+        network_port = NetworkPort.objects.get(asset=asset)
+        network_port_data = {
+            "src_hostname": "server1",
+            "src_port": "eth0",
+            "src_mac": "00:11:22:33:44:55:66",
+            "dest_hostname": "",
+            "dest_port": "",
+        }
+        import_id = stage_import(
+            self.user,
+            ElementType.NETWORK_CONNECTIONS,
+            {
+                network_port.id: {
+                    "id": network_port.id,
+                    "asset_id": asset.id,
+                    "network_port_data": network_port_data,
+                }
+            },
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            "/api/assets/network-bulk-approve",
+            {"import_id": import_id, "approved_modifications": [network_port.id]},
+            format="json",
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            "Some mac addresses couldn't be saved",
+            response.json()["warning_message"],
+        )
+        network_port.refresh_from_db()
+        self.assertIsNone(network_port.mac_address)
+
+    def test_session_size_is_capped(self):
+        staged_rows = {1: {"comment": os.urandom(IMPORT_SESSION_MAX_BYTES).hex()}}
+        with self.assertRaises(ImportSessionException):
+            stage_import(self.user, ElementType.MODEL, staged_rows)
+        self.assertFalse(ImportSession.objects.exists())
+
+
+class ChangePlanExecutionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research Triangle")
+        cls.rack = Rack.objects.create(datacenter=datacenter, row_letter="A", rack_num=1)
+        cls.model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+            network_ports=["eth0"],
+            num_power_ports=1,
+        )
+        cls.assets = [
+            Asset.objects.create(
+                hostname="server" + str(rack_position),
+                asset_number=200000 + rack_position,
+                model=cls.model,
+                rack=cls.rack,
+                rack_position=rack_position,
+            )
+            for rack_position in range(1, 5)
+        ]
+        NetworkPort.objects.get(asset=cls.assets[0]).create_network_connection(
+            NetworkPort.objects.get(asset=cls.assets[1])
+        )
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+
+    def setUp(self):
+        self.change_plan = ChangePlan.objects.create(name="plan", owner=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_to_change_plan(self, asset, **fields):
+        asset_cp = AssetCP(change_plan=self.change_plan, related_asset=asset)
+        for field in Asset._meta.fields:
+            if field.name not in ("id", "assetid_ptr", "chassis"):
+                setattr(asset_cp, field.attname, getattr(asset, field.attname))
+        for field, value in fields.items():
+            setattr(asset_cp, field, value)
+        asset_cp.save()
+        return asset_cp
+
+    def execute(self):
+        return self.client.post(
+            "/api/change-plans/" + str(self.change_plan.id) + "/execute", secure=True
+        )
+
+    def test_connections_are_rewired_to_new_and_modified_assets(self):
+        modified_cp = self.add_to_change_plan(self.assets[0], hostname="renamed")
+        new_cp = AssetCP(
+            change_plan=self.change_plan,
+            hostname="new",
+            model=self.model,
+            rack=self.rack,
+            rack_position=10,
+        )
+        new_cp.save()
+        modified_port_cp = NetworkPortCP.objects.get(asset=modified_cp)
+        modified_port_cp.connected_port = NetworkPortCP.objects.get(asset=new_cp)
+        modified_port_cp.save()
+        PowerPortCP.objects.filter(asset=new_cp).update(
+            power_connection=PDUPortCP.objects.create(
+                rack=self.rack,
+                left_right="L",
+                port_number=3,
+                change_plan=self.change_plan,
+            )
+        )
+
+        response = self.execute()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            "1 assets created, 1 assets modified", response.json()["success_message"]
+        )
+        new_asset = Asset.objects.get(hostname="new")
+        self.assertEqual(new_asset.asset_number, 100000)
+        self.assertFalse(AssetNumberReservation.objects.exists())
+        self.assertEqual(
+            NetworkPort.objects.get(asset__hostname="renamed").connected_port.asset,
+            new_asset,
+        )
+        # the port left behind by the rewiring is no longer connected
+        self.assertIsNone(NetworkPort.objects.get(asset=self.assets[1]).connected_port)
+        self.assertEqual(
+            PowerPort.objects.get(asset=new_asset).power_connection.port_number, 3
+        )
+        self.assertEqual(
+            Log.objects.filter(log_content__contains="Change Plan 'plan'").count(), 2
+        )
+
+    def test_change_plan_diff_is_computed_for_all_assets_together(self):
+        assets_cp = [
+            self.add_to_change_plan(self.assets[0], hostname="renamed"),
+            self.add_to_change_plan(self.assets[1]),
+            self.add_to_change_plan(self.assets[2], is_decommissioned=True),
+            self.add_to_change_plan(self.assets[3]),
+        ]
+        NetworkPortCP.objects.filter(asset=assets_cp[1]).update(
+            mac_address="00:11:22:33:44:55"
+        )
+        PowerPortCP.objects.filter(asset=assets_cp[3]).update(
+            power_connection=PDUPortCP.objects.create(
+                rack=self.rack,
+                left_right="L",
+                port_number=3,
+                change_plan=self.change_plan,
+            )
+        )
+        AssetCP.objects.filter(id=assets_cp[2].id).update(
+            is_conflict=True, asset_conflict_hostname=self.assets[0]
+        )
+
+        with self.assertNumQueries(5):
+            change_plan_diff = compute_change_plan_diff(self.change_plan)
+
+        # the connection between the first two assets is not on the change plan
+        self.assertEqual(
+            [change_plan_diff[asset_cp.id]["changes"] for asset_cp in assets_cp],
+            [
+                ["hostname", "network_connections"],
+                ["network_connections", "mac_addresses"],
+                [],
+                ["power_connections"],
+            ],
+        )
+        self.assertEqual(
+            change_plan_diff[assets_cp[2].id]["conflicts"][0]["conflicting_asset"],
+            self.assets[0].id,
+        )
+        response = self.client.get(
+            "/api/change-plans/" + str(self.change_plan.id), secure=True
+        )
+        self.assertEqual(
+            [
+                modification["changes"]
+                for modification in response.json()["modifications"]
+            ],
+            [
+                ["hostname", "network_connections"],
+                ["network_connections", "mac_addresses"],
+                [],
+                ["power_connections"],
+            ],
+        )
+
+    def test_failed_execution_makes_no_changes(self):
+        power_port = PowerPort.objects.get(asset=self.assets[3])
+        power_port.power_connection = PDUPort.objects.get(
+            rack=self.rack, left_right="R", port_number=1
+        )
+        power_port.save()
+        # the PDU port is still in use by an asset that is not on the plan
+        asset_cp = self.add_to_change_plan(self.assets[2], hostname="renamed")
+        PowerPortCP.objects.filter(asset=asset_cp).update(
+            power_connection=PDUPortCP.objects.create(
+                rack=self.rack,
+                left_right="R",
+                port_number=1,
+                change_plan=self.change_plan,
+            )
+        )
+
+        response = self.execute()
+
+        self.assertEqual(response.status_code, 400)
+        self.change_plan.refresh_from_db()
+        self.assertIsNone(self.change_plan.execution_time)
+        self.assertFalse(Asset.objects.filter(hostname="renamed").exists())
+
+    def test_execution_validates_assets(self):
+        asset_cp = self.add_to_change_plan(self.assets[2], hostname="renamed")
+        for fields in ({"owner": "nobody"}, {"asset_number": 99}):
+            with self.subTest(**fields):
+                AssetCP.objects.filter(id=asset_cp.id).update(**fields)
+                response = self.execute()
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(Asset.objects.filter(hostname="renamed").exists())
+                AssetCP.objects.filter(id=asset_cp.id).update(
+                    owner=None, asset_number=self.assets[2].asset_number
+                )
+
+    def test_execution_does_not_trust_cached_diff(self):
+        asset_cp = self.add_to_change_plan(self.assets[0], hostname="renamed")
+        cache.clear()
+        with self.settings(CACHES=SHARED_CACHES), mock.patch(
+            "rackcity.utils.asset_changes_utils."
+            + "has_unpublished_change_plan_diff_changes",
+            return_value=False,
+        ):
+            # cache a diff without conflicts, then add one that another
+            # process would have published
+            get_change_plan_diff(self.change_plan)
+            AssetCP.objects.filter(id=asset_cp.id).update(
+                is_conflict=True, asset_conflict_hostname=self.assets[1]
+            )
+            self.assertIsNone(
+                get_change_plan_diff(self.change_plan)[asset_cp.id]["conflicts"]
+            )
+
+        response = self.execute()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Asset.objects.filter(hostname="renamed").exists())
+
+    @mock.patch(
+        "rackcity.utils.asset_changes_utils.has_unpublished_change_plan_diff_changes",
+        return_value=False,
+    )
+    def test_diff_is_not_cached_per_process(self, _):
+        self.add_to_change_plan(self.assets[0], hostname="renamed")
+        get_change_plan_diff(self.change_plan)
+        # as if added through another worker
+        asset_cp = self.add_to_change_plan(self.assets[1], hostname="renamed2")
+        self.assertEqual(
+            get_change_plan_diff(self.change_plan)[asset_cp.id]["changes"],
+            ["hostname", "network_connections"],
+        )
+
+    @mock.patch(
+        "rackcity.utils.asset_changes_utils.has_unpublished_change_plan_diff_changes",
+        return_value=False,
+    )
+    def test_detail_with_asset_added_after_diff_was_cached(self, _):
+        self.add_to_change_plan(self.assets[0], hostname="renamed")
+        cache.clear()
+        with self.settings(CACHES=SHARED_CACHES):
+            get_change_plan_diff(self.change_plan)
+            self.add_to_change_plan(self.assets[1], hostname="renamed2")
+            response = self.client.get(
+                "/api/change-plans/" + str(self.change_plan.id), secure=True
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                modification["changes"]
+                for modification in response.json()["modifications"]
+            ],
+            [["hostname", "network_connections"]] * 2,
+        )
+
+
+class ChangePlanConflictDetectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datacenter = Site.objects.create(
+            abbreviation="RTP1", name="Research Triangle"
+        )
+        rack = Rack.objects.create(datacenter=datacenter, row_letter="A", rack_num=1)
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=2,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        cls.assets = [
+            Asset.objects.create(
+                hostname="server" + str(rack_position),
+                asset_number=200000 + rack_position,
+                model=model,
+                rack=rack,
+                rack_position=rack_position,
+            )
+            for rack_position in (1, 10, 20)
+        ]
+        change_plan = ChangePlan.objects.create(
+            name="plan", owner=User.objects.create(username="admin")
+        )
+        cls.assets_cp = []
+        for fields in (
+            {
+                "related_asset": cls.assets[0],
+                "hostname": "server1",
+                "rack_position": 1,
+            },
+            {"hostname": "renamed", "rack_position": 30},
+            {"asset_number": 300000, "rack_position": 34},
+            {"rack_position": 25},
+        ):
+            asset_cp = AssetCP(
+                change_plan=change_plan, model=model, rack=rack, **fields
+            )
+            asset_cp.save()
+            cls.assets_cp.append(asset_cp)
+
+    def test_conflicts_are_marked_for_all_assets_together(self):
+        Asset.objects.filter(id=self.assets[0].id).update(rack_position=24)
+        Asset.objects.filter(id=self.assets[1].id).update(hostname="renamed")
+        Asset.objects.filter(id=self.assets[2].id).update(asset_number=300000)
+        with self.assertNumQueries(12):
+            detect_conflicts_cp([asset.id for asset in self.assets])
+        for asset_cp in self.assets_cp:
+            asset_cp.refresh_from_db()
+        self.assertTrue(self.assets_cp[0].is_conflict)
+        self.assertIsNone(self.assets_cp[0].asset_conflict_location)
+        self.assertEqual(self.assets_cp[1].asset_conflict_hostname, self.assets[1])
+        self.assertEqual(self.assets_cp[2].asset_conflict_asset_number, self.assets[2])
+        self.assertIsNone(self.assets_cp[2].asset_conflict_location)
+        self.assertEqual(self.assets_cp[3].asset_conflict_location, self.assets[0])
+
+
+class ChangePlanConflictQueueTests(TransactionTestCase):
+    def setUp(self):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research")
+        rack = Rack.objects.create(datacenter=datacenter, row_letter="A", rack_num=1)
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        self.assets = [
+            Asset.objects.create(model=model, rack=rack, rack_position=rack_position)
+            for rack_position in (1, 2)
+        ]
+
+    @mock.patch("rackcity.utils.change_planner_utils.detect_conflicts_cp")
+    def test_saves_in_transaction_are_detected_together(self, detect_conflicts_cp):
+        with transaction.atomic():
+            for asset in self.assets:
+                asset.hostname = "server" + str(asset.rack_position)
+                asset.save()
+            detect_conflicts_cp.assert_not_called()
+        detect_conflicts_cp.assert_called_once_with(
+            {asset.id for asset in self.assets}
+        )
+
+    @mock.patch("rackcity.utils.change_planner_utils.detect_conflicts_cp")
+    def test_rolled_back_saves_are_dropped(self, detect_conflicts_cp):
+        try:
+            with transaction.atomic():
+                self.assets[0].save()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with transaction.atomic():
+            self.assets[1].save()
+        detect_conflicts_cp.assert_called_once_with({self.assets[1].id})
+
+
+class AssetNumberAllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        site = Site.objects.create(abbreviation="OSS", name="Offline Storage")
+        for asset_number in (100000, 100001, 100003):
+            Asset.objects.create(
+                asset_number=asset_number, model=model, offline_storage_site=site
+            )
+        AssetCP(
+            change_plan=ChangePlan.objects.create(
+                name="plan", owner=User.objects.create(username="admin")
+            ),
+            asset_number=100002,
+            model=model,
+            offline_storage_site=site,
+        ).save()
+        DecommissionedAsset.objects.create(
+            live_id=0,
+            decommissioning_user="admin",
+            asset_number=100004,
+            model={},
+            power_connections={},
+            network_connections={},
+            network_graph={},
+        )
+        AssetNumberReservation.objects.create(
+            asset_number=100005,
+            reservation_id="expired",
+            expires=timezone.now() - timedelta(seconds=1),
+        )
+        AssetNumberReservation.objects.create(
+            asset_number=100006,
+            reservation_id="held",
+            expires=timezone.now() + timedelta(seconds=60),
+        )
+
+    def test_block_skips_every_used_and_held_asset_number(self):
+        with self.assertNumQueries(4):
+            asset_numbers = reserve_asset_numbers(3, excluded_asset_numbers=[100007])
+        self.assertEqual(asset_numbers, [100005, 100008, 100009])
+
+    def test_suggested_asset_number_is_not_reserved(self):
+        self.assertEqual(get_next_available_asset_number(), 100005)
+        self.assertEqual(get_next_available_asset_number(), 100005)
+        self.assertEqual(AssetNumberReservation.objects.count(), 2)
+
+    def test_reservation_is_released_once_used(self):
+        (asset_number,) = reserve_asset_numbers(1)
+        release_asset_numbers([asset_number])
+        self.assertEqual(
+            list(
+                AssetNumberReservation.objects.values_list("asset_number", flat=True)
+            ),
+            [100006],
+        )
+
+
+class LogCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+        Log.objects.bulk_create(
+            [
+                Log(log_content="log " + str(index), user=cls.user)
+                for index in range(25)
+            ]
+        )
+        # logs written at the same time are ordered by id
+        Log.objects.filter(id__in=Log.objects.values("id")[:5]).update(
+            date=timezone.now()
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_page(self, cursor, data=None):
+        return self.client.post(
+            "/api/logs/get-many?page_size=10&cursor=" + cursor,
+            data or {},
+            format="json",
+            secure=True,
+        )
+
+    def test_pages_cover_every_log_once_newest_first(self):
+        log_ids = []
+        cursor = ""
+        while cursor is not None:
+            with self.assertNumQueries(1):
+                response = self.get_page(cursor)
+            self.assertEqual(response.status_code, 200)
+            log_ids += [log["id"] for log in response.json()["logs"]]
+            cursor = response.json()["next_cursor"]
+        self.assertEqual(
+            log_ids,
+            list(Log.objects.order_by("-date", "-id").values_list("id", flat=True)),
+        )
+
+    def test_invalid_cursor_and_sort_are_rejected(self):
+        self.assertEqual(self.get_page("not-a-cursor").status_code, 400)
+        self.assertEqual(
+            self.get_page(
+                "", {"sort_by": [{"field": "date", "ascending": True}]}
+            ).status_code,
+            400,
+        )
+
+    def test_small_log_page_count_is_exact(self):
+        response = self.client.post(
+            "/api/logs/pages?page_size=10", {}, format="json", secure=True
+        )
+        self.assertEqual(response.json(), {"page_count": 3})
+
+
+class AuditLogBufferTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="admin")
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        site = Site.objects.create(abbreviation="OSS", name="Offline Storage")
+        self.assets = [
+            Asset.objects.create(
+                hostname="server" + str(index), model=model, offline_storage_site=site
+            )
+            for index in range(5)
+        ]
+        Log.objects.all().delete()
+
+    def test_buffered_logs_are_written_together_in_order(self):
+        with self.assertNumQueries(1):
+            with buffer_logs():
+                for asset in self.assets:
+                    log_action(self.user, asset, Action.MODIFY)
+                log_delete(self.user, ElementType.USER, "someone")
+        logs = list(Log.objects.order_by("id"))
+        self.assertEqual(
+            [log.related_asset_id for log in logs],
+            [asset.id for asset in self.assets] + [None],
+        )
+        self.assertIn("user admin modified this asset", logs[0].log_content)
+
+    def test_element_deleted_before_buffered_logs_are_written_is_unlinked(self):
+        with buffer_logs():
+            log_action(self.user, self.assets[0], Action.DECOMMISSION)
+            self.assets[0].delete()
+        log = Log.objects.get()
+        self.assertIsNone(log.related_asset)
+        self.assertEqual(log.user, self.user)
+
+    def test_logs_are_written_once_transaction_commits(self):
+        with transaction.atomic():
+            with buffer_logs():
+                log_action(self.user, self.assets[0], Action.MODIFY)
+            self.assertFalse(Log.objects.exists())
+        self.assertEqual(Log.objects.get().related_asset, self.assets[0])
+
+    def test_logs_of_rolled_back_transaction_are_dropped(self):
+        with buffer_logs():
+            log_action(self.user, self.assets[0], Action.MODIFY)
+            try:
+                with transaction.atomic():
+                    log_action(self.user, self.assets[1], Action.MODIFY)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(Log.objects.get().related_asset, self.assets[0])
+
+    def test_logs_are_dropped_when_view_raises(self):
+        def get_response(request):
+            log_action(self.user, self.assets[0], Action.MODIFY)
+            # as Django does when the view raises
+            middleware.process_exception(request, RuntimeError())
+            return HttpResponse(status=500)
+
+        middleware = AuditLogMiddleware(get_response)
+        middleware(None)
+        self.assertFalse(Log.objects.exists())
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+        dell = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        cisco = ITModel.objects.create(
+            vendor="Cisco",
+            model_number="C9300",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        site = Site.objects.create(abbreviation="OSS", name="Offline Storage")
+        cls.web01, cls.web02, cls.switch = [
+            Asset.objects.create(
+                asset_number=asset_number,
+                hostname=hostname,
+                owner="admin",
+                comment=comment,
+                model=model,
+                offline_storage_site=site,
+            )
+            for asset_number, hostname, comment, model in (
+                (123401, "web01", "", dell),
+                (123402, "web02", "web frontend, replaces web01", dell),
+                (200000, "switch", "uplink for the web servers", cisco),
+            )
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search_assets(self, value):
+        response = self.client.post(
+            "/api/assets/get-many-offline-storage",
+            {
+                "filters": [
+                    {
+                        "field": "search",
+                        "filter_type": "search",
+                        "filter": {"value": value},
+                    }
+                ]
+            },
+            format="json",
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        return [asset["hostname"] for asset in response.json()["assets"]]
+
+    def test_search_filter_matches_word_prefixes_best_first(self):
+        self.assertEqual(self.search_assets("web"), ["web02", "web01", "switch"])
+        self.assertEqual(self.search_assets("web02"), ["web02"])
+        self.assertEqual(self.search_assets("cisco"), ["switch"])
+        self.assertEqual(self.search_assets("uplink serv"), ["switch"])
+
+    def test_typeahead_puts_hostname_prefixes_first(self):
+        response = self.client.get("/api/assets/search?query=web", secure=True)
+        self.assertEqual(
+            [asset["hostname"] for asset in response.json()["assets"]],
+            ["web02", "web01", "switch"],
+        )
+        response = self.client.get("/api/assets/search?query=1234", secure=True)
+        self.assertEqual(
+            response.json()["assets"],
+            [
+                {
+                    "id": asset.id,
+                    "asset_number": asset.asset_number,
+                    "hostname": asset.hostname,
+                    "vendor": "Dell",
+                    "model_number": "R720",
+                }
+                for asset in (self.web01, self.web02)
+            ],
+        )
+        response = self.client.get("/api/assets/search?query=", secure=True)
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_filters_use_search_indexes(self):
+        search = {
+            "filters": [
+                {
+                    "field": "search",
+                    "filter_type": "search",
+                    "filter": {"value": "web"},
+                }
+            ]
+        }
+        with connection.cursor() as cursor:
+            # search indexes can only be read by bitmap scans
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_indexscan = off")
+            for model, index_name in (
+                (Asset, "asset_search_idx"),
+                (ITModel, "itmodel_search_idx"),
+                (Log, "log_search_idx"),
+            ):
+                object_query, _ = get_filtered_query(model.objects.all(), search)
+                sql, params = object_query.query.sql_with_params()
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                self.assertIn(index_name, plan)
+
+
+class AssetLocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.datacenter = Site.objects.create(abbreviation="RTP1", name="Research")
+        cls.storage = Site.objects.create(
+            abbreviation="OSS", name="Offline Storage", is_storage=True
+        )
+        rack = Rack.objects.create(
+            datacenter=cls.datacenter, row_letter="A", rack_num=1
+        )
+        cls.chassis = Asset.objects.create(
+            hostname="chassis",
+            model=ITModel.objects.create(
+                vendor="Dell",
+                model_number="M1000e",
+                height=10,
+                model_type=ModelType.BLADE_CHASSIS.value,
+            ),
+            rack=rack,
+            rack_position=1,
+        )
+        cls.blade = Asset.objects.create(
+            hostname="blade",
+            model=ITModel.objects.create(
+                vendor="Dell",
+                model_number="M630",
+                model_type=ModelType.BLADE_ASSET.value,
+            ),
+            chassis=cls.chassis,
+            chassis_slot=1,
+        )
+
+    def get_locations(self):
+        return list(
+            Asset.objects.order_by("id").values_list("effective_site", "is_offline")
+        )
+
+    def test_blades_move_with_their_chassis(self):
+        self.assertEqual(
+            self.get_locations(),
+            [(self.datacenter.id, False), (self.datacenter.id, False)],
+        )
+        self.chassis.rack = None
+        self.chassis.rack_position = None
+        self.chassis.offline_storage_site = self.storage
+        self.chassis.save()
+        self.assertEqual(
+            self.get_locations(), [(self.storage.id, True), (self.storage.id, True)]
+        )
+        self.assertFalse(assets_online_queryset().exists())
+        self.assertEqual(assets_offline_queryset().count(), 2)
+
+    def test_locations_are_updated_in_one_query(self):
+        Asset.objects.update(effective_site=None, is_offline=True)
+        with self.assertNumQueries(1):
+            update_asset_locations(Asset.objects.all())
+        self.assertEqual(
+            self.get_locations(),
+            [(self.datacenter.id, False), (self.datacenter.id, False)],
+        )
+
+
+class RackUsageReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+        cls.rtp = Site.objects.create(abbreviation="RTP1", name="Research")
+        cls.dur = Site.objects.create(abbreviation="DUR1", name="Durham")
+        cls.empty = Site.objects.create(abbreviation="EMPTY", name="Empty")
+        dell = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=2,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        cisco = ITModel.objects.create(
+            vendor="Cisco",
+            model_number="C9300",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+        )
+        for datacenter, rack_num, model, owner in (
+            (cls.rtp, 1, dell, "admin"),
+            (cls.rtp, 2, cisco, None),
+            (cls.dur, 1, dell, ""),
+        ):
+            Asset.objects.create(
+                hostname="host" + str(Asset.objects.count()),
+                owner=owner,
+                model=model,
+                rack=Rack.objects.create(
+                    datacenter=datacenter, row_letter="A", rack_num=rack_num
+                ),
+                rack_position=1,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_global_report_breaks_down_each_datacenter(self):
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/report/global", secure=True)
+        report = response.json()
+        self.assertAlmostEqual(report["free_rackspace_percent"], 1 - 5 / 126)
+        self.assertEqual(
+            [
+                (allocation["vendor"], allocation["allocation_percent"])
+                for allocation in report["vendor_allocation"]
+            ],
+            [("Cisco", 1 / 5), ("Dell", 4 / 5)],
+        )
+        self.assertEqual(
+            [
+                (allocation["owner"], allocation["allocation_percent"])
+                for allocation in report["owner_allocation"]
+            ],
+            [("(No owner)", 3 / 5), ("admin", 2 / 5)],
+        )
+        self.assertEqual(
+            [
+                (
+                    datacenter["datacenter"]["abbreviation"],
+                    len(datacenter["model_allocation"]),
+                )
+                for datacenter in report["datacenters"]
+            ],
+            [("DUR1", 1), ("RTP1", 2)],
+        )
+
+    @mock.patch(
+        "rackcity.utils.report_utils.has_unpublished_rack_usage_changes",
+        return_value=False,
+    )
+    def test_report_is_not_cached_per_process(self, _):
+        self.client.get("/api/report/global", secure=True)
+        with self.assertNumQueries(3):
+            self.client.get("/api/report/global", secure=True)
+        with tempfile.TemporaryDirectory() as cache_dir, self.settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": cache_dir,
+                }
+            }
+        ):
+            self.client.get("/api/report/global", secure=True)
+            with self.assertNumQueries(0):
+                self.client.get("/api/report/global", secure=True)
+
+    def test_datacenter_report(self):
+        response = self.client.get(
+            "/api/report/datacenter/" + str(self.dur.id), secure=True
+        )
+        self.assertAlmostEqual(response.json()["free_rackspace_percent"], 1 - 2 / 42)
+        response = self.client.get(
+            "/api/report/datacenter/" + str(self.empty.id), secure=True
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_history_averages_snapshots_in_each_interval(self):
+        start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        take_utilization_snapshot(start)
+        Asset.objects.get(effective_site=self.dur).delete()
+        take_utilization_snapshot(start + timedelta(hours=1))
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                "/api/report/history",
+                {
+                    "category": "vendor",
+                    "start": start.isoformat(),
+                    "end": (start + timedelta(hours=2)).isoformat(),
+                    "points": 1,
+                },
+                secure=True,
+            )
+        [point] = response.json()["points"]
+        self.assertEqual(
+            (point["used_rack_slots"], point["total_rack_slots"]), (4, 126)
+        )
+        self.assertEqual(
+            point["allocation"],
+            [
+                {"name": "Cisco", "used_rack_slots": 1},
+                {"name": "Dell", "used_rack_slots": 3},
+            ],
+        )
+        response = self.client.get(
+            "/api/report/history",
+            {
+                "datacenter": self.dur.id,
+                "start": start.isoformat(),
+                "end": (start + timedelta(hours=2)).isoformat(),
+                "points": 2,
+            },
+            secure=True,
+        )
+        self.assertEqual(
+            [point["used_rack_slots"] for point in response.json()["points"]], [2, 0]
+        )
+
+
+class PDUPortAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.datacenter = Site.objects.create(abbreviation="RTP1", name="Research")
+        cls.racks = [
+            Rack.objects.create(datacenter=cls.datacenter, row_letter="A", rack_num=num)
+            for num in (1, 2)
+        ]
+        cls.model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+            num_power_ports=2,
+        )
+        for rack, connections in (
+            (cls.racks[0], {"1": ("L", 1), "2": ("R", 2)}),
+            (cls.racks[1], {"1": ("L", 5)}),
+        ):
+            asset = Asset.objects.create(model=cls.model, rack=rack, rack_position=1)
+            for port_name, (left_right, port_number) in connections.items():
+                PowerPort.objects.filter(asset=asset, port_name=port_name).update(
+                    power_connection=PDUPort.objects.get(
+                        rack=rack, left_right=left_right, port_number=port_number
+                    )
+                )
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+        cls.change_plan = ChangePlan.objects.create(name="plan", owner=cls.user)
+        asset_cp = AssetCP.objects.create(
+            change_plan=cls.change_plan,
+            model=cls.model,
+            rack=cls.racks[0],
+            rack_position=2,
+        )
+        PowerPortCP.objects.filter(asset=asset_cp, port_name="1").update(
+            power_connection=PDUPortCP.objects.create(
+                rack=cls.racks[0],
+                left_right="L",
+                port_number=3,
+                change_plan=cls.change_plan,
+            )
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_rack_availability(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                "/api/rack-power/availability",
+                {"id": self.racks[0].id},
+                secure=True,
+            )
+        availability = response.json()
+        self.assertEqual(availability["left_available"][:2], [2, 3])
+        self.assertEqual(availability["right_available"][:2], [1, 3])
+        self.assertEqual(availability["paired_available"][:2], [3, 4])
+        self.assertEqual(availability["left_suggest"], 3)
+
+    def test_rack_range_availability_on_change_plan(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                "/api/rack-power/availability",
+                {
+                    "datacenter": self.datacenter.id,
+                    "letter_start": "A",
+                    "num_start": 1,
+                    "num_end": 2,
+                    "change_plan": self.change_plan.id,
+                },
+                secure=True,
+            )
+        self.assertEqual(
+            [
+                (rack["rack_num"], rack["left_available"][:4], rack["left_suggest"])
+                for rack in response.json()["racks"]
+            ],
+            [(1, [2, 4, 5, 6], 4), (2, [1, 2, 3, 4], 1)],
+        )
+
+
+class PowerManagementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research")
+        rack = Rack.objects.create(datacenter=datacenter, row_letter="A", rack_num=1)
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+            num_power_ports=1,
+        )
+        cls.asset = Asset.objects.create(model=model, rack=rack, rack_position=1)
+        PowerPort.objects.filter(asset=cls.asset).update(
+            power_connection=PDUPort.objects.get(
+                rack=rack, left_right="L", port_number=1
+            )
+        )
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_job(self, action="on"):
+        job = PowerJob(
+            action,
+            [
+                {
+                    "asset_id": self.asset.id,
+                    "port_name": "1",
+                    "pdu_ext": "A01L",
+                    "port_number": 1,
+                }
+            ],
+            [{"chassis_id": 1, "chassis_hostname": "chassis1", "blade_slot": 3}],
+        )
+        job.save()
+        return job
+
+    @mock.patch("rackcity.utils.power_job_utils.make_bcman_request")
+    @mock.patch(
+        "rackcity.utils.power_job_utils.set_pdu_port_power",
+        side_effect=RuntimeError("PDU is down"),
+    )
+    def test_failed_toggle_is_recorded(self, set_pdu_port_power, make_bcman_request):
+        job = self.create_job()
+        job.run()
+        saved_job = get_power_job(job.id)
+        self.assertEqual(saved_job["status"], "done")
+        self.assertEqual(
+            [(result["result"], result["errors"]) for result in saved_job["results"]],
+            [("failure", "PDU is down"), ("success", None)],
+        )
+        make_bcman_request.assert_called_once_with("chassis1", "3", "on")
+
+    @mock.patch("rackcity.utils.power_job_utils.make_bcman_request")
+    @mock.patch("rackcity.utils.power_job_utils.set_pdu_port_power")
+    def test_progress_is_saved_per_port(self, set_pdu_port_power, make_bcman_request):
+        job = self.create_job()
+        save = job.save
+        pdu_port_saved = threading.Event()
+        finished_counts = []
+
+        def save_progress():
+            finished_counts.append(
+                sum(result["result"] == "success" for result in job.results)
+            )
+            pdu_port_saved.set()
+            save()
+
+        # the blade is toggled only once the PDU port's success was saved
+        make_bcman_request.side_effect = lambda *args: pdu_port_saved.wait(5)
+        with mock.patch.object(job, "save", side_effect=save_progress):
+            job.run()
+        self.assertEqual(finished_counts, [1, 2, 2])
+
+    @mock.patch("rackcity.utils.power_job_utils.POWER_CYCLE_DELAY", 0)
+    @mock.patch("rackcity.utils.power_job_utils.make_bcman_request")
+    @mock.patch("rackcity.utils.power_job_utils.set_pdu_port_power")
+    def test_cycled_ports_are_pending_until_on(
+        self, set_pdu_port_power, make_bcman_request
+    ):
+        job = self.create_job("cycle")
+        job.run_phase("off", is_last_phase=False)
+        self.assertEqual(
+            [result["result"] for result in get_power_job(job.id)["results"]],
+            ["pending", "pending"],
+        )
+        job.run_phase("on", is_last_phase=True)
+        self.assertEqual(
+            [result["result"] for result in get_power_job(job.id)["results"]],
+            ["success", "success"],
+        )
+        set_pdu_port_power.assert_called_with("A01L", 1, "on")
+
+    def test_stale_job_is_failed(self):
+        job = self.create_job()
+        job.results[1]["result"] = "success"
+        job.save()
+        PowerBatchJob.objects.filter(job_id=job.id).update(
+            updated=timezone.now() - timedelta(seconds=POWER_JOB_STALE_TIMEOUT + 1)
+        )
+        saved_job = get_power_job(job.id)
+        self.assertEqual(saved_job["status"], "done")
+        self.assertEqual(
+            [(result["result"], result["errors"]) for result in saved_job["results"]],
+            [("failure", POWER_JOB_STALE_ERROR), ("success", None)],
+        )
+        self.assertEqual(get_power_job(job.id), saved_job)
+
+    def test_cycle_runs_as_job(self):
+        response = self.client.post(
+            "/api/rack-power/cycle", {"id": self.asset.id}, format="json", secure=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["action"], "cycle")
+        self.assertEqual(
+            [result["asset_id"] for result in response.json()["results"]],
+            [self.asset.id],
+        )
+        self.assertEqual(
+            get_power_job(response.json()["job_id"])["status"], "running"
+        )
+
+    def test_job_is_done_when_run_fails(self):
+        job = self.create_job()
+        with mock.patch.object(
+            job, "run_phase", side_effect=RuntimeError("lost")
+        ), self.assertLogs("rackcity.utils.power_job_utils", "ERROR"):
+            job.run()
+        saved_job = get_power_job(job.id)
+        self.assertEqual(saved_job["status"], "done")
+        self.assertEqual(
+            [(result["result"], result["errors"]) for result in saved_job["results"]],
+            [("failure", "lost"), ("failure", "lost")],
+        )
+
+    def test_batch_start_saves_job(self):
+        response = self.client.post(
+            "/api/power-batch/start",
+            {"action": "on", "asset_ids": [self.asset.id]},
+            format="json",
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            "/api/power-batch/status/" + response.json()["job_id"], secure=True
+        )
+        self.assertEqual(response.json()["status"], "running")
+        self.assertEqual(
+            [result["result"] for result in response.json()["results"]], ["pending"]
+        )
+        response = self.client.get("/api/power-batch/status/missing", secure=True)
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch.object(pdu_session, "get")
+    def test_bulk_status_of_datacenter(self, get):
+        get.return_value = create_pdu_response(PDU_PAGE)
+        cache.clear()
+        response = self.client.post(
+            "/api/rack-power/status-bulk",
+            {"datacenter": self.asset.rack.datacenter_id},
+            format="json",
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [asset["power_status"] for asset in response.json()["assets"]],
+            [{"1": "ON"}],
+        )
+
+    def test_bulk_status_rejects_bad_parameters(self):
+        for parameters in ({"rack_id": "one"}, {"datacenter": [1]}):
+            response = self.client.post(
+                "/api/rack-power/status-bulk",
+                parameters,
+                format="json",
+                secure=True,
+            )
+            self.assertEqual(response.status_code, 400, parameters)
+
+    def test_batch_start_rejects_bad_parameters(self):
+        for parameters in (
+            {"asset_ids": ["one"]},
+            {"asset_ids": self.asset.id},
+            {"blades": [1]},
+            {"blades": [{"chassis_id": "one", "blade_slot": 1}]},
+        ):
+            response = self.client.post(
+                "/api/power-batch/start",
+                dict(parameters, action="on"),
+                format="json",
+                secure=True,
+            )
+            self.assertEqual(response.status_code, 400, parameters)
+
+
+def create_pdu_response(text="", status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = text.encode()
+    return response
+
+
+PDU_PAGE = "<tr><td>1<td><span style='background-color:lime'>ON</span></tr>"
+
+
+# A page in the format served by the PDU network controller, which puts every
+# port of the PDU on one line
+CONTROLLER_PDU_PAGE = (
+    "<html><head><title>hpdu-rtp1-A01L</title></head><body><table>"
+    + "<tr><th>Port<th>Power</tr>"
+    + "".join(
+        "<tr><td>"
+        + str(port_number)
+        + "<td><span style='background-color:"
+        + ("lime'>ON" if port_number % 3 else "red'>OFF")
+        + "</span></tr>"
+        for port_number in range(1, 25)
+    )
+    + "</table></body></html>"
+)
+
+
+# A cache that, unlike the default memory cache, could be shared by workers
+SHARED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(tempfile.gettempdir(), "rackcity_test_cache"),
+    }
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class PDUPortStateCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch.object(pdu_session, "get")
+    def test_error_response_is_connection_error(self, get):
+        get.return_value = create_pdu_response(status_code=500)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            get_pdu_port_states("A01L")
+
+    @mock.patch.object(pdu_session, "get")
+    def test_concurrent_misses_fetch_once(self, get):
+        fetching = threading.Event()
+        fetched = threading.Event()
+
+        def fetch(*args, **kwargs):
+            fetching.set()
+            fetched.wait()
+            return create_pdu_response(PDU_PAGE)
+
+        get.side_effect = fetch
+        port_states = []
+        threads = [
+            threading.Thread(
+                target=lambda: port_states.append(get_pdu_port_states("A01L"))
+            )
+            for _ in range(2)
+        ]
+        threads[0].start()
+        fetching.wait()
+        threads[1].start()
+        # lets the second request wait for the first one's fetch
+        threads[1].join(0.2)
+        fetched.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(port_states, [{1: "ON"}, {1: "ON"}])
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(get_pdu_cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_every_port_is_parsed_from_one_line(self):
+        port_states = parse_pdu_port_states(CONTROLLER_PDU_PAGE)
+        self.assertEqual(list(port_states), list(range(1, 25)))
+        self.assertEqual(
+            [port_states[port_number] for port_number in (1, 2, 3, 24)],
+            ["ON", "ON", "OFF", "OFF"],
+        )
+
+    @mock.patch.object(pdu_session, "get")
+    def test_asset_power_status_fetches_each_side_once(self, get):
+        get.return_value = create_pdu_response(CONTROLLER_PDU_PAGE)
+        asset = Asset(rack=Rack(row_letter="A", rack_num=1))
+        power_status = get_pdu_power_status(
+            asset,
+            {
+                "1": {"left_right": "L", "port_number": 2},
+                "2": {"left_right": "L", "port_number": 3},
+                "3": {"left_right": "R", "port_number": 2},
+            },
+        )
+        self.assertEqual(power_status, {"1": "ON", "2": "OFF", "3": "ON"})
+        self.assertEqual(
+            sorted(call.args[0][-4:] for call in get.call_args_list),
+            ["A01L", "A01R"],
+        )
+
+    @mock.patch.object(pdu_session, "post")
+    @mock.patch.object(pdu_session, "get")
+    def test_toggle_invalidates_port_states(self, get, post):
+        get.return_value = create_pdu_response(PDU_PAGE)
+        post.return_value = create_pdu_response()
+        get_pdu_port_states("A01L")
+        get_pdu_port_states("A01L")
+        set_pdu_port_power("A01L", 1, "off")
+        get_pdu_port_states("A01L")
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(get_pdu_cache_stats(), {"hits": 1, "misses": 2})
+
+    @mock.patch.object(pdu_session, "get")
+    def test_page_fetched_during_toggle_is_not_cached(self, get):
+        def fetch(*args, **kwargs):
+            # the port is toggled while its page is on the way
+            invalidate_pdu_port_states("A01L")
+            return create_pdu_response(PDU_PAGE)
+
+        get.side_effect = fetch
+        get_pdu_port_states("A01L")
+        get.side_effect = None
+        get.return_value = create_pdu_response(PDU_PAGE)
+        get_pdu_port_states("A01L")
+        self.assertEqual(get.call_count, 2)
+
+    @mock.patch.object(pdu_session, "get")
+    def test_refreshed_power_status_skips_cache(self, get):
+        get.return_value = create_pdu_response(PDU_PAGE)
+        asset = Asset(rack=Rack(row_letter="A", rack_num=1))
+        power_connections = {"1": {"left_right": "L", "port_number": 1}}
+        get_pdu_power_status(asset, power_connections)
+        get_pdu_power_status(asset, power_connections)
+        self.assertEqual(get.call_count, 1)
+        get.return_value = create_pdu_response(PDU_PAGE.replace("ON", "OFF"))
+        self.assertEqual(
+            get_pdu_power_status(asset, power_connections, refresh=True), {"1": "OFF"}
+        )
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @mock.patch.object(pdu_session, "get")
+    def test_per_process_cache_is_not_used(self, get):
+        get.return_value = create_pdu_response(PDU_PAGE)
+        get_pdu_port_states("A01L")
+        get_pdu_port_states("A01L")
+        self.assertEqual(get.call_count, 2)
+        with self.assertRaises(CommandError):
+            call_command("warm_pdu_cache")
+
+
+class BulkExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datacenter = Site.objects.create(abbreviation="RTP1", name="Research Triangle")
+        rack = Rack.objects.create(datacenter=datacenter, row_letter="A", rack_num=1)
+        model = ITModel.objects.create(
+            vendor="Dell",
+            model_number="R720",
+            height=1,
+            model_type=ModelType.RACKMOUNT_ASSET.value,
+            num_power_ports=2,
+        )
+        for rack_position in range(1, 21):
+            asset = Asset.objects.create(
+                hostname="server" + str(rack_position),
+                model=model,
+                rack=rack,
+                rack_position=rack_position,
+            )
+            power_port = PowerPort.objects.get(asset=asset, port_name="2")
+            power_port.power_connection = PDUPort.objects.get(
+                rack=rack, left_right="R", port_number=rack_position
+            )
+            power_port.save()
+        cls.user = User.objects.create(username="admin", is_superuser=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export_assets(self, export_format=None, **headers):
+        return self.client.post(
+            "/api/assets/bulk-export"
+            + ("?export_format=" + export_format if export_format else ""),
+            {"sort_by": [{"field": "rack_position", "ascending": True}]},
+            format="json",
+            secure=True,
+            **headers,
+        )
+
+    def test_streamed_csv_matches_export_without_queries_per_asset(self):
+        export_csv = self.export_assets().json()["export_csv"]
+        with CaptureQueriesContext(connection) as context:
+            response = self.export_assets("csv", HTTP_ACCEPT_ENCODING="gzip")
+            streamed_csv = gzip.decompress(b"".join(response.streaming_content))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(streamed_csv.decode(), export_csv)
+        self.assertIn("server3,RTP1,,A1,3,,,Dell,R720,,,,R3", export_csv)
+        self.assertLess(len(context.captured_queries), 5)
+
+    def test_streamed_ndjson_has_every_field_of_each_asset(self):
+        response = self.export_assets("ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(list(rows[0].keys()), list(BulkAssetSerializer.Meta.fields))
+        self.assertEqual(rows[0]["power_port_connection_2"], "R1")
+        self.assertIsNone(rows[0]["power_port_connection_1"])
+
+
+# A local stand-in for the BCMAN server: asks for a password over the terminal,
+# then answers chassis, blade and power commands at a "bcman>" prompt.
+FAKE_BCMAN_SERVER = """
+import getpass
+import sys
+if getpass.getpass("Password: ") != sys.argv[1]:
+    sys.exit(1)
+power = {}
+chassis = blade = None
+while True:
+    command = input("bcman> ").split()
+    if command == ["exit"]:
+        break
+    elif command[0] == "chassis":
+        chassis = command[1]
+    elif command[0] == "blade":
+        blade = int(command[1])
+    elif command[0] == "power":
+        if len(command) > 1:
+            power[(chassis, blade)] = command[1].upper()
+        state = power.get((chassis, blade), "OFF")
+        print("chassis '%s' blade %d is %s" % (chassis, blade, state))
+"""
+FAKE_BCMAN_PASSWORD = "password"
+
+
+class BCMANSessionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.sessions_created = 0
+        self.pool = BCMANSessionPool(size=2, session_factory=self.create_session)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def create_session(self):
+        self.sessions_created += 1
+        return BCMANSession(
+            sys.executable,
+            ["-c", FAKE_BCMAN_SERVER, FAKE_BCMAN_PASSWORD],
+            FAKE_BCMAN_PASSWORD,
+        )
+
+    def test_commands_reuse_one_session(self):
+        self.assertEqual(
+            make_bcman_request("chassis1", "3", "on", pool=self.pool),
+            "chassis 'chassis1' blade 3 is ON",
+        )
+        self.assertEqual(
+            make_bcman_request("chassis1", "3", "", pool=self.pool),
+            "chassis 'chassis1' blade 3 is ON",
+        )
+        self.assertEqual(self.sessions_created, 1)
+
+    def test_status_of_all_blade_slots(self):
+        make_bcman_request("chassis1", "14", "on", pool=self.pool)
+        power_states = get_bcman_blade_power_states("chassis1", pool=self.pool)
+        self.assertEqual(list(power_states.keys()), list(range(1, 15)))
+        self.assertEqual(power_states[14], "ON")
+        self.assertEqual(power_states[1], "OFF")
+        self.assertEqual(self.sessions_created, 1)
+
+    def test_closed_session_is_replaced(self):
+        make_bcman_request("chassis1", "1", "on", pool=self.pool)
+        # BCMAN ends the idle session
+        self.pool.idle_sessions.queue[0].process.terminate(force=True)
+        self.assertEqual(
+            make_bcman_request("chassis1", "1", "", pool=self.pool),
+            "chassis 'chassis1' blade 1 is OFF",
+        )
+        self.assertEqual(self.sessions_created, 2)
@@ -1,99 +1,356 @@
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+import threading
+from uuid import uuid4
+from rackcity.models import (
+    Asset,
+    AssetCP,
+    ITModel,
+    NetworkPortCP,
+    NetworkPort,
+    PowerPortCP,
+    PowerPort,
+    Rack,
+)
+from rackcity.models.asset import ASSET_LOCATION_FIELDS
+from rackcity.utils.cache_utils import is_cache_shared
+from rackcity.utils.transaction_utils import has_commit_hook, schedule_on_commit
 
-from rackcity.models import Asset, NetworkPortCP, NetworkPort, PowerPortCP, PowerPort
+# Seconds for which the diff of a change plan is kept in the cache
+CHANGE_PLAN_DIFF_TIMEOUT = 60 * 60
+CHANGE_PLAN_DIFF_KEY_PREFIX = "rackcity:change_plan_diff:"
+CHANGE_PLAN_VERSION_KEY_PREFIX = "rackcity:change_plan_version:"
+LIVE_ASSETS_VERSION_KEY = "rackcity:live_assets_version"
 
 
-def get_changes_on_asset(asset, asset_cp):
-    fields = [field.name for field in Asset._meta.fields]
-    changes = []
-    for field in fields:
-        if field == "id" or field == "assetid_ptr":
-            continue
-        if field == "chassis":
-            chassis_live = asset.chassis
-            chassis_cp = asset_cp.chassis
-            if chassis_live and (chassis_live != chassis_cp.related_asset):
-                changes.append("chassis")
-        elif getattr(asset, field) != getattr(asset_cp, field):
-            changes.append(field)
-    if network_connections_have_changed(asset, asset_cp):
-        changes.append("network_connections")
-    if power_connections_have_changed(asset, asset_cp):
-        changes.append("power_connections")
-    if mac_addresses_have_changed(asset, asset_cp):
-        changes.append("mac_addresses")
-    return changes
-
-
-def mac_addresses_have_changed(asset, asset_cp):
-    network_ports_cp = NetworkPortCP.objects.filter(asset=asset_cp)
-    network_ports = NetworkPort.objects.filter(asset=asset)
+def get_changes_on_assets(assets_cp):
+    """
+    Returns the changes on the related asset of each AssetCP that has one,
+    keyed by AssetCP id. The AssetCPs should have their related asset and
+    chassis loaded; the ports of all of them are loaded with four queries.
+    """
+    assets_cp = [asset_cp for asset_cp in assets_cp if asset_cp.related_asset_id]
+    if not assets_cp:
+        return {}
+    related_asset_ids = [asset_cp.related_asset_id for asset_cp in assets_cp]
+    network_ports = {
+        (network_port["asset_id"], network_port["port_name"]): network_port
+        for network_port in NetworkPort.objects.filter(
+            asset__in=related_asset_ids
+        ).values(
+            "asset_id",
+            "port_name",
+            "mac_address",
+            "connected_port__asset_id",
+            "connected_port__port_name",
+        )
+    }
+    network_ports_cp = NetworkPortCP.objects.filter(asset__in=assets_cp).values(
+        "asset_id",
+        "port_name",
+        "mac_address",
+        "connected_port__asset__related_asset_id",
+        "connected_port__port_name",
+    )
+    pdu_port_fields = (
+        "power_connection__rack_id",
+        "power_connection__left_right",
+        "power_connection__port_number",
+    )
+    power_ports = {
+        power_port[:2]: power_port[2:]
+        for power_port in PowerPort.objects.filter(
+            asset__in=related_asset_ids
+        ).values_list("asset_id", "port_name", *pdu_port_fields)
+    }
+    power_ports_cp = PowerPortCP.objects.filter(asset__in=assets_cp).values_list(
+        "asset_id", "port_name", *pdu_port_fields
+    )
+    related_asset_ids_cp = {
+        asset_cp.id: asset_cp.related_asset_id for asset_cp in assets_cp
+    }
+    changed_network_connections = set()
+    changed_mac_addresses = set()
     for network_port_cp in network_ports_cp:
-        try:
-            network_port = network_ports.get(port_name=network_port_cp.port_name,)
-            if network_port.mac_address != network_port_cp.mac_address:
-                return True
-        except ObjectDoesNotExist:
+        network_port = network_ports.get(
+            (
+                related_asset_ids_cp[network_port_cp["asset_id"]],
+                network_port_cp["port_name"],
+            )
+        )
+        if network_port is None:
             continue
-    return False
+        if network_port["mac_address"] != network_port_cp["mac_address"]:
+            changed_mac_addresses.add(network_port_cp["asset_id"])
+        # a port connected on the change plan to an asset that is not live
+        # yet has no live equivalent, so it differs from any live connection
+        connected_port = network_port_cp["connected_port__port_name"] and (
+            network_port_cp["connected_port__asset__related_asset_id"],
+            network_port_cp["connected_port__port_name"],
+        )
+        connected_port_live = network_port["connected_port__port_name"] and (
+            network_port["connected_port__asset_id"],
+            network_port["connected_port__port_name"],
+        )
+        if connected_port != connected_port_live:
+            changed_network_connections.add(network_port_cp["asset_id"])
+    changed_power_connections = set()
+    for asset_cp_id, port_name, *pdu_port_cp in power_ports_cp:
+        pdu_port = power_ports.get((related_asset_ids_cp[asset_cp_id], port_name))
+        if pdu_port is not None and tuple(pdu_port_cp) != pdu_port:
+            changed_power_connections.add(asset_cp_id)
+    changes_by_asset_cp = {}
+    for asset_cp in assets_cp:
+        asset = asset_cp.related_asset
+        changes = []
+        for field in Asset._meta.fields:
+            if field.name in ("id", "assetid_ptr") + ASSET_LOCATION_FIELDS:
+                continue
+            if field.name == "chassis":
+                chassis_cp = asset_cp.chassis
+                chassis_live_cp = chassis_cp and chassis_cp.related_asset_id
+                if asset.chassis_id and asset.chassis_id != chassis_live_cp:
+                    changes.append("chassis")
+            elif getattr(asset, field.attname) != getattr(asset_cp, field.attname):
+                changes.append(field.name)
+        if asset_cp.id in changed_network_connections:
+            changes.append("network_connections")
+        if asset_cp.id in changed_power_connections:
+            changes.append("power_connections")
+        if asset_cp.id in changed_mac_addresses:
+            changes.append("mac_addresses")
+        changes_by_asset_cp[asset_cp.id] = changes
+    return changes_by_asset_cp
 
 
-def network_connections_have_changed(asset, asset_cp):
-    network_ports_cp = NetworkPortCP.objects.filter(asset=asset_cp)
-    network_ports = NetworkPort.objects.filter(asset=asset)
-    for network_port_cp in network_ports_cp:
-        # Get NetworkPort connected to this port live
-        try:
-            network_port = network_ports.get(port_name=network_port_cp.port_name,)
-        except ObjectDoesNotExist:
-            continue
-        connected_port_live = network_port.connected_port
-        connected_port_cp = network_port_cp.connected_port
-        if (not connected_port_live and connected_port_cp) or (
-            connected_port_live and not connected_port_cp
-        ):
-            return True
-
-        live_connected_port_cp = None
-        if connected_port_cp:
-            related_asset = connected_port_cp.asset.related_asset
-            if related_asset:
-                try:
-                    live_connected_port_cp = NetworkPort.objects.get(
-                        asset=related_asset, port_name=connected_port_cp.port_name,
-                    )
-                except ObjectDoesNotExist:
-                    live_connected_port_cp = None
-        # Check for match
-        if connected_port_live != live_connected_port_cp:
-            return True
-
-    return False
-
-
-def power_connections_have_changed(asset, asset_cp):
-    power_ports_cp = PowerPortCP.objects.filter(asset=asset_cp)
-    power_ports = PowerPort.objects.filter(asset=asset)
-    for power_port_cp in power_ports_cp:
-        # Get PDUPortCP corresponding to this CP connection
-        pdu_port_cp = power_port_cp.power_connection
-        # Get PDUPort corresponding to this live connection
-        try:
-            power_port_live = power_ports.get(port_name=power_port_cp.port_name)
-        except ObjectDoesNotExist:
-            continue
-        pdu_port_live = power_port_live.power_connection
-        # Check for match
-        if pdu_port_cp is None and pdu_port_live is None:
-            continue
-        if (pdu_port_cp is None and pdu_port_live) or (
-            pdu_port_cp and pdu_port_live is None
-        ):
-            return True
-        if (
-            pdu_port_cp.port_number != pdu_port_live.port_number
-            or pdu_port_cp.left_right != pdu_port_live.left_right
-            or pdu_port_cp.rack != pdu_port_live.rack
-        ):
-            return True
-    return False
+def get_cp_modification_conflicts(asset_cp):
+    """
+    Returns the conflicts of an AssetCP, or None if it has none. Only its
+    model is read from its relations, so this runs no queries if the model
+    is loaded.
+    """
+    conflicts = []
+    nonresolvable_message = (
+        "This conflict cannot be resolved automatically; the "
+        + "related changes need to be removed from your change plan."
+    )
+    conflicting_asset_message_1 = (
+        "Due to more recent live changes, "
+        + "your change plan version of this asset's "
+    )
+    conflicting_asset_message_2 = " now conflicts with a live asset. "
+    if asset_cp.is_conflict and asset_cp.related_asset_id is None:
+        if asset_cp.related_decommissioned_asset_id:
+            conflicts.append(
+                {
+                    "conflict_message": "This asset has been decommissioned in a live change. "
+                    + nonresolvable_message,
+                    "conflicting_asset": None,
+                    "conflict_resolvable": False,
+                }
+            )
+        else:
+            conflicts.append(
+                {
+                    "conflict_message": "This asset has been deleted live. "
+                    + nonresolvable_message
+                }
+            )
+    if asset_cp.asset_conflict_hostname_id:
+        conflicts.append(
+            {
+                "conflict_message": conflicting_asset_message_1
+                + "hostname"
+                + conflicting_asset_message_2
+                + nonresolvable_message,
+                "conflicting_asset": asset_cp.asset_conflict_hostname_id,
+                "conflict_resolvable": False,
+            }
+        )
+    if asset_cp.asset_conflict_asset_number_id:
+        conflicts.append(
+            {
+                "conflict_message": conflicting_asset_message_1
+                + "asset number"
+                + conflicting_asset_message_2
+                + nonresolvable_message,
+                "conflicting_asset": asset_cp.asset_conflict_asset_number_id,
+                "conflict_resolvable": False,
+            }
+        )
+    if asset_cp.asset_conflict_location_id:
+        conflicts.append(
+            {
+                "conflict_message": conflicting_asset_message_1
+                + "rack location"
+                + conflicting_asset_message_2
+                + nonresolvable_message,
+                "conflicting_asset": asset_cp.asset_conflict_location_id,
+                "conflict_resolvable": False,
+            }
+        )
+    deleted_relation_message = " associated with this asset has been deleted. "
+    if asset_cp.model is None:
+        conflicts.append(
+            {
+                "conflict_message": "The model"
+                + deleted_relation_message
+                + nonresolvable_message,
+                "conflicting_asset": None,
+                "conflict_resolvable": False,
+            }
+        )
+    elif (
+        asset_cp.model.is_rackmount()
+        and asset_cp.offline_storage_site_id is None
+        and asset_cp.rack_id is None
+    ):
+        conflicts.append(
+            {
+                "conflict_message": "The rack"
+                + deleted_relation_message
+                + nonresolvable_message,
+                "conflicting_asset": None,
+                "conflict_resolvable": False,
+            }
+        )
+    if len(conflicts) == 0:
+        if asset_cp.is_conflict:
+            conflicts.append(
+                {
+                    "conflict_message": "Live changes have been made to this asset since your "
+                    + "latest change planner modification. This conflict "
+                    + "needs to be resolved. Please select which version "
+                    + "you would like to keep.",
+                    "conflicting_asset": None,
+                    "conflict_resolvable": True,
+                }
+            )
+    if len(conflicts) == 0:
+        return None
+    else:
+        return conflicts
+
+
+def get_change_plan_diff(change_plan):
+    """
+    Returns the changes on the related asset and the conflicts of every
+    AssetCP on a change plan, keyed by AssetCP id. The diff is computed with
+    a fixed number of queries. With a cache shared by all workers, it is
+    cached until a live asset or an asset on the change plan changes; code
+    that writes based on the diff must use compute_change_plan_diff instead.
+    """
+    if not is_cache_shared():
+        # other workers could not invalidate this worker's cache
+        return compute_change_plan_diff(change_plan)
+    if has_unpublished_change_plan_diff_changes():
+        # the cache cannot reflect changes not yet committed
+        return compute_change_plan_diff(change_plan)
+    version_keys = [
+        LIVE_ASSETS_VERSION_KEY,
+        CHANGE_PLAN_VERSION_KEY_PREFIX + str(change_plan.id),
+    ]
+    versions = cache.get_many(version_keys)
+    for version_key in version_keys:
+        if version_key not in versions:
+            cache.add(version_key, uuid4().hex, timeout=None)
+            versions[version_key] = cache.get(version_key)
+    diff_key = CHANGE_PLAN_DIFF_KEY_PREFIX + ":".join(
+        [str(change_plan.id)] + [versions[version_key] for version_key in version_keys]
+    )
+    change_plan_diff = cache.get(diff_key)
+    if change_plan_diff is None:
+        change_plan_diff = compute_change_plan_diff(change_plan)
+        cache.set(diff_key, change_plan_diff, timeout=CHANGE_PLAN_DIFF_TIMEOUT)
+    return change_plan_diff
+
+
+def compute_change_plan_diff(change_plan):
+    assets_cp = list(
+        AssetCP.objects.filter(change_plan=change_plan).select_related(
+            "model", "related_asset", "chassis"
+        )
+    )
+    changes_by_asset_cp = get_changes_on_assets(assets_cp)
+    return {
+        asset_cp.id: {
+            "changes": changes_by_asset_cp.get(asset_cp.id),
+            "conflicts": get_cp_modification_conflicts(asset_cp),
+        }
+        for asset_cp in assets_cp
+    }
+
+
+class ChangePlanDiffChanges(threading.local):
+    """
+    Version keys of the change plan diffs changed in this thread that have
+    not been published to other requests yet.
+    """
+
+    def __init__(self):
+        self.version_keys = set()
+
+
+change_plan_diff_changes = ChangePlanDiffChanges()
+
+
+def record_change_plan_diff_change(change_plan_id=None):
+    """
+    Invalidates the cached diff of a change plan, or of every change plan if
+    none is given, once the surrounding transaction commits.
+    """
+    if change_plan_id is None:
+        version_key = LIVE_ASSETS_VERSION_KEY
+    else:
+        version_key = CHANGE_PLAN_VERSION_KEY_PREFIX + str(change_plan_id)
+    is_scheduled = has_unpublished_change_plan_diff_changes()
+    if not is_scheduled:
+        # changes recorded by a transaction that was rolled back were not made
+        change_plan_diff_changes.version_keys = set()
+    change_plan_diff_changes.version_keys.add(version_key)
+    if not is_scheduled:
+        schedule_on_commit(change_plan_diff_changes, publish_change_plan_diff_changes)
+
+
+def has_unpublished_change_plan_diff_changes():
+    return has_commit_hook(change_plan_diff_changes)
+
+
+def publish_change_plan_diff_changes():
+    version_keys = change_plan_diff_changes.version_keys
+    change_plan_diff_changes.version_keys = set()
+    cache.set_many(
+        {version_key: uuid4().hex for version_key in version_keys}, timeout=None
+    )
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+@receiver(post_save, sender=NetworkPort)
+@receiver(post_delete, sender=NetworkPort)
+@receiver(post_save, sender=PowerPort)
+@receiver(post_delete, sender=PowerPort)
+@receiver(post_delete, sender=ITModel)
+@receiver(post_delete, sender=Rack)
+def mark_live_change_plan_diff_change(sender, **kwargs):
+    """
+    Invalidates the diffs of every change plan when an asset or its ports
+    change live, or when a model or rack that assets on change plans may
+    refer to is deleted.
+    """
+    record_change_plan_diff_change()
+
+
+@receiver(post_save, sender=AssetCP)
+@receiver(post_delete, sender=AssetCP)
+@receiver(post_save, sender=NetworkPortCP)
+@receiver(post_delete, sender=NetworkPortCP)
+@receiver(post_save, sender=PowerPortCP)
+@receiver(post_delete, sender=PowerPortCP)
+def mark_change_plan_diff_change(sender, **kwargs):
+    """
+    Invalidates the diff of a change plan when an asset or its ports change
+    on the change plan.
+    """
+    record_change_plan_diff_change(kwargs.get("instance").change_plan_id)
@@ -0,0 +1,811 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.http import JsonResponse
+from http import HTTPStatus
+from rackcity.api.serializers import (
+    ChassisSerializer,
+    ImportAssetSerializer,
+    ITModelSerializer,
+    RackSerializer,
+    RecursiveAssetSerializer,
+    SiteSerializer,
+)
+from rackcity.models import (
+    Asset,
+    AssetID,
+    ITModel,
+    NetworkPort,
+    PDUPort,
+    PowerPort,
+    Rack,
+    Site,
+    validate_location_type,
+)
+from rackcity.models.asset import (
+    insert_assets,
+    reserve_asset_numbers,
+    update_asset_locations,
+)
+from rackcity.permissions.permissions import user_has_asset_permission
+from rackcity.utils.asset_changes_utils import record_change_plan_diff_change
+from rackcity.utils.change_planner_utils import queue_conflict_detection_cp
+from rackcity.utils.errors_utils import (
+    AuthFailure,
+    BulkFailure,
+    Status,
+    parse_serializer_errors,
+)
+from rackcity.utils.exceptions import LocationException
+from rackcity.utils.report_utils import record_rack_usage_change
+from rackcity.utils.network_graph_utils import (
+    NetworkGraphChanges,
+    record_network_graph_change,
+)
+from rackcity.utils.rackcity_utils import (
+    get_rack_occupancies,
+    no_infile_location_conflicts,
+    records_are_identical,
+    validate_asset_location_in_rack,
+)
+
+# Rows per INSERT statement when creating assets and ports
+IMPORT_BATCH_SIZE = 1000
+NUM_SLOTS_IN_CHASSIS = 14
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_import_failure_response(failure_message, errors=None):
+    response = {"failure_message": Status.IMPORT_ERROR.value + failure_message}
+    if errors is not None:
+        response["errors"] = errors
+    return JsonResponse(response, status=HTTPStatus.BAD_REQUEST)
+
+
+def get_connected_power_ports(rack_ids):
+    """
+    Returns the asset id and port name of the power port connected to each
+    connected PDU port of the racks, by PDU port id.
+    """
+    return {
+        pdu_port_id: (asset_id, port_name)
+        for pdu_port_id, asset_id, port_name in PowerPort.objects.filter(
+            power_connection__rack__in=rack_ids
+        ).values_list("power_connection_id", "asset_id", "port_name")
+    }
+
+
+def connect_power_port(
+    asset, port_name, power_connection_data, pdu_ports, connected_power_ports
+):
+    """
+    Returns the PDU port a power port of the asset should be connected to,
+    and a failure message if the PDU port does not exist or is connected to
+    another power port. connected_power_ports is updated with the connection.
+    """
+    pdu_port = pdu_ports.get(
+        (
+            asset.rack_id,
+            power_connection_data["left_right"],
+            power_connection_data["port_number"],
+        )
+    )
+    if pdu_port is None:
+        return (
+            None,
+            "PDU port '"
+            + power_connection_data["left_right"]
+            + str(power_connection_data["port_number"])
+            + "' does not exist. ",
+        )
+    connected_power_port = connected_power_ports.get(pdu_port.id)
+    if connected_power_port and connected_power_port != (asset.id, port_name):
+        return (
+            None,
+            "Power connection on port '"
+            + port_name
+            + "' of asset '"
+            + str(asset.asset_number)
+            + "' was not valid. ",
+        )
+    connected_power_ports[pdu_port.id] = (asset.id, port_name)
+    return pdu_port, ""
+
+
+class AssetImport:
+    """
+    Validates and adds the assets of a bulk import. Every model, site, rack,
+    chassis, existing asset, owner and PDU port the import refers to is read
+    up front with one query per table, so rows are validated without
+    queries, and new assets and their ports are created with bulk inserts.
+    """
+
+    def __init__(self, user, asset_datas):
+        """
+        asset_datas are rows of the import file, normalized by
+        normalize_bulk_asset_data.
+        """
+        self.user = user
+        self.asset_datas = asset_datas
+        self.assets_to_add = []
+        self.potential_modifications = []
+        # validated rows that modify an existing asset, by asset id
+        self.staged_modifications = {}
+        self.site_permissions = {}
+
+    def load_references(self):
+        asset_datas = self.asset_datas
+        self.models = {
+            (model.vendor, model.model_number): model
+            for model in ITModel.objects.filter(
+                vendor__in={asset_data["vendor"] for asset_data in asset_datas},
+                model_number__in={
+                    asset_data["model_number"] for asset_data in asset_datas
+                },
+            )
+        }
+        self.sites = {
+            site.abbreviation: site
+            for site in Site.objects.filter(
+                abbreviation__in={
+                    asset_data[field]
+                    for asset_data in asset_datas
+                    for field in ("datacenter", "offline_site")
+                    if asset_data[field]
+                }
+            )
+        }
+        self.racks = {
+            (rack.datacenter_id, rack.row_letter, rack.rack_num): rack
+            for rack in Rack.objects.filter(
+                datacenter__in=list(self.sites.values()),
+                row_letter__in={
+                    asset_data["rack"][:1].upper()
+                    for asset_data in asset_datas
+                    if asset_data["rack"]
+                },
+            ).select_related("datacenter")
+        }
+        asset_numbers = {
+            parse_int(asset_data.get(field))
+            for asset_data in asset_datas
+            for field in ("asset_number", "chassis_number")
+        } - {None}
+        self.existing_assets = {
+            asset.asset_number: asset
+            for asset in Asset.objects.filter(
+                asset_number__in=asset_numbers
+            ).select_related(
+                "model",
+                "rack__datacenter",
+                "offline_storage_site",
+                "chassis__rack__datacenter",
+                "chassis__offline_storage_site",
+            )
+        }
+        self.existing_hostnames = set(
+            Asset.objects.annotate(hostname_lower=Lower("hostname"))
+            .filter(
+                hostname_lower__in={
+                    asset_data["hostname"].lower()
+                    for asset_data in asset_datas
+                    if asset_data.get("hostname")
+                }
+            )
+            .values_list("hostname_lower", flat=True)
+        )
+        self.usernames = set(
+            User.objects.filter(
+                username__in={
+                    asset_data["owner"]
+                    for asset_data in asset_datas
+                    if asset_data["owner"]
+                }
+            ).values_list("username", flat=True)
+        )
+        rack_ids = {rack.id for rack in self.racks.values()} | {
+            asset.rack_id for asset in self.existing_assets.values() if asset.rack_id
+        }
+        self.rack_occupancies = get_rack_occupancies(rack_ids)
+        self.blades = {}
+        for chassis_id, blade_id, asset_number, chassis_slot in Asset.objects.filter(
+            chassis__in={asset.id for asset in self.existing_assets.values()}
+            | {
+                asset.chassis_id
+                for asset in self.existing_assets.values()
+                if asset.chassis_id
+            }
+        ).values_list("chassis_id", "id", "asset_number", "chassis_slot"):
+            self.blades.setdefault(chassis_id, []).append(
+                (blade_id, asset_number, chassis_slot)
+            )
+        self.pdu_ports = {
+            (pdu_port.rack_id, pdu_port.left_right, pdu_port.port_number): pdu_port
+            for pdu_port in PDUPort.objects.filter(rack__in=rack_ids)
+        }
+        self.connected_power_ports = get_connected_power_ports(rack_ids)
+        self.preloaded = {
+            "model": {model.id: model for model in self.models.values()},
+            "rack": {rack.id: rack for rack in self.racks.values()},
+            "chassis": {asset.id: asset for asset in self.existing_assets.values()},
+            "offline_storage_site": {site.id: site for site in self.sites.values()},
+        }
+
+    def validate(self):
+        """
+        Validates every row, and returns a failure response describing the
+        first invalid row, or None if the import is valid.
+        """
+        self.load_references()
+        hostnames_in_import = set()
+        asset_numbers_in_import = set()
+        chassis_asset_numbers = set()
+        # site of each new chassis in the import, by asset number
+        self.chassis_sites_in_import = {}
+        for asset_data in self.asset_datas:
+            failure_response = self.validate_asset_data(
+                asset_data,
+                hostnames_in_import,
+                asset_numbers_in_import,
+                chassis_asset_numbers,
+            )
+            if failure_response:
+                return failure_response
+        try:
+            no_infile_location_conflicts(self.asset_datas)
+        except LocationException as error:
+            return get_import_failure_response(
+                "Location conflicts among assets in import file. " + str(error)
+            )
+        return None
+
+    def validate_asset_data(
+        self,
+        asset_data,
+        hostnames_in_import,
+        asset_numbers_in_import,
+        chassis_asset_numbers,
+    ):
+        model = self.models.get((asset_data["vendor"], asset_data["model_number"]))
+        if model is None:
+            return get_import_failure_response(
+                "Model does not exist: "
+                + "vendor="
+                + asset_data["vendor"]
+                + ", model_number="
+                + asset_data["model_number"]
+            )
+        if model.is_blade_chassis():
+            if "asset_number" in asset_data and asset_data["asset_number"]:
+                chassis_asset_numbers.add(asset_data["asset_number"])
+        asset_data["model"] = model.id
+        del asset_data["vendor"]
+        del asset_data["model_number"]
+        chassis_in_import = None
+        if asset_data["chassis_number"]:
+            chassis = self.existing_assets.get(parse_int(asset_data["chassis_number"]))
+            if chassis is None:
+                if not asset_data["chassis_number"] in chassis_asset_numbers:
+                    return get_import_failure_response(
+                        "Chassis does not exist: "
+                        + "asset_number="
+                        + asset_data["chassis_number"]
+                    )
+                chassis_in_import = asset_data["chassis_number"]
+            elif not chassis.model.is_blade_chassis():
+                return get_import_failure_response(
+                    "Asset is not a chassis: "
+                    + "asset_number="
+                    + asset_data["chassis_number"]
+                )
+            else:
+                asset_data["chassis"] = chassis.id
+                del asset_data["chassis_number"]
+        else:
+            asset_data["chassis"] = None
+            del asset_data["chassis_number"]
+        if asset_data["datacenter"]:
+            datacenter = self.sites.get(asset_data["datacenter"])
+            if datacenter is None:
+                return get_import_failure_response(
+                    "Provided datacenter doesn't exist: " + asset_data["datacenter"]
+                )
+            if asset_data["rack"]:
+                rack = self.racks.get(
+                    (
+                        datacenter.id,
+                        asset_data["rack"][:1].upper(),
+                        parse_int(asset_data["rack"][1:]),
+                    )
+                )
+                if rack is None:
+                    return get_import_failure_response(
+                        "Provided rack doesn't exist: " + asset_data["rack"]
+                    )
+                asset_data["rack"] = rack.id
+            else:
+                asset_data["rack"] = None
+            asset_data["datacenter"] = datacenter.id
+        else:
+            asset_data["datacenter"] = None
+        if asset_data["offline_site"]:
+            offline_storage_site = self.sites.get(asset_data["offline_site"])
+            if offline_storage_site is None:
+                return get_import_failure_response(
+                    "Provided offline storage site doesn't exist: "
+                    + asset_data["offline_site"]
+                )
+            asset_data["offline_storage_site"] = offline_storage_site.id
+        else:
+            asset_data["offline_storage_site"] = None
+        del asset_data["offline_site"]
+
+        asset_serializer = ImportAssetSerializer(
+            data=asset_data,
+            context={"preloaded": self.preloaded, "usernames": self.usernames},
+        )
+        errors = {} if asset_serializer.is_valid() else dict(asset_serializer.errors)
+        asset_number = parse_int(asset_data.get("asset_number"))
+        existing_asset = self.existing_assets.get(asset_number)
+        if existing_asset:
+            errors.setdefault("asset_number", []).append(
+                "asset with this asset number already exists."
+            )
+        if (
+            asset_data.get("hostname")
+            and asset_data["hostname"].lower() in self.existing_hostnames
+        ):
+            errors.setdefault("hostname", []).append("This field must be unique.")
+        # if the only errors are the asset number and/or hostname uniqueness,
+        # that's fine - it's a modify
+        if errors and not (
+            existing_asset
+            and set(errors.keys()) <= {"asset_number", "hostname"}
+            and all(len(field_errors) == 1 for field_errors in errors.values())
+        ):
+            return get_import_failure_response(
+                BulkFailure.ASSET_INVALID.value + parse_serializer_errors(errors),
+                errors=str(errors),
+            )
+        validated_data = asset_serializer.validated_data
+        try:
+            validate_location_type(
+                validated_data["model"],
+                validated_data.get("rack"),
+                validated_data.get("rack_position"),
+                validated_data.get("chassis") or chassis_in_import,
+                validated_data.get("chassis_slot"),
+                validated_data.get("offline_storage_site"),
+            )
+        except ValidationError as error:
+            return get_import_failure_response(
+                BulkFailure.ASSET_INVALID.value + str(error.message)
+            )
+        # Check that all hostnames in file are case insensitive unique
+        if "hostname" in asset_data and asset_data["hostname"]:
+            asset_data_hostname_lower = asset_data["hostname"].lower()
+            if asset_data_hostname_lower in hostnames_in_import:
+                return get_import_failure_response(
+                    "Hostname must be unique, but '"
+                    + asset_data_hostname_lower
+                    + "' appears more than once in import. "
+                )
+            hostnames_in_import.add(asset_data_hostname_lower)
+        # Check that all asset_numbers in file are unique
+        if "asset_number" in asset_data and asset_data["asset_number"]:
+            if asset_data["asset_number"] in asset_numbers_in_import:
+                return get_import_failure_response(
+                    "Asset number must be unique, but '"
+                    + str(asset_data["asset_number"])
+                    + "' appears more than once in import. "
+                )
+            asset_numbers_in_import.add(asset_data["asset_number"])
+        site = self.get_site(validated_data, chassis_in_import)
+        if model.is_blade_chassis() and asset_number:
+            self.chassis_sites_in_import[str(asset_number)] = site
+        if existing_asset:
+            # asset number specfies existing asset
+            if site and not self.user_has_asset_permission(site):
+                return get_import_failure_response(
+                    "User '"
+                    + self.user.username
+                    + "' does not have asset permission in site '"
+                    + site.abbreviation
+                    + "'. "
+                )
+            try:
+                self.validate_location_modification(validated_data, existing_asset)
+            except Exception as error:
+                return get_import_failure_response(
+                    "Asset "
+                    + str(asset_data["asset_number"])
+                    + " would conflict location with an existing asset. ",
+                    errors=str(error),
+                )
+            self.potential_modifications.append(
+                {
+                    "existing_asset": existing_asset,
+                    "new_data": asset_data,
+                    "validated_data": validated_data,
+                }
+            )
+            return None
+        # asset number not provided or it is new
+        if site and not self.user_has_asset_permission(site):
+            return JsonResponse(
+                {
+                    "failure_message": Status.AUTH_ERROR.value
+                    + AuthFailure.ASSET.value,
+                    "errors": "User "
+                    + self.user.username
+                    + " does not have asset permission in site id="
+                    + str(site.id),
+                },
+                status=HTTPStatus.UNAUTHORIZED,
+            )
+        try:
+            if validated_data.get("rack"):
+                rack_id = validated_data["rack"].id
+                validate_asset_location_in_rack(
+                    rack_id,
+                    validated_data.get("rack_position"),
+                    model.height,
+                    rack_occupancy=self.rack_occupancies[rack_id],
+                )
+            elif validated_data.get("chassis"):
+                self.validate_location_in_chassis(
+                    validated_data["chassis"].id, validated_data.get("chassis_slot")
+                )
+        except LocationException as error:
+            if "asset_number" in asset_data and asset_data["asset_number"]:
+                asset_name = str(asset_data["asset_number"])
+            elif "hostname" in asset_data and asset_data["hostname"]:
+                asset_name = asset_data["hostname"]
+            else:
+                asset_name = ""
+            return get_import_failure_response(
+                "Asset " + asset_name + " is invalid. " + str(error)
+            )
+        self.assets_to_add.append(
+            {"validated_data": validated_data, "asset_data": asset_data}
+        )
+        return None
+
+    def get_site(self, validated_data, chassis_in_import=None):
+        if validated_data.get("rack"):
+            return validated_data["rack"].datacenter
+        chassis = validated_data.get("chassis")
+        if chassis and chassis.rack:
+            return chassis.rack.datacenter
+        if chassis and chassis.offline_storage_site:
+            return chassis.offline_storage_site
+        if validated_data.get("offline_storage_site"):
+            return validated_data["offline_storage_site"]
+        return self.chassis_sites_in_import.get(chassis_in_import)
+
+    def user_has_asset_permission(self, site):
+        if site.id not in self.site_permissions:
+            self.site_permissions[site.id] = user_has_asset_permission(
+                self.user, site
+            )
+        return self.site_permissions[site.id]
+
+    def validate_location_modification(self, validated_data, existing_asset):
+        if validated_data.get("offline_storage_site"):
+            return
+        if existing_asset.model.is_rackmount():
+            rack = validated_data.get("rack")
+            rack_id = rack.id if rack else existing_asset.rack_id
+            validate_asset_location_in_rack(
+                rack_id,
+                validated_data.get("rack_position") or existing_asset.rack_position,
+                validated_data["model"].height,
+                asset_id=existing_asset.id,
+                rack_occupancy=self.rack_occupancies[rack_id],
+            )
+        else:
+            chassis = validated_data.get("chassis")
+            self.validate_location_in_chassis(
+                chassis.id if chassis else existing_asset.chassis_id,
+                validated_data.get("chassis_slot") or existing_asset.chassis_slot,
+                asset_id=existing_asset.id,
+            )
+
+    def validate_location_in_chassis(self, chassis_id, chassis_slot, asset_id=None):
+        if chassis_slot is None:
+            return
+        if chassis_slot < 1 or chassis_slot > NUM_SLOTS_IN_CHASSIS:
+            raise LocationException(str(chassis_slot) + " is not a valid slot number. ")
+        for blade_id, asset_number, blade_slot in self.blades.get(chassis_id, []):
+            if blade_id != asset_id and blade_slot == chassis_slot:
+                if asset_number:
+                    raise LocationException(
+                        "Blade location conflicts with another blade: '"
+                        + str(asset_number)
+                        + "'. "
+                    )
+                raise LocationException("Blade location conflicts with another blade.")
+
+    def add_assets(self):
+        """
+        Creates the new assets of a validated import along with their network
+        and power ports, and returns the number of assets added and a warning
+        message about power connections that could not be made.
+        """
+        if not self.assets_to_add:
+            return 0, ""
+        with transaction.atomic():
+            assets = self.create_assets()
+            network_ports = NetworkPort.objects.bulk_create(
+                [
+                    NetworkPort(asset=asset, port_name=port_name)
+                    for asset in assets
+                    for port_name in asset.model.network_ports or []
+                ],
+                batch_size=IMPORT_BATCH_SIZE,
+            )
+            power_ports, warning_message = self.get_power_ports(assets)
+            PowerPort.objects.bulk_create(power_ports, batch_size=IMPORT_BATCH_SIZE)
+            network_graph_changes = NetworkGraphChanges()
+            for asset in assets:
+                network_graph_changes.set_asset(
+                    asset.id,
+                    asset.id,
+                    asset.hostname,
+                    asset.asset_number,
+                    asset.chassis_id,
+                )
+            for network_port in network_ports:
+                network_graph_changes.set_port(
+                    network_port.id, network_port.asset_id, None
+                )
+            record_network_graph_change(network_graph_changes)
+            record_rack_usage_change()
+            queue_conflict_detection_cp(asset.id for asset in assets)
+        return len(assets), warning_message
+
+    def create_assets(self):
+        asset_numbers = [
+            asset_to_add["validated_data"].get("asset_number")
+            for asset_to_add in self.assets_to_add
+        ]
+        available_asset_numbers = iter(
+            reserve_asset_numbers(
+                asset_numbers.count(None),
+                [asset_number for asset_number in asset_numbers if asset_number],
+            )
+        )
+        assets = []
+        assets_by_number = {}
+        for asset_to_add in self.assets_to_add:
+            asset = Asset(**asset_to_add["validated_data"])
+            if not asset.asset_number:
+                asset.asset_number = next(available_asset_numbers)
+            assets.append(asset)
+            assets_by_number[asset.asset_number] = asset
+        asset_ids = AssetID.objects.bulk_create(
+            [AssetID() for _ in assets], batch_size=IMPORT_BATCH_SIZE
+        )
+        for asset, asset_id in zip(assets, asset_ids):
+            asset.id = asset.assetid_ptr_id = asset_id.id
+            asset._state.adding = False
+            asset._state.db = Asset.objects.db
+        # blades in chassis from the same import are linked once ids exist
+        for asset, asset_to_add in zip(assets, self.assets_to_add):
+            chassis_number = asset_to_add["asset_data"].get("chassis_number")
+            if chassis_number:
+                asset.chassis = assets_by_number[int(chassis_number)]
+        insert_assets(assets, IMPORT_BATCH_SIZE)
+        update_asset_locations(
+            Asset.objects.filter(id__in=[asset.id for asset in assets])
+        )
+        return assets
+
+    def get_power_ports(self, assets):
+        power_ports = []
+        warning_message = ""
+        for asset, asset_to_add in zip(assets, self.assets_to_add):
+            power_connections = asset_to_add["asset_data"].get("power_connections") or {}
+            port_names = [
+                str(port_index + 1)
+                for port_index in range(asset.model.num_power_ports or 0)
+            ]
+            failure_message = ""
+            for port_name in power_connections.keys():
+                if port_name not in port_names:
+                    failure_message += (
+                        "Power port '" + port_name + "' does not exist on this asset. "
+                    )
+            for port_name in port_names:
+                pdu_port = None
+                power_connection_data = power_connections.get(port_name)
+                if power_connection_data:
+                    pdu_port, connection_failure = connect_power_port(
+                        asset,
+                        port_name,
+                        power_connection_data,
+                        self.pdu_ports,
+                        self.connected_power_ports,
+                    )
+                    failure_message += connection_failure
+                power_ports.append(
+                    PowerPort(asset=asset, port_name=port_name, power_connection=pdu_port)
+                )
+            if failure_message:
+                warning_message += (
+                    "Some power connections couldn't be saved. " + failure_message
+                )
+        return power_ports, warning_message
+
+    def get_modifications_to_approve(self):
+        """
+        Returns the number of rows identical to their existing asset, and the
+        existing and modified data of every other row that modifies an asset.
+        The validated rows of those modifications are kept in
+        staged_modifications, to be approved with approve_asset_modifications.
+        """
+        existing_datas = RecursiveAssetSerializer(
+            [
+                potential_modification["existing_asset"]
+                for potential_modification in self.potential_modifications
+            ],
+            many=True,
+        ).data
+        serialized_chassis = {}
+        records_ignored = 0
+        modifications_to_approve = []
+        for potential_modification, existing_data in zip(
+            self.potential_modifications, existing_datas
+        ):
+            new_data = potential_modification["new_data"]
+            new_data["model"] = ITModelSerializer(
+                self.preloaded["model"][new_data["model"]]
+            ).data
+            if new_data["rack"]:
+                new_data["rack"] = RackSerializer(
+                    self.preloaded["rack"][new_data["rack"]]
+                ).data
+            if new_data.get("chassis"):
+                if new_data["chassis"] not in serialized_chassis:
+                    serialized_chassis[new_data["chassis"]] = ChassisSerializer(
+                        self.preloaded["chassis"][new_data["chassis"]]
+                    ).data
+                new_data["chassis"] = serialized_chassis[new_data["chassis"]]
+            if new_data["datacenter"]:
+                new_data["datacenter"] = SiteSerializer(
+                    self.preloaded["offline_storage_site"][new_data["datacenter"]]
+                ).data
+            if new_data["offline_storage_site"]:
+                new_data["offline_storage_site"] = SiteSerializer(
+                    self.preloaded["offline_storage_site"][
+                        new_data["offline_storage_site"]
+                    ]
+                ).data
+            existing_data = dict(existing_data)
+            # macs and connections aren't specified in this file, so ignore them
+            del existing_data["mac_addresses"]
+            del existing_data["network_connections"]
+            del existing_data["network_graph"]
+            del existing_data["blades"]
+            if records_are_identical(existing_data, new_data):
+                records_ignored += 1
+            else:
+                new_data["id"] = existing_data["id"]
+                for field in existing_data.keys():
+                    if field not in new_data:
+                        new_data[field] = None
+                modifications_to_approve.append(
+                    {"existing": existing_data, "modified": new_data}
+                )
+                self.staged_modifications[existing_data["id"]] = {
+                    "id": existing_data["id"],
+                    "fields": {
+                        field: getattr(value, "pk", value)
+                        for field, value in potential_modification[
+                            "validated_data"
+                        ].items()
+                    },
+                    "power_connections": new_data["power_connections"],
+                }
+        return records_ignored, modifications_to_approve
+
+
+def approve_asset_modifications(staged_rows):
+    """
+    Applies the approved rows staged by an asset import to their existing
+    assets with one bulk update, connects their power ports, and returns a
+    warning message about power connections that could not be made.
+    """
+    assets = Asset.objects.select_related("model").in_bulk(
+        [staged_row["id"] for staged_row in staged_rows]
+    )
+    modified_assets = []
+    modified_fields = set()
+    for staged_row in staged_rows:
+        asset = assets.get(staged_row["id"])
+        if asset is None:
+            continue
+        for field, value in staged_row["fields"].items():
+            setattr(asset, Asset._meta.get_field(field).attname, value)
+            modified_fields.add(field)
+        modified_assets.append((asset, staged_row["power_connections"]))
+    if not modified_assets:
+        return ""
+    rack_ids = {asset.rack_id for asset, _ in modified_assets if asset.rack_id}
+    pdu_ports = {
+        (pdu_port.rack_id, pdu_port.left_right, pdu_port.port_number): pdu_port
+        for pdu_port in PDUPort.objects.filter(rack__in=rack_ids)
+    }
+    connected_power_ports = get_connected_power_ports(rack_ids)
+    power_ports = {
+        (power_port.asset_id, power_port.port_name): power_port
+        for power_port in PowerPort.objects.filter(
+            asset__in=[asset for asset, _ in modified_assets]
+        )
+    }
+    power_ports_to_update = []
+    warning_message = ""
+    for asset, power_connections in modified_assets:
+        failure_message = ""
+        for port_name, power_connection_data in power_connections.items():
+            power_port = power_ports.get((asset.id, port_name))
+            if power_port is None:
+                failure_message += (
+                    "Power port '" + port_name + "' does not exist on this asset. "
+                )
+                continue
+            pdu_port, connection_failure = connect_power_port(
+                asset,
+                port_name,
+                power_connection_data,
+                pdu_ports,
+                connected_power_ports,
+            )
+            failure_message += connection_failure
+            if pdu_port:
+                power_port.power_connection = pdu_port
+                power_ports_to_update.append(power_port)
+        if failure_message:
+            warning_message += (
+                "Some power connections couldn't be saved. " + failure_message
+            )
+    with transaction.atomic():
+        Asset.objects.bulk_update(
+            [asset for asset, _ in modified_assets],
+            modified_fields,
+            batch_size=IMPORT_BATCH_SIZE,
+        )
+        # blades move with their chassis
+        modified_asset_ids = [asset.id for asset, _ in modified_assets]
+        update_asset_locations(
+            Asset.objects.filter(
+                Q(id__in=modified_asset_ids) | Q(chassis__in=modified_asset_ids)
+            )
+        )
+        PowerPort.objects.bulk_update(
+            power_ports_to_update,
+            ["power_connection"],
+            batch_size=IMPORT_BATCH_SIZE,
+        )
+        network_graph_changes = NetworkGraphChanges()
+        for asset, _ in modified_assets:
+            network_graph_changes.set_asset(
+                asset.id,
+                asset.id,
+                asset.hostname,
+                asset.asset_number,
+                asset.chassis_id,
+            )
+        record_network_graph_change(network_graph_changes)
+        queue_conflict_detection_cp(asset.id for asset, _ in modified_assets)
+        record_change_plan_diff_change()
+        record_rack_usage_change()
+    return warning_message
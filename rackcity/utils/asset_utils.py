@@ -1,4 +1,5 @@
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import transaction
 from django.db.models import Q
 
 from rackcity.models import (
@@ -393,7 +394,10 @@ def save_mac_addresses(asset_data, asset_id, change_plan=None):
         mac_address = mac_address_assignments[port_name]
         network_port.mac_address = mac_address
         try:
-            network_port.save()
+            # a mac address too long for the database must not abort the
+            # surrounding transaction
+            with transaction.atomic():
+                network_port.save()
         except Exception:
             failure_message += "Mac address '" + mac_address + "' is not valid. "
     if failure_message:
@@ -0,0 +1,171 @@
+import atexit
+from contextlib import contextmanager
+import os
+import pexpect
+import queue
+import re
+import threading
+from rackcity.utils.exceptions import BCMANException
+
+BCMAN_URL = "hyposoft-mgt.colab.duke.edu"
+BCMAN_PROMPT = "bcman"
+# Seconds to wait for each response from BCMAN
+BCMAN_TIMEOUT = 20
+BCMAN_POOL_SIZE = 2
+BLADE_SLOTS = range(1, 15)
+
+
+class BCMANSession:
+    """
+    A logged in, long-lived session with the BCMAN blade chassis power
+    manager. A session is only ever used by one request at a time.
+    """
+
+    def __init__(self, command, args, password):
+        self.process = pexpect.spawn(
+            command, args, encoding="utf-8", timeout=BCMAN_TIMEOUT
+        )
+        if self.process.expect(["yes/no", "assword"]) == 0:
+            self.process.send("yes\r")
+            self.process.expect("assword")
+        self.process.send(password + "\r")
+        self.process.expect(BCMAN_PROMPT)
+
+    def send_command(self, command):
+        self.process.send(command + "\r")
+        self.process.expect(BCMAN_PROMPT)
+
+    def select_chassis(self, chassis):
+        self.send_command("chassis " + chassis)
+
+    def run_power_command(self, chassis, blade, power_command):
+        """
+        Runs a power command ("on", "off", or "" for status) on a blade of the
+        selected chassis, and returns the line BCMAN answers with.
+        """
+        self.send_command("blade " + str(blade))
+        self.process.send("power " + power_command + "\r")
+        self.process.expect(
+            re.escape("chassis '" + chassis + "' blade " + str(blade)) + r"[^\r\n]*"
+        )
+        output = self.process.after
+        self.process.expect(BCMAN_PROMPT)
+        return output
+
+    def close(self):
+        try:
+            self.process.send("exit\r")
+        except OSError:
+            pass
+        self.process.close(force=True)
+
+
+def create_bcman_session():
+    return BCMANSession(
+        "ssh",
+        [
+            os.environ["BCMAN_USERNAME"] + "@" + BCMAN_URL,
+            os.environ["BCMAN_OPTIONS"],
+        ],
+        os.environ["BCMAN_PASSWORD"],
+    )
+
+
+class BCMANSessionPool:
+    """
+    Keeps up to size BCMAN sessions open and lends each one out to a single
+    request at a time, so commands on a session never interleave.
+    """
+
+    def __init__(self, size=BCMAN_POOL_SIZE, session_factory=create_bcman_session):
+        self.session_factory = session_factory
+        self.idle_sessions = queue.LifoQueue()
+        self.available = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def session(self):
+        if not self.available.acquire(timeout=BCMAN_TIMEOUT):
+            raise BCMANException("Timed out waiting for a free BCMAN session. ")
+        try:
+            try:
+                session = self.idle_sessions.get_nowait()
+            except queue.Empty:
+                session = self.session_factory()
+            try:
+                yield session
+            except Exception:
+                # the session may be left mid-command, so it is not reused
+                session.close()
+                raise
+            self.idle_sessions.put(session)
+        finally:
+            self.available.release()
+
+    def run(self, action):
+        """
+        Runs action with a session, retrying once on a fresh session if the
+        session had been closed by BCMAN since it was last used.
+        """
+        for attempt in range(2):
+            try:
+                with self.session() as session:
+                    return action(session)
+            except pexpect.EOF as error:
+                if attempt:
+                    raise BCMANException(
+                        "BCMAN closed the connection: " + str(error)
+                    )
+            except pexpect.TIMEOUT:
+                raise BCMANException("Timed out waiting for BCMAN. ")
+            except pexpect.ExceptionPexpect as error:
+                raise BCMANException(str(error))
+
+    def close(self):
+        while True:
+            try:
+                self.idle_sessions.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+bcman_pool = BCMANSessionPool()
+atexit.register(bcman_pool.close)
+
+
+def make_bcman_request(chassis, blade, power_command, pool=bcman_pool):
+    """
+    Runs a power command ("on", "off", or "" for status) on one blade slot of
+    a chassis, and returns BCMAN's answer, e.g. "chassis 'c1' blade 3 is ON".
+    """
+
+    def run_power_command(session):
+        session.select_chassis(chassis)
+        return session.run_power_command(chassis, blade, power_command)
+
+    return pool.run(run_power_command)
+
+
+def get_bcman_blade_power_states(chassis, pool=bcman_pool):
+    """
+    Returns the power state ("ON" or "OFF") of every blade slot of a chassis,
+    keyed by slot, using a single session.
+    """
+
+    def get_power_states(session):
+        session.select_chassis(chassis)
+        return {
+            blade_slot: parse_bcman_power_state(
+                session.run_power_command(chassis, blade_slot, "")
+            )
+            for blade_slot in BLADE_SLOTS
+        }
+
+    return pool.run(get_power_states)
+
+
+def parse_bcman_power_state(result):
+    if "is ON" in result:
+        return "ON"
+    elif "is OFF" in result:
+        return "OFF"
+    return None
@@ -0,0 +1,15 @@
+from django.conf import settings
+
+# Cache backends that keep a separate cache in each worker process
+PER_PROCESS_CACHE_BACKENDS = [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+
+
+def is_cache_shared():
+    """
+    Returns whether the default cache is shared by all worker processes, so
+    that what one worker caches or invalidates is seen by the others.
+    """
+    return settings.CACHES["default"]["BACKEND"] not in PER_PROCESS_CACHE_BACKENDS
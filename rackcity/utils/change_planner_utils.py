@@ -1,11 +1,20 @@
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from django.http import JsonResponse
 from enum import Enum
 from http import HTTPStatus
 import math
+import threading
 from rackcity.api.serializers import (
     RecursiveAssetSerializer,
     RecursiveAssetCPSerializer,
@@ -20,21 +29,24 @@ from rackcity.models import (
     ChangePlan,
     DecommissionedAsset,
 )
-from rackcity.utils.asset_changes_utils import get_changes_on_asset
+from rackcity.models.asset import exclude_assets_modified_in_cp
+from rackcity.utils.asset_changes_utils import (
+    compute_change_plan_diff,
+    get_change_plan_diff,
+    record_change_plan_diff_change,
+)
 from rackcity.utils.errors_utils import Status, GenericFailure
-from rackcity.utils.exceptions import LocationException
 from rackcity.utils.query_utils import (
     get_filtered_query,
     get_invalid_paginated_request_response,
     should_paginate_query,
-    get_sorted_query,
+    get_merged_page,
+    get_sort_arguments,
     get_online_filter,
     get_offline_filter,
 )
-from rackcity.utils.rackcity_utils import (
-    validate_asset_location_in_rack,
-    validate_asset_location_in_chassis,
-)
+from rackcity.utils.rackcity_utils import get_rack_occupancies
+from rackcity.utils.transaction_utils import has_commit_hook, schedule_on_commit
 
 
 class ModificationType(Enum):
@@ -55,79 +67,148 @@ def mark_delete_conflicts_cp(sender, **kwargs):
     ).update(is_conflict=True)
 
 
+class ConflictDetectionQueue(threading.local):
+    """
+    Ids of the assets changed live in this thread whose conflicts with open
+    change plans have not been detected yet.
+    """
+
+    def __init__(self):
+        self.asset_ids = set()
+
+
+conflict_detection_queue = ConflictDetectionQueue()
+
+
 @receiver(post_save, sender=Asset)
-def detect_conflicts_cp(sender, **kwargs):
+def mark_save_conflicts_cp(sender, **kwargs):
     """
-    Mark conflict for affected assets on change plan when an asset is
+    Queue conflict detection for assets on change plans when an asset is
     modified live. This method is automatically called after Asset save.
+    """
+    queue_conflict_detection_cp([kwargs.get("instance").id])
+
+
+def queue_conflict_detection_cp(asset_ids):
+    """
+    Detects conflicts for the assets once the surrounding transaction
+    commits, together with every other asset queued during the transaction.
+    Outside of a transaction, conflicts are detected right away.
+    """
+    is_scheduled = has_commit_hook(conflict_detection_queue)
+    if not is_scheduled:
+        # assets queued by a transaction that was rolled back did not change
+        conflict_detection_queue.asset_ids = set()
+    conflict_detection_queue.asset_ids.update(asset_ids)
+    if not is_scheduled:
+        schedule_on_commit(conflict_detection_queue, detect_queued_conflicts_cp)
+
+
+def detect_queued_conflicts_cp():
+    asset_ids = conflict_detection_queue.asset_ids
+    conflict_detection_queue.asset_ids = set()
+    detect_conflicts_cp(asset_ids)
+
 
-    fields: sender, instance, created, raw, using, update_fields
-    asset is a related asset of assetCP
+def detect_conflicts_cp(asset_ids):
     """
-    asset = kwargs.get("instance")
-    related_assets_cp = AssetCP.objects.filter(
-        related_asset=asset.id, change_plan__execution_time=None,
+    Mark conflicts between the given live assets and the assets on every
+    open change plan, replacing any conflicts marked for them before. Takes
+    a fixed number of queries however many assets are given.
+    """
+    open_assets_cp = AssetCP.objects.filter(change_plan__execution_time=None)
+    if not asset_ids or not open_assets_cp.exists():
+        return
+    assets = Asset.objects.filter(id__in=asset_ids).values(
+        "id", "hostname", "asset_number", "rack_id", "chassis_id", "chassis_slot",
     )
-    for related_asset_cp in related_assets_cp:
-        related_asset_cp.is_conflict = True
-        related_asset_cp.save()
-
-    # asset hostname conflicts with hostnames on an active assetCP
-    asset.hostname_conflict.clear()
-    if asset.hostname:
-        AssetCP.objects.filter(
-            Q(hostname=asset.hostname)
-            & ~Q(related_asset=asset.id)
-            & Q(change_plan__execution_time=None)
-        ).update(asset_conflict_hostname=asset)
-
-    # asset rack location conflicts with an active assetCP
-    asset.location_conflict.clear()
-    if asset.model.is_rackmount() and asset.rack:
-        for asset_cp in AssetCP.objects.filter(
-            Q(rack=asset.rack_id)
-            & ~Q(related_asset=asset.id)
-            & Q(change_plan__execution_time=None)
+
+    # the live version of an asset on a change plan has changed
+    open_assets_cp.filter(related_asset__in=asset_ids).update(is_conflict=True)
+    AssetCP.objects.filter(asset_conflict_hostname__in=asset_ids).update(
+        asset_conflict_hostname=None
+    )
+    AssetCP.objects.filter(asset_conflict_asset_number__in=asset_ids).update(
+        asset_conflict_asset_number=None
+    )
+    AssetCP.objects.filter(asset_conflict_location__in=asset_ids).update(
+        asset_conflict_location=None
+    )
+
+    # asset hostname or asset number conflicts with one on an active assetCP
+    open_assets_cp.filter(
+        hostname__in=[asset["hostname"] for asset in assets if asset["hostname"]]
+    ).exclude(related_asset__hostname=F("hostname")).update(
+        asset_conflict_hostname=Subquery(
+            Asset.objects.filter(hostname=OuterRef("hostname")).values("id")[:1]
+        )
+    )
+    open_assets_cp.filter(
+        asset_number__in=[asset["asset_number"] for asset in assets]
+    ).exclude(related_asset__asset_number=F("asset_number")).update(
+        asset_conflict_asset_number=Subquery(
+            Asset.objects.filter(asset_number=OuterRef("asset_number")).values(
+                "id"
+            )[:1]
+        )
+    )
+
+    # asset location conflicts with an active assetCP's location
+    location_conflicts = {}
+    rack_ids = {asset["rack_id"] for asset in assets if asset["rack_id"]}
+    if rack_ids:
+        rack_occupancies = get_rack_occupancies(rack_ids)
+        for (
+            asset_cp_id,
+            rack_id,
+            rack_position,
+            height,
+            related_asset_id,
+        ) in open_assets_cp.filter(
+            rack__in=rack_ids, rack_position__isnull=False, model__isnull=False,
+        ).values_list(
+            "id", "rack_id", "rack_position", "model__height", "related_asset_id"
         ):
-            try:
-                validate_asset_location_in_rack(
-                    asset.rack_id,
-                    asset_cp.rack_position,
-                    asset_cp.model.height,
-                    asset_id=asset_cp.id,
-                    related_asset_id=asset_cp.related_asset_id,
-                )
-            except LocationException as e:
-                AssetCP.objects.filter(id=asset_cp.id).update(
-                    asset_conflict_location=asset
-                )
-    else:
-        for asset_cp in AssetCP.objects.filter(
-            Q(chassis=asset.chassis_id)
-            & ~Q(related_asset=asset.id)
-            & Q(change_plan__execution_time=None)
+            conflict = rack_occupancies[rack_id].get_conflict(
+                rack_position,
+                height or 1,
+                ignored_ids={asset_cp_id, related_asset_id} - {None},
+            )
+            if conflict:
+                location_conflicts[asset_cp_id] = conflict[0]
+    blade_locations = {
+        (asset["chassis_id"], asset["chassis_slot"]): asset["id"]
+        for asset in assets
+        if asset["chassis_id"] and asset["chassis_slot"]
+    }
+    if blade_locations:
+        for (
+            asset_cp_id,
+            chassis_id,
+            chassis_slot,
+            related_asset_id,
+        ) in open_assets_cp.filter(
+            chassis__related_asset__in={
+                chassis_id for chassis_id, _ in blade_locations
+            },
+        ).values_list(
+            "id", "chassis__related_asset_id", "chassis_slot", "related_asset_id"
         ):
-            try:
-                # TODO: add check for blades
-                validate_asset_location_in_chassis(
-                    asset.chassis_id,
-                    asset_cp.chassis_slot,
-                    asset_id=asset_cp.id,
-                    related_asset_id=asset_cp.related_asset_id,
-                )
-            except LocationException:
-                asset_cp.asset_conflict_location = asset
-                AssetCP.objects.filter(id=asset_cp.id).update(
-                    asset_conflict_location=asset
-                )
-
-    # asset number conflicts with an active assetCP
-    asset.asset_number_conflict.clear()
-    AssetCP.objects.filter(
-        Q(asset_number=asset.asset_number)
-        & ~Q(related_asset_id=asset.id)
-        & Q(change_plan__execution_time=None)
-    ).update(asset_conflict_asset_number=asset)
+            asset_id = blade_locations.get((chassis_id, chassis_slot))
+            if asset_id and asset_id != related_asset_id:
+                location_conflicts[asset_cp_id] = asset_id
+    if location_conflicts:
+        AssetCP.objects.filter(id__in=location_conflicts.keys()).update(
+            asset_conflict_location=Case(
+                *[
+                    When(id=asset_cp_id, then=Value(asset_id))
+                    for asset_cp_id, asset_id in location_conflicts.items()
+                ],
+                output_field=IntegerField(),
+            )
+        )
+    # conflicts on every open change plan may have changed
+    record_change_plan_diff_change()
 
 
 def get_change_plan(change_plan_id):
@@ -156,9 +237,7 @@ def get_racked_assets_for_cp(change_plan):
     online_filter = get_online_filter()
     racked_assets = Asset.objects.filter(online_filter)
     racked_assets_cp = AssetCP.objects.filter(online_filter, change_plan=change_plan,)
-    for asset_cp in racked_assets_cp:
-        if asset_cp.related_asset and (asset_cp.related_asset in racked_assets):
-            racked_assets = racked_assets.filter(~Q(id=asset_cp.related_asset.id))
+    racked_assets = exclude_assets_modified_in_cp(racked_assets, racked_assets_cp)
 
     ## don't return decommissioned asset_cps:
     racked_assets_cp = racked_assets_cp.filter(is_decommissioned=False)
@@ -172,10 +251,7 @@ def get_offline_storage_assets_for_cp(change_plan):
     stored_assets_cp = AssetCP.objects.filter(
         offline_filter, change_plan=change_plan
     )
-
-    for asset_cp in stored_assets_cp:
-        if asset_cp.related_asset and (asset_cp.related_asset in stored_assets):
-            stored_assets = stored_assets.filter(~Q(id=asset_cp.related_asset.id))
+    stored_assets = exclude_assets_modified_in_cp(stored_assets, stored_assets_cp)
     stored_assets_cp = stored_assets_cp.filter(is_decommissioned=False)
     return stored_assets, stored_assets_cp
 
@@ -204,33 +280,6 @@ def get_filtered_assets_for_cp(change_plan, data, decommissioned, stored):
     return filtered_assets, filtered_assets_cp, None
 
 
-def get_sorted_assets_for_cp(assets, assets_cp, data):
-    sorted_assets, sort_failure_response = get_sorted_query(
-        assets, data, default_order="asset_number"
-    )
-    if sort_failure_response:
-        return None, None, sort_failure_response
-    sorted_assets_cp, sort_failure_response = get_sorted_query(
-        assets_cp, data, default_order="asset_number"
-    )
-    if sort_failure_response:
-        return None, None, sort_failure_response
-    return sorted_assets, sorted_assets_cp, None
-
-
-def get_page_of_serialized_assets(all_assets, query_params):
-    page = int(query_params.get("page"))
-    page_size = int(query_params.get("page_size"))
-    start = (page - 1) * page_size
-    end = page * page_size
-    if start > len(all_assets):
-        raise Exception("Page " + str(start) + " does not exist")
-    elif end > len(all_assets):
-        return all_assets[start:]
-    else:
-        return all_assets[start:end]
-
-
 def get_many_assets_response_for_cp(
     request, change_plan, decommissioned=False, stored=False
 ):
@@ -250,47 +299,60 @@ def get_many_assets_response_for_cp(
     if filter_failure_response:
         return filter_failure_response
 
-    sorted_assets, sorted_assets_cp, sort_failure_response = get_sorted_assets_for_cp(
-        filtered_assets, filtered_assets_cp, request.data,
-    )
-    if sort_failure_response:
-        return sort_failure_response
-
-    all_assets = list(sorted_assets_cp) + list(sorted_assets)
-
     if should_paginate:
-        try:
-            page_of_assets = get_page_of_serialized_assets(
-                all_assets, request.query_params,
-            )
-        except Exception as error:
-            return JsonResponse(
-                {
-                    "failure_message": Status.ERROR.value
-                    + GenericFailure.PAGE_ERROR.value,
-                    "errors": str(error),
-                },
-                status=HTTPStatus.BAD_REQUEST,
-            )
+        page = int(request.query_params.get("page"))
+        page_size = int(request.query_params.get("page_size"))
     else:
-        page_of_assets = all_assets
-
-    assets_data = []
-    for asset in page_of_assets:
-        if decommissioned:
-            if isinstance(asset, DecommissionedAsset):
-                asset_serializer = GetDecommissionedAssetSerializer(asset)
-                assets_data.append(asset_serializer.data)
-            elif isinstance(asset, AssetCP):
-                asset_serializer = GetDecommissionedAssetCPSerializer(asset)
-                assets_data.append(asset_serializer.data)
-        else:
-            if isinstance(asset, Asset):
-                asset_serializer = RecursiveAssetSerializer(asset)
-                assets_data.append(asset_serializer.data)
-            elif isinstance(asset, AssetCP):
-                asset_serializer = RecursiveAssetCPSerializer(asset)
-                assets_data.append(asset_serializer.data)
+        page = page_size = None
+    try:
+        get_sort_arguments(request.data)
+    except Exception as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.ERROR.value + GenericFailure.SORT.value,
+                "errors": str(error),
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    try:
+        page_of_assets = get_merged_page(
+            [filtered_assets_cp, filtered_assets],
+            request.data,
+            default_order="asset_number",
+            page=page,
+            page_size=page_size,
+        )
+    except Exception as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.ERROR.value + GenericFailure.PAGE_ERROR.value,
+                "errors": str(error),
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+
+    if decommissioned:
+        serializer_by_model = {
+            DecommissionedAsset: GetDecommissionedAssetSerializer,
+            AssetCP: GetDecommissionedAssetCPSerializer,
+        }
+    else:
+        serializer_by_model = {
+            Asset: RecursiveAssetSerializer,
+            AssetCP: RecursiveAssetCPSerializer,
+        }
+    assets_data_by_key = {}
+    for model, serializer in serializer_by_model.items():
+        assets_of_model = [
+            asset for asset in page_of_assets if isinstance(asset, model)
+        ]
+        for asset, asset_data in zip(
+            assets_of_model, serializer(assets_of_model, many=True).data
+        ):
+            assets_data_by_key[(model, asset.id)] = asset_data
+    assets_data = [
+        assets_data_by_key[(type(asset), asset.id)] for asset in page_of_assets
+    ]
 
     return JsonResponse({"assets": assets_data}, status=HTTPStatus.OK)
 
@@ -320,106 +382,6 @@ def get_page_count_response_for_cp(
     return JsonResponse({"page_count": page_count})
 
 
-def get_cp_modification_conflicts(asset_cp):
-    conflicts = []
-    nonresolvable_message = (
-        "This conflict cannot be resolved automatically; the "
-        + "related changes need to be removed from your change plan."
-    )
-    conflicting_asset_message_1 = (
-        "Due to more recent live changes, "
-        + "your change plan version of this asset's "
-    )
-    conflicting_asset_message_2 = " now conflicts with a live asset. "
-    if asset_cp.is_conflict and asset_cp.related_asset is None:
-        if asset_cp.related_decommissioned_asset:
-            conflicts.append(
-                {
-                    "conflict_message": "This asset has been decommissioned in a live change. "
-                    + nonresolvable_message,
-                    "conflicting_asset": None,
-                    "conflict_resolvable": False,
-                }
-            )
-        else:
-            conflicts.append(
-                {
-                    "conflict_message": "This asset has been deleted live. "
-                    + nonresolvable_message
-                }
-            )
-    if asset_cp.asset_conflict_hostname:
-        conflicts.append(
-            {
-                "conflict_message": conflicting_asset_message_1
-                + "hostname"
-                + conflicting_asset_message_2
-                + nonresolvable_message,
-                "conflicting_asset": asset_cp.asset_conflict_hostname.id,
-                "conflict_resolvable": False,
-            }
-        )
-    if asset_cp.asset_conflict_asset_number:
-        conflicts.append(
-            {
-                "conflict_message": conflicting_asset_message_1
-                + "asset number"
-                + conflicting_asset_message_2
-                + nonresolvable_message,
-                "conflicting_asset": asset_cp.asset_conflict_asset_number.id,
-                "conflict_resolvable": False,
-            }
-        )
-    if asset_cp.asset_conflict_location:
-        conflicts.append(
-            {
-                "conflict_message": conflicting_asset_message_1
-                + "rack location"
-                + conflicting_asset_message_2
-                + nonresolvable_message,
-                "conflicting_asset": asset_cp.asset_conflict_location.id,
-                "conflict_resolvable": False,
-            }
-        )
-    deleted_relation_message = " associated with this asset has been deleted. "
-    if asset_cp.model is None:
-        conflicts.append(
-            {
-                "conflict_message": "The model"
-                + deleted_relation_message
-                + nonresolvable_message,
-                "conflicting_asset": None,
-                "conflict_resolvable": False,
-            }
-        )
-    if asset_cp.model.is_rackmount() and asset_cp.offline_storage_site is None and asset_cp.rack is None:
-        conflicts.append(
-            {
-                "conflict_message": "The rack"
-                + deleted_relation_message
-                + nonresolvable_message,
-                "conflicting_asset": None,
-                "conflict_resolvable": False,
-            }
-        )
-    if len(conflicts) == 0:
-        if asset_cp.is_conflict:
-            conflicts.append(
-                {
-                    "conflict_message": "Live changes have been made to this asset since your "
-                    + "latest change planner modification. This conflict "
-                    + "needs to be resolved. Please select which version "
-                    + "you would like to keep.",
-                    "conflicting_asset": None,
-                    "conflict_resolvable": True,
-                }
-            )
-    if len(conflicts) == 0:
-        return None
-    else:
-        return conflicts
-
-
 def get_location_detail(asset):
     if asset.is_in_offline_storage():
         return " in offline storage site " + asset.offline_storage_site.abbreviation
@@ -457,25 +419,51 @@ def get_location_detail(asset):
 
 
 def get_modifications_in_cp(change_plan):
-    assets_cp = AssetCP.objects.filter(change_plan=change_plan)
+    all_assets_cp = list(
+        AssetCP.objects.filter(change_plan=change_plan).select_related(
+            "model",
+            "rack__datacenter",
+            "offline_storage_site",
+            "effective_site",
+            "chassis__rack__datacenter",
+            "related_asset",
+        )
+    )
+    change_plan_diff = get_change_plan_diff(change_plan)
+    if any(asset_cp.id not in change_plan_diff for asset_cp in all_assets_cp):
+        # assets were added to the change plan after its diff was cached
+        change_plan_diff = compute_change_plan_diff(change_plan)
+    assets_cp = []
+    for asset_cp in all_assets_cp:
+        if asset_cp.related_asset and (
+            (
+                not change_plan.execution_time
+                and not change_plan_diff[asset_cp.id]["changes"]
+                and not asset_cp.is_decommissioned
+            )
+            or (change_plan.execution_time and not asset_cp.differs_from_live)
+        ):
+            continue
+        assets_cp.append(asset_cp)
+    related_assets = [
+        asset_cp.related_asset for asset_cp in assets_cp if asset_cp.related_asset
+    ]
+    related_assets_data = {
+        asset_data["id"]: asset_data
+        for asset_data in RecursiveAssetSerializer(related_assets, many=True).data
+    }
     modifications = []
     for asset_cp in assets_cp:
         related_asset = asset_cp.related_asset
         if related_asset:
-            changes = get_changes_on_asset(related_asset, asset_cp)
-
-            if (
-                not change_plan.execution_time
-                and len(changes) == 0
-                and not asset_cp.is_decommissioned
-            ) or (change_plan.execution_time and not asset_cp.differs_from_live):
-
-                continue
-            asset_data = RecursiveAssetSerializer(related_asset).data
+            asset_data = related_assets_data[related_asset.id]
+            changes = change_plan_diff[asset_cp.id]["changes"]
         else:
             asset_data = None
             changes = None
-        asset_cp_data = RecursiveAssetCPSerializer(asset_cp).data
+        asset_cp_data = RecursiveAssetCPSerializer(
+            asset_cp, context={"change_plan_diff": change_plan_diff}
+        ).data
         if asset_cp.is_decommissioned:
             modification_type = ModificationType.DECOMMISSION
             title = "Decommission asset"
@@ -507,7 +495,7 @@ def get_modifications_in_cp(change_plan):
                 "type": modification_type.value,
                 "asset": asset_data,
                 "asset_cp": asset_cp_data,
-                "conflicts": get_cp_modification_conflicts(asset_cp),
+                "conflicts": change_plan_diff[asset_cp.id]["conflicts"],
                 "changes": changes,
             }
         )
@@ -58,6 +58,10 @@ class BulkFailure(Enum):
     )
     MODEL_INVALID = "At least one provided model was not valid: "
     ASSET_INVALID = "At least one provided asset was not valid: "
+    IMPORT_SESSION = (
+        "This import can no longer be approved. "
+        + "Please upload the file again."
+    )
 
 
 class PowerFailure(Enum):
@@ -1,3 +1,7 @@
+from datetime import datetime
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.http import JsonResponse
 from http import HTTPStatus
 from rackcity.api.serializers import (
@@ -6,90 +10,435 @@ from rackcity.api.serializers import (
 )
 from rackcity.models import (
     Asset,
+    AssetCP,
+    AssetID,
     NetworkPort,
     NetworkPortCP,
     PDUPort,
     PowerPort,
     PowerPortCP,
+    validate_location_type,
 )
+from rackcity.models.asset import (
+    insert_assets,
+    reserve_asset_numbers,
+    update_asset_locations,
+    validate_hostname,
+    validate_owner,
+)
+from rackcity.utils.asset_changes_utils import (
+    compute_change_plan_diff,
+    record_change_plan_diff_change,
+)
+from rackcity.utils.change_planner_utils import queue_conflict_detection_cp
 from rackcity.utils.errors_utils import (
     Status,
     parse_serializer_errors,
     parse_save_validation_error,
 )
+from rackcity.utils.log_utils import (
+    Action,
+    get_action_log,
+    log_execute_change_plan,
+    write_logs,
+)
+from rackcity.utils.report_utils import record_rack_usage_change
+from rackcity.utils.network_graph_utils import (
+    NetworkGraphChanges,
+    record_network_graph_change,
+)
 
+# Rows per INSERT or UPDATE statement when executing a change plan
+CHANGE_PLAN_BATCH_SIZE = 1000
 
-def get_updated_asset(asset_cp, chassis_live=None):
-    created = False
-    related_asset = asset_cp.related_asset
-    if related_asset:
-        updated_asset = related_asset
-    else:
-        updated_asset = Asset()
-        created = True
-    for field in Asset._meta.fields:
-        if (
-            field.name != "id"
-            and field.name != "assetid_ptr"
-            and field.name != "chassis"
+
+class ChangePlanExecution:
+    """
+    Applies every change on a change plan to the live assets in a single
+    transaction. The changes are computed up front, assets and their ports
+    are written with bulk queries, and the audit log is written in one batch.
+    """
+
+    def __init__(self, user, change_plan):
+        self.user = user
+        self.change_plan = change_plan
+        self.num_created = 0
+        self.num_modified = 0
+        self.num_decommissioned = 0
+
+    def execute(self):
+        """
+        Returns a failure response if the change plan could not be executed,
+        in which case none of its changes are made.
+        """
+        try:
+            with transaction.atomic():
+                failure_response = self.apply_changes()
+                if failure_response:
+                    transaction.set_rollback(True)
+                return failure_response
+        except (IntegrityError, ValidationError) as error:
+            return JsonResponse(
+                {
+                    "failure_message": Status.ERROR.value
+                    + parse_save_validation_error(error, "Asset "),
+                    "errors": str(error),
+                },
+                status=HTTPStatus.BAD_REQUEST,
+            )
+
+    def apply_changes(self):
+        # the live assets on the change plan are locked, and the diff is read
+        # from the database rather than the cache, so that conflicts are
+        # checked against the live assets that are about to be overwritten
+        list(
+            Asset.objects.select_for_update()
+            .filter(
+                id__in=AssetCP.objects.filter(change_plan=self.change_plan).values(
+                    "related_asset_id"
+                )
+            )
+            .values_list("id", flat=True)
+        )
+        change_plan_diff = compute_change_plan_diff(self.change_plan)
+        for asset_cp_id, asset_cp_diff in change_plan_diff.items():
+            if asset_cp_diff["conflicts"]:
+                return JsonResponse(
+                    {
+                        "failure_message": Status.ERROR.value
+                        + "All conflicts must be resolved before a change "
+                        + "plan can be executed.",
+                        "errors": "Conflict found on AssetCP with id="
+                        + str(asset_cp_id),
+                    },
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+        self.change_plan.execution_time = datetime.now()
+        self.change_plan.save()
+        assets_cp = list(
+            AssetCP.objects.filter(change_plan=self.change_plan).select_related(
+                "model", "related_asset", "chassis"
+            )
+        )
+        created_asset_cp_ids = {
+            asset_cp.id for asset_cp in assets_cp if asset_cp.related_asset is None
+        }
+        updated_assets = self.update_assets(assets_cp)
+        self.update_network_ports(assets_cp, updated_assets)
+        self.update_power_ports(assets_cp, updated_assets)
+
+        logs = []
+        for asset_cp in assets_cp:
+            asset_cp.differs_from_live = True
+            if asset_cp.is_decommissioned:
+                continue
+            if asset_cp.id in created_asset_cp_ids:
+                self.num_created += 1
+                action = Action.CREATE
+            elif change_plan_diff[asset_cp.id]["changes"]:
+                self.num_modified += 1
+                action = Action.MODIFY
+            else:
+                asset_cp.differs_from_live = False
+                continue
+            logs.append(
+                get_action_log(
+                    self.user,
+                    updated_assets[asset_cp.id],
+                    action,
+                    change_plan=self.change_plan,
+                )
+            )
+        AssetCP.objects.bulk_update(
+            assets_cp,
+            ["related_asset", "differs_from_live"],
+            batch_size=CHANGE_PLAN_BATCH_SIZE,
+        )
+
+        # blades are decommissioned first, as a chassis cannot be deleted
+        # while it has blades
+        for asset_cp in sorted(
+            assets_cp, key=lambda asset_cp: not asset_cp.model.is_blade_asset()
         ):
-            setattr(updated_asset, field.name, getattr(asset_cp, field.name))
-    if chassis_live:
-        updated_asset.chassis = chassis_live
-    else:
-        updated_asset.chassis = asset_cp.chassis
-    # Assigns asset number, creates network & power ports on save
-    updated_asset.save()
-    if not related_asset:
-        # If asset was created, put that in related_asset field (network ports)
-        asset_cp.related_asset = updated_asset
-        asset_cp.save()
-    return updated_asset, created
-
-
-def update_network_ports(updated_asset, asset_cp, change_plan):
-    network_ports_cp = NetworkPortCP.objects.filter(
-        change_plan=change_plan, asset=asset_cp,
-    )
-    for network_port_cp in network_ports_cp:
-        network_port_to_update = NetworkPort.objects.get(
-            asset=updated_asset, port_name=network_port_cp.port_name,
-        )
-        if network_port_cp.connected_port:
-            destination_host = network_port_cp.connected_port.asset.related_asset
-            if destination_host:
-                destination_port_to_connect = NetworkPort.objects.get(
-                    asset=destination_host,
-                    port_name=network_port_cp.connected_port.port_name,
+            if not asset_cp.is_decommissioned:
+                continue
+            failure_response = decommission_asset_cp(
+                updated_assets[asset_cp.id], asset_cp, self.change_plan
+            )
+            if failure_response:
+                return failure_response
+            self.num_decommissioned += 1
+            logs.append(
+                get_action_log(
+                    self.user, None, Action.DECOMMISSION, change_plan=self.change_plan,
                 )
-                network_port_to_update.connected_port = destination_port_to_connect
-                destination_port_to_connect.connected_port = network_port_to_update
-                destination_port_to_connect.save()
-        else:
-            network_port_to_update.connected_port = None
-        network_port_to_update.mac_address = network_port_cp.mac_address
-        network_port_to_update.save()
-
-
-def update_power_ports(updated_asset, asset_cp, change_plan):
-    power_ports_cp = PowerPortCP.objects.filter(
-        change_plan=change_plan, asset=asset_cp,
-    )
-    for power_port_cp in power_ports_cp:
-        power_port_to_update = PowerPort.objects.get(
-            asset=updated_asset, port_name=power_port_cp.port_name,
-        )
-        pdu_port_cp = power_port_cp.power_connection
-        if pdu_port_cp:
-            pdu_port_to_connect = PDUPort.objects.get(
-                rack=pdu_port_cp.rack,
-                left_right=pdu_port_cp.left_right,
-                port_number=pdu_port_cp.port_number,
-            )
-            power_port_to_update.power_connection = pdu_port_to_connect
-        else:
-            power_port_to_update.power_connection = None
-        power_port_to_update.save()
+            )
+        write_logs(logs)
+        log_execute_change_plan(
+            self.user,
+            self.change_plan.name,
+            self.num_created,
+            self.num_modified,
+            self.num_decommissioned,
+        )
+
+        # conflicts with other change plans are detected once all changes
+        # are committed, instead of on the save of each asset
+        queue_conflict_detection_cp(
+            updated_assets[asset_cp.id].id
+            for asset_cp in assets_cp
+            if not asset_cp.is_decommissioned
+        )
+        # live assets and the assets on this change plan were bulk updated
+        record_change_plan_diff_change()
+        record_rack_usage_change()
+        return None
+
+    def update_assets(self, assets_cp):
+        """
+        Copies each AssetCP onto its related asset, creating the assets that
+        are new on the change plan, and returns the live assets keyed by
+        AssetCP id.
+        """
+        fields = [
+            field
+            for field in Asset._meta.fields
+            if field.name not in ("id", "assetid_ptr", "chassis")
+        ]
+        relation_field_names = [
+            field.name for field in Asset._meta.fields if field.is_relation
+        ]
+        asset_numbers = [asset_cp.asset_number for asset_cp in assets_cp]
+        available_asset_numbers = iter(
+            reserve_asset_numbers(
+                asset_numbers.count(None),
+                [asset_number for asset_number in asset_numbers if asset_number],
+            )
+        )
+        updated_assets = {}
+        for asset_cp in assets_cp:
+            asset = asset_cp.related_asset or Asset()
+            for field in fields:
+                setattr(asset, field.attname, getattr(asset_cp, field.attname))
+            asset.model = asset_cp.model
+            if asset.asset_number is None:
+                asset.asset_number = next(available_asset_numbers)
+            # related objects come from the change plan, and are not looked
+            # up again for each asset
+            asset.clean_fields(exclude=relation_field_names)
+            validate_hostname(asset.hostname)
+            updated_assets[asset_cp.id] = asset
+        for owner in {asset.owner for asset in updated_assets.values()}:
+            validate_owner(owner)
+
+        created_asset_cp_ids = {
+            asset_cp.id for asset_cp in assets_cp if asset_cp.related_asset is None
+        }
+        new_assets = [
+            updated_assets[asset_cp.id]
+            for asset_cp in assets_cp
+            if asset_cp.id in created_asset_cp_ids
+        ]
+        asset_ids = AssetID.objects.bulk_create(
+            [AssetID() for _ in new_assets], batch_size=CHANGE_PLAN_BATCH_SIZE
+        )
+        for asset, asset_id in zip(new_assets, asset_ids):
+            asset.id = asset.assetid_ptr_id = asset_id.id
+            asset._state.adding = False
+            asset._state.db = Asset.objects.db
+        # chassis are linked once every asset on the change plan has an id
+        for asset_cp in assets_cp:
+            asset = updated_assets[asset_cp.id]
+            if asset_cp.chassis_id:
+                asset.chassis_id = updated_assets[asset_cp.chassis_id].id
+            else:
+                asset.chassis_id = None
+            validate_location_type(
+                model=asset.model,
+                rack=asset.rack_id,
+                rack_position=asset.rack_position,
+                chassis=asset.chassis_id,
+                chassis_slot=asset.chassis_slot,
+                offline_storage_site=asset.offline_storage_site_id,
+            )
+            asset_cp.related_asset = asset
+
+        insert_assets(new_assets, CHANGE_PLAN_BATCH_SIZE)
+        Asset.objects.bulk_update(
+            [
+                updated_assets[asset_cp.id]
+                for asset_cp in assets_cp
+                if asset_cp.id not in created_asset_cp_ids
+            ],
+            [field.name for field in fields] + ["chassis"],
+            batch_size=CHANGE_PLAN_BATCH_SIZE,
+        )
+        # blades that are not on the change plan move with their chassis
+        updated_asset_ids = [asset.id for asset in updated_assets.values()]
+        update_asset_locations(
+            Asset.objects.filter(
+                Q(id__in=updated_asset_ids) | Q(chassis__in=updated_asset_ids)
+            )
+        )
+        network_graph_changes = NetworkGraphChanges()
+        for asset in updated_assets.values():
+            network_graph_changes.set_asset(
+                asset.id,
+                asset.id,
+                asset.hostname,
+                asset.asset_number,
+                asset.chassis_id,
+            )
+        record_network_graph_change(network_graph_changes)
+        return updated_assets
+
+    def update_network_ports(self, assets_cp, updated_assets):
+        """
+        Gives the network ports of each live asset the MAC addresses and
+        connections of its AssetCP's ports, creating the ports of assets that
+        have none. Live ports connected to a port whose connection changes
+        are disconnected.
+        """
+        network_ports = {
+            (network_port.asset_id, network_port.port_name): network_port
+            for network_port in NetworkPort.objects.filter(
+                asset__in=[asset.id for asset in updated_assets.values()]
+            )
+        }
+        asset_ids_with_ports = {asset_id for asset_id, _ in network_ports}
+        new_network_ports = NetworkPort.objects.bulk_create(
+            [
+                NetworkPort(asset=updated_assets[asset_cp.id], port_name=port_name)
+                for asset_cp in assets_cp
+                if updated_assets[asset_cp.id].id not in asset_ids_with_ports
+                for port_name in asset_cp.model.network_ports or []
+            ],
+            batch_size=CHANGE_PLAN_BATCH_SIZE,
+        )
+        for network_port in new_network_ports:
+            network_ports[
+                (network_port.asset_id, network_port.port_name)
+            ] = network_port
+
+        connections = {}
+        for network_port_cp in NetworkPortCP.objects.filter(
+            change_plan=self.change_plan
+        ).values(
+            "asset_id",
+            "port_name",
+            "mac_address",
+            "connected_port__asset_id",
+            "connected_port__port_name",
+        ):
+            asset = updated_assets.get(network_port_cp["asset_id"])
+            network_port = asset and network_ports.get(
+                (asset.id, network_port_cp["port_name"])
+            )
+            if network_port is None:
+                continue
+            network_port.mac_address = network_port_cp["mac_address"]
+            connected_asset = updated_assets.get(
+                network_port_cp["connected_port__asset_id"]
+            )
+            connected_port = connected_asset and network_ports.get(
+                (connected_asset.id, network_port_cp["connected_port__port_name"])
+            )
+            connections[network_port.id] = connected_port and connected_port.id
+        for network_port_id, connected_port_id in list(connections.items()):
+            if connected_port_id:
+                connections[connected_port_id] = network_port_id
+
+        disconnected_port_ids = list(
+            NetworkPort.objects.filter(connected_port__in=connections.keys())
+            .exclude(id__in=connections.keys())
+            .values_list("id", flat=True)
+        )
+        # connections are cleared first so that no port is briefly connected
+        # to two others while they are rewired
+        NetworkPort.objects.filter(
+            id__in=list(connections.keys()) + disconnected_port_ids
+        ).update(connected_port=None)
+        for network_port in network_ports.values():
+            if network_port.id in connections:
+                network_port.connected_port_id = connections[network_port.id]
+            elif network_port.id in disconnected_port_ids:
+                network_port.connected_port_id = None
+        NetworkPort.objects.bulk_update(
+            network_ports.values(),
+            ["mac_address", "connected_port"],
+            batch_size=CHANGE_PLAN_BATCH_SIZE,
+        )
+        network_graph_changes = NetworkGraphChanges()
+        for network_port in network_ports.values():
+            network_graph_changes.set_port(
+                network_port.id, network_port.asset_id, network_port.connected_port_id
+            )
+        for network_port_id in disconnected_port_ids:
+            network_graph_changes.remove_port(network_port_id)
+        record_network_graph_change(network_graph_changes)
+
+    def update_power_ports(self, assets_cp, updated_assets):
+        """
+        Connects the power ports of each live asset to the live PDU ports
+        matching its AssetCP's power connections, creating the ports of
+        assets that have none.
+        """
+        power_ports = {
+            (power_port.asset_id, power_port.port_name): power_port
+            for power_port in PowerPort.objects.filter(
+                asset__in=[asset.id for asset in updated_assets.values()]
+            )
+        }
+        asset_ids_with_ports = {asset_id for asset_id, _ in power_ports}
+        new_power_ports = PowerPort.objects.bulk_create(
+            [
+                PowerPort(
+                    asset=updated_assets[asset_cp.id], port_name=str(port_index + 1)
+                )
+                for asset_cp in assets_cp
+                if updated_assets[asset_cp.id].id not in asset_ids_with_ports
+                for port_index in range(asset_cp.model.num_power_ports or 0)
+            ],
+            batch_size=CHANGE_PLAN_BATCH_SIZE,
+        )
+        for power_port in new_power_ports:
+            power_ports[(power_port.asset_id, power_port.port_name)] = power_port
+
+        power_ports_cp = list(
+            PowerPortCP.objects.filter(change_plan=self.change_plan).values_list(
+                "asset_id",
+                "port_name",
+                "power_connection__rack_id",
+                "power_connection__left_right",
+                "power_connection__port_number",
+            )
+        )
+        pdu_ports = {
+            (pdu_port.rack_id, pdu_port.left_right, pdu_port.port_number): pdu_port.id
+            for pdu_port in PDUPort.objects.filter(
+                rack__in={
+                    power_port_cp[2] for power_port_cp in power_ports_cp
+                }
+            )
+        }
+        power_ports_to_update = []
+        for asset_cp_id, port_name, *pdu_port_location in power_ports_cp:
+            asset = updated_assets.get(asset_cp_id)
+            power_port = asset and power_ports.get((asset.id, port_name))
+            if power_port is None:
+                continue
+            power_port.power_connection_id = pdu_ports.get(tuple(pdu_port_location))
+            power_ports_to_update.append(power_port)
+        # connections are cleared first so that two ports on the change plan
+        # can swap PDU ports
+        PowerPort.objects.filter(
+            id__in=[power_port.id for power_port in power_ports_to_update]
+        ).update(power_connection=None)
+        PowerPort.objects.bulk_update(
+            power_ports_to_update,
+            ["power_connection"],
+            batch_size=CHANGE_PLAN_BATCH_SIZE,
+        )
 
 
 def decommission_asset_cp(updated_asset, asset_cp, change_plan):
@@ -0,0 +1,115 @@
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from enum import Enum
+from http import HTTPStatus
+from io import StringIO
+from itertools import islice
+import json
+from rackcity.utils.errors_utils import Status
+
+# Rows read from the database per round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+# Bytes of an export sent to the client at a time when streaming
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+
+class ExportFormat(Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+EXPORT_CONTENT_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+
+class Echo:
+    """
+    A file-like object whose write returns what is written, so a csv writer
+    can produce an export one line at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def get_chunks(iterable, chunk_size=EXPORT_CHUNK_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_export_lines(export_format, fields, rows):
+    if export_format == ExportFormat.NDJSON:
+        for row in rows:
+            yield json.dumps(
+                {field: row.get(field) for field in fields}, cls=DjangoJSONEncoder
+            ) + "\n"
+    else:
+        csv_writer = csv.DictWriter(Echo(), fields)
+        yield csv_writer.writeheader()
+        for row in rows:
+            yield csv_writer.writerow(row)
+
+
+def get_export_blocks(lines):
+    block = []
+    block_size = 0
+    for line in lines:
+        block.append(line)
+        block_size += len(line)
+        if block_size >= EXPORT_BLOCK_SIZE:
+            yield "".join(block).encode()
+            block = []
+            block_size = 0
+    if block:
+        yield "".join(block).encode()
+
+
+def get_export_response(request, fields, rows, filename):
+    """
+    Returns an export of rows, which are dicts keyed by fields. If the
+    export_format query parameter is "csv" or "ndjson", the rows are streamed
+    to the client as they are read, compressed with gzip if the client
+    accepts it. Otherwise, the export is returned as one csv string.
+    """
+    if "export_format" not in request.query_params:
+        csv_string = StringIO()
+        csv_writer = csv.DictWriter(csv_string, fields)
+        csv_writer.writeheader()
+        csv_writer.writerows(rows)
+        return JsonResponse(
+            {"export_csv": csv_string.getvalue()}, status=HTTPStatus.OK
+        )
+    try:
+        export_format = ExportFormat(request.query_params["export_format"])
+    except ValueError:
+        return JsonResponse(
+            {
+                "failure_message": Status.EXPORT_ERROR.value
+                + "Export format must be one of: "
+                + ", ".join(export_format.value for export_format in ExportFormat)
+                + ". "
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    blocks = get_export_blocks(get_export_lines(export_format, fields, rows))
+    use_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+    response = StreamingHttpResponse(
+        compress_sequence(blocks) if use_gzip else blocks,
+        content_type=EXPORT_CONTENT_TYPES[export_format],
+    )
+    if use_gzip:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    response["Content-Disposition"] = (
+        'attachment; filename="' + filename + "." + export_format.value + '"'
+    )
+    return response
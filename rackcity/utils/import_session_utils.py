@@ -0,0 +1,78 @@
+from datetime import timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+import json
+from uuid import uuid4
+import zlib
+from rackcity.models import ImportSession
+from rackcity.utils.exceptions import ImportSessionException
+
+# Seconds for which the modifications of an upload can still be approved
+IMPORT_SESSION_TIMEOUT = 60 * 60
+# Largest compressed size of the modifications staged by one upload
+IMPORT_SESSION_MAX_BYTES = 4 * 1024 * 1024
+
+
+def stage_import(user, element_type, staged_rows):
+    """
+    Keeps the validated rows of a bulk upload that modify existing records,
+    keyed by the id of the record each modifies, until they are approved.
+    Returns the id of the import session, or None if there is nothing to
+    approve. Sessions are stored in the database so that any worker can
+    approve them. Specified element_type should be ElementType enum.
+    """
+    if not staged_rows:
+        return None
+    blob = zlib.compress(
+        json.dumps(list(staged_rows.items()), cls=DjangoJSONEncoder).encode()
+    )
+    if len(blob) > IMPORT_SESSION_MAX_BYTES:
+        raise ImportSessionException(
+            "Too many modifications to existing records to approve in one "
+            + "import. Please split the file into smaller imports. "
+        )
+    ImportSession.objects.filter(expires__lte=timezone.now()).delete()
+    import_session = ImportSession.objects.create(
+        import_id=uuid4().hex,
+        user=user,
+        element_type=element_type.value,
+        expires=timezone.now() + timedelta(seconds=IMPORT_SESSION_TIMEOUT),
+        rows=blob,
+    )
+    return import_session.import_id
+
+
+def pop_staged_rows(user, element_type, import_id, approved_ids):
+    """
+    Returns the staged rows of an import session whose ids were approved, in
+    the order they were staged, and ends the session. Specified element_type
+    should be ElementType enum.
+    """
+    with transaction.atomic():
+        # the session is locked so that it is approved at most once
+        import_session = (
+            ImportSession.objects.select_for_update()
+            .filter(
+                import_id=str(import_id),
+                user=user,
+                element_type=element_type.value,
+                expires__gt=timezone.now(),
+            )
+            .first()
+        )
+        if import_session is None:
+            raise ImportSessionException(
+                "Import session '" + str(import_id) + "' does not exist or expired. "
+            )
+        staged_rows = json.loads(zlib.decompress(import_session.rows))
+        approved_ids = {str(approved_id) for approved_id in approved_ids}
+        unknown_ids = approved_ids - {str(row_id) for row_id, row in staged_rows}
+        if unknown_ids:
+            raise ImportSessionException(
+                "Modifications are not part of this import: "
+                + ", ".join(sorted(unknown_ids))
+                + ". "
+            )
+        import_session.delete()
+    return [row for row_id, row in staged_rows if str(row_id) in approved_ids]
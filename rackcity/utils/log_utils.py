@@ -1,8 +1,32 @@
+import atexit
+from contextlib import contextmanager
 from datetime import datetime
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import (
+    IntegrityError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from enum import Enum
+import logging
+import queue
+import threading
 from rackcity.models import Log, Asset, ITModel, Site
 
+# Rows per INSERT statement when writing buffered logs
+LOG_BATCH_SIZE = 1000
+# Times the background writer tries to write a batch of logs
+LOG_WRITE_ATTEMPTS = 3
+# Batches of logs that can wait for the background writer before requests
+# that write logs block
+LOG_QUEUE_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
 
 class Action(Enum):
     CREATE = "created"
@@ -38,6 +62,16 @@ def log_action(user, related_element, action, change_plan=None):
     """
     Specified action should be Action enum.
     """
+    log = get_action_log(user, related_element, action, change_plan=change_plan)
+    if log:
+        write_log(log)
+
+
+def get_action_log(user, related_element, action, change_plan=None):
+    """
+    Returns the unsaved log of an action, or None if actions on the related
+    element are not logged. Specified action should be Action enum.
+    """
     date = datetime.now()
     related_model = None
     related_asset = None
@@ -56,7 +90,7 @@ def log_action(user, related_element, action, change_plan=None):
         element_type = ElementType.SITE.value
         element_name = related_element.abbreviation
     elif related_element is not None:
-        return
+        return None
     if action == Action.DECOMMISSION:
         element_type = ElementType.ASSET.value
         element_name = ""
@@ -74,14 +108,13 @@ def log_action(user, related_element, action, change_plan=None):
     )
     if change_plan:
         log_content += " in the execution of Change Plan '" + change_plan.name + "'"
-    log = Log(
+    return Log(
         date=date,
         log_content=log_content,
         user=user,
         related_asset=related_asset,
         related_model=related_model,
     )
-    log.save()
 
 
 def log_delete(user, element_type, element_name):
@@ -102,7 +135,7 @@ def log_delete(user, element_type, element_name):
         ]
     )
     log = Log(date=date, log_content=log_content, user=user,)
-    log.save()
+    write_log(log)
 
 
 def log_execute_change_plan(
@@ -124,7 +157,7 @@ def log_execute_change_plan(
         ]
     )
     log = Log(date=date, log_content=log_content, user=user,)
-    log.save()
+    write_log(log)
 
 
 def log_rack_action(user, action, related_racks, datacenter):
@@ -146,7 +179,7 @@ def log_rack_action(user, action, related_racks, datacenter):
         ]
     )
     log = Log(date=date, log_content=log_content, user=user,)
-    log.save()
+    write_log(log)
 
 
 def log_user_permission_action(user, permission_action, username):
@@ -165,7 +198,7 @@ def log_user_permission_action(user, permission_action, username):
         ]
     )
     log = Log(date=date, log_content=log_content, user=user,)
-    log.save()
+    write_log(log)
 
 
 def log_power_action(user, power_action, related_asset, blade_slot=None):
@@ -188,7 +221,31 @@ def log_power_action(user, power_action, related_asset, blade_slot=None):
     log = Log(
         date=date, log_content=log_content, user=user, related_asset=related_asset,
     )
-    log.save()
+    write_log(log)
+
+
+def log_batch_power_action(user, power_action, related_assets, related_blades):
+    """
+    Specified power_action should be PowerAction enum, related_blades should
+    be list of (chassis, blade_slot) tuples.
+    """
+    date = datetime.now()
+    targets = [get_asset_name(asset) for asset in related_assets] + [
+        get_asset_name(chassis) + " blade slot " + str(blade_slot)
+        for chassis, blade_slot in related_blades
+    ]
+    log_content = " ".join(
+        [
+            datetime_to_string(date),
+            ElementType.USER.value,
+            user.username,
+            power_action.value,
+            "by batch power operation on the following assets:",
+            ", ".join(targets),
+        ]
+    )
+    log = Log(date=date, log_content=log_content, user=user,)
+    write_log(log)
 
 
 def log_network_action(user, related_asset):
@@ -210,7 +267,7 @@ def log_network_action(user, related_asset):
     log = Log(
         date=date, log_content=log_content, user=user, related_asset=related_asset,
     )
-    log.save()
+    write_log(log)
 
 
 def log_bulk_upload(user, element_type, num_approved, num_ignored, num_modified):
@@ -235,7 +292,7 @@ def log_bulk_upload(user, element_type, num_approved, num_ignored, num_modified)
         ]
     )
     log = Log(date=date, log_content=log_content, user=user,)
-    log.save()
+    write_log(log)
 
 
 def log_bulk_approve(user, element_type, num_modified):
@@ -255,7 +312,7 @@ def log_bulk_approve(user, element_type, num_modified):
         ]
     )
     log = Log(date=date, log_content=log_content, user=user,)
-    log.save()
+    write_log(log)
 
 
 def get_asset_name(asset):
@@ -263,3 +320,193 @@ def get_asset_name(asset):
     if asset.hostname:
         asset_name += " (" + asset.hostname + ")"
     return asset_name
+
+
+class LogBuffer(threading.local):
+    """
+    Logs created in this thread that have not been written yet, while
+    buffering is turned on by buffer_logs.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.logs = []
+        # logs created inside a transaction that has not committed, by id
+        self.uncommitted_logs = {}
+
+
+log_buffer = LogBuffer()
+
+
+@contextmanager
+def buffer_logs():
+    """
+    Collects the logs created inside the block and writes them in order with
+    one bulk insert when the outermost block exits, or once the surrounding
+    transaction commits if it exits inside one. Logs created inside a
+    transaction that rolls back are dropped, and so is every log if the
+    block raises.
+    """
+    connection = transaction.get_connection()
+    if not log_buffer.depth and not connection.in_atomic_block:
+        # left over from transactions that rolled back
+        log_buffer.uncommitted_logs = {}
+    log_buffer.depth += 1
+    raised = True
+    try:
+        yield
+        raised = False
+    finally:
+        log_buffer.depth -= 1
+        if log_buffer.depth == 0:
+            logs = [] if raised else log_buffer.logs
+            log_buffer.logs = []
+            if connection.in_atomic_block:
+                transaction.on_commit(lambda: write_buffered_logs(logs))
+            else:
+                write_buffered_logs(logs)
+
+
+def write_buffered_logs(logs):
+    write_logs(
+        [log for log in logs if log_buffer.uncommitted_logs.pop(id(log), None) is None]
+    )
+
+
+def discard_buffered_logs():
+    log_buffer.logs = []
+
+
+def write_log(log):
+    if not log_buffer.depth:
+        write_logs([log])
+        return
+    log_buffer.logs.append(log)
+    if transaction.get_connection().in_atomic_block:
+        # dropped unless the transaction commits
+        log_buffer.uncommitted_logs[id(log)] = log
+        transaction.on_commit(lambda: log_buffer.uncommitted_logs.pop(id(log), None))
+
+
+def write_logs(logs):
+    """
+    Writes logs in order. If AUDIT_LOG_ASYNC is set, they are handed to the
+    background writer once the surrounding transaction commits instead.
+    """
+    if not logs:
+        return
+    if getattr(settings, "AUDIT_LOG_ASYNC", False):
+        transaction.on_commit(lambda: async_log_writer.put(logs))
+    else:
+        Log.objects.bulk_create(logs, batch_size=LOG_BATCH_SIZE)
+
+
+@receiver(post_delete, sender=Asset)
+@receiver(post_delete, sender=ITModel)
+@receiver(post_delete, sender=User)
+def unlink_deleted_element_from_buffered_logs(sender, **kwargs):
+    """
+    Removes references to a deleted asset, model or user from the logs
+    that have not been written yet, as deleting it does for written logs.
+    """
+    deleted_id = kwargs.get("instance").id
+    for log in log_buffer.logs:
+        if sender is Asset and log.related_asset_id == deleted_id:
+            log.related_asset = None
+        elif sender is ITModel and log.related_model_id == deleted_id:
+            log.related_model = None
+        elif sender is User and log.user_id == deleted_id:
+            log.user = None
+
+
+class AsyncLogWriter:
+    """
+    Writes batches of logs on a background thread, in the order they were
+    put, so requests do not wait for their logs to be inserted. Putting a
+    batch blocks while LOG_QUEUE_SIZE batches are already waiting. Waiting
+    batches are written before the process exits.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.is_shut_down = False
+
+    def put(self, logs):
+        with self.lock:
+            if self.is_shut_down:
+                self.write(logs)
+                return
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+                atexit.register(self.shut_down)
+            # a batch put after shutting down would never be written
+            self.queue.put(logs)
+
+    def run(self):
+        while True:
+            batches = [self.queue.get()]
+            while batches[-1] is not None and len(batches) < LOG_QUEUE_SIZE:
+                try:
+                    batches.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            logs = [log for batch in batches if batch for log in batch]
+            try:
+                if logs:
+                    self.write(logs)
+            except Exception:
+                logger.exception("Failed to write %d audit logs", len(logs))
+            finally:
+                for _ in batches:
+                    self.queue.task_done()
+            if batches[-1] is None:
+                connection.close()
+                return
+
+    def write(self, logs):
+        close_old_connections()
+        for attempt in range(LOG_WRITE_ATTEMPTS):
+            # elements deleted since the logs were queued can no longer be
+            # linked; one deleted while the logs are written fails the write
+            for field_name, model in (
+                ("related_asset", Asset),
+                ("related_model", ITModel),
+                ("user", User),
+            ):
+                attname = field_name + "_id"
+                related_ids = {getattr(log, attname) for log in logs} - {None}
+                existing_ids = set(
+                    model.objects.filter(id__in=related_ids).values_list(
+                        "id", flat=True
+                    )
+                )
+                for log in logs:
+                    if getattr(log, attname) not in existing_ids:
+                        setattr(log, field_name, None)
+            try:
+                with transaction.atomic():
+                    Log.objects.bulk_create(logs, batch_size=LOG_BATCH_SIZE)
+                return
+            except IntegrityError:
+                if attempt == LOG_WRITE_ATTEMPTS - 1:
+                    raise
+                for log in logs:
+                    log.pk = None
+
+    def shut_down(self):
+        """
+        Writes every waiting batch and stops the background thread.
+        """
+        with self.lock:
+            if self.is_shut_down or self.thread is None:
+                self.is_shut_down = True
+                return
+            self.is_shut_down = True
+        self.queue.put(None)
+        self.thread.join()
+
+
+async_log_writer = AsyncLogWriter()
@@ -0,0 +1,396 @@
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+import threading
+from rackcity.models import (
+    Asset,
+    AssetCP,
+    NetworkGraphVersion,
+    NetworkPort,
+    NetworkPortCP,
+)
+from rackcity.utils.transaction_utils import has_commit_hook, schedule_on_commit
+
+# Id of the single NetworkGraphVersion row
+NETWORK_GRAPH_VERSION_ID = 1
+
+
+class NetworkGraphIndex:
+    """
+    In-memory adjacency index of network connections and chassis/blade
+    relationships between assets, answering k-hop neighborhood queries
+    without any SQL. An index built for a change plan is an overlay: assets
+    that are not on the change plan are looked up in the fallback index.
+    """
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback
+        self.lock = threading.RLock()
+        self.is_built = False
+        self.version = None
+        self.clear()
+
+    def clear(self):
+        # asset id -> (route id, hostname, asset number, chassis id)
+        self.assets = {}
+        # chassis id -> set of blade ids
+        self.blades = {}
+        # connected port id -> asset id
+        self.port_assets = {}
+        # connected port id -> id of the port it is connected to
+        self.port_peers = {}
+        # asset id -> set of its connected port ids
+        self.asset_ports = {}
+
+    def build(self, version=None):
+        """
+        Loads every live asset and every live network connection, using one
+        query for each.
+        """
+        asset_rows = Asset.objects.values_list(
+            "id", "id", "hostname", "asset_number", "chassis_id"
+        )
+        port_rows = NetworkPort.objects.filter(
+            connected_port__isnull=False
+        ).values_list("id", "asset_id", "connected_port_id")
+        with self.lock:
+            self.clear()
+            self.load(asset_rows, port_rows)
+            self.version = version
+            self.is_built = True
+
+    def copy(self):
+        """
+        Returns a separate index with the same assets and connections.
+        """
+        index = NetworkGraphIndex(fallback=self.fallback)
+        with self.lock:
+            index.assets = dict(self.assets)
+            index.blades = {
+                chassis_id: set(blade_ids)
+                for chassis_id, blade_ids in self.blades.items()
+            }
+            index.port_assets = dict(self.port_assets)
+            index.port_peers = dict(self.port_peers)
+            index.asset_ports = {
+                asset_id: set(port_ids)
+                for asset_id, port_ids in self.asset_ports.items()
+            }
+            index.version = self.version
+            index.is_built = self.is_built
+        return index
+
+    def load(self, asset_rows, port_rows):
+        for asset_id, route_id, hostname, asset_number, chassis_id in asset_rows:
+            self.set_asset(asset_id, route_id, hostname, asset_number, chassis_id)
+        for port_id, asset_id, connected_port_id in port_rows:
+            self.set_port(port_id, asset_id, connected_port_id)
+
+    def set_asset(self, asset_id, route_id, hostname, asset_number, chassis_id):
+        with self.lock:
+            self.remove_asset(asset_id)
+            self.assets[asset_id] = (route_id, hostname, asset_number, chassis_id)
+            if chassis_id:
+                self.blades.setdefault(chassis_id, set()).add(asset_id)
+
+    def remove_asset(self, asset_id):
+        with self.lock:
+            if asset_id not in self.assets:
+                return
+            chassis_id = self.assets.pop(asset_id)[3]
+            if chassis_id:
+                self.blades.get(chassis_id, set()).discard(asset_id)
+
+    def set_port(self, port_id, asset_id, connected_port_id):
+        with self.lock:
+            if not connected_port_id:
+                self.remove_port(port_id)
+                return
+            self.port_assets[port_id] = asset_id
+            self.port_peers[port_id] = connected_port_id
+            self.asset_ports.setdefault(asset_id, set()).add(port_id)
+
+    def remove_port(self, port_id):
+        with self.lock:
+            asset_id = self.port_assets.pop(port_id, None)
+            self.port_peers.pop(port_id, None)
+            if asset_id is not None:
+                self.asset_ports.get(asset_id, set()).discard(port_id)
+
+    def get_node(self, asset_id):
+        if asset_id not in self.assets:
+            if self.fallback:
+                return self.fallback.get_node(asset_id)
+            return None
+        route_id, hostname, _, _ = self.assets[asset_id]
+        return {"id": asset_id, "route_id": route_id or asset_id, "label": hostname}
+
+    def get_connected_asset_ids(self, asset_id):
+        """
+        Returns the id of the asset on the other end of each connected network
+        port of the asset, in port order.
+        """
+        if asset_id not in self.assets and self.fallback:
+            return self.fallback.get_connected_asset_ids(asset_id)
+        connected_asset_ids = []
+        for port_id in sorted(self.asset_ports.get(asset_id, ())):
+            peer_asset_id = self.port_assets.get(self.port_peers[port_id])
+            if peer_asset_id is not None:
+                connected_asset_ids.append(peer_asset_id)
+        return connected_asset_ids
+
+    def get_chassis_id(self, asset_id):
+        if asset_id not in self.assets:
+            if self.fallback:
+                return self.fallback.get_chassis_id(asset_id)
+            return None
+        return self.assets[asset_id][3]
+
+    def get_blade_ids(self, asset_id):
+        """
+        Returns the ids of the blades in the chassis, ordered by asset number.
+        """
+        if asset_id not in self.assets and self.fallback:
+            return self.fallback.get_blade_ids(asset_id)
+        blade_ids = self.blades.get(asset_id, ())
+        return sorted(
+            blade_ids,
+            key=lambda blade_id: (
+                self.assets[blade_id][2] is None,
+                self.assets[blade_id][2] or 0,
+            ),
+        )
+
+    def get_neighborhood(self, asset_id, hops=2):
+        """
+        Returns the nodes and edges of the network graph around the asset,
+        out to the given number of hops. An edge is listed from each asset
+        that is expanded, so a connection between two expanded assets appears
+        once in each direction.
+        """
+        root = self.get_node(asset_id)
+        if root is None:
+            return None
+        nodes = [root]
+        edges = []
+        seen_ids = {asset_id}
+        frontier = [asset_id]
+        with self.lock:
+            for _ in range(hops):
+                next_frontier = []
+                for source_id in frontier:
+                    neighbor_ids = self.get_connected_asset_ids(source_id)
+                    chassis_id = self.get_chassis_id(source_id)
+                    if chassis_id:
+                        neighbor_ids.append(chassis_id)
+                    neighbor_ids.extend(self.get_blade_ids(source_id))
+                    for neighbor_id in neighbor_ids:
+                        node = self.get_node(neighbor_id)
+                        if node is None:
+                            continue
+                        if neighbor_id not in seen_ids:
+                            seen_ids.add(neighbor_id)
+                            nodes.append(node)
+                            next_frontier.append(neighbor_id)
+                        edges.append({"from": source_id, "to": neighbor_id})
+                frontier = next_frontier
+        return {"nodes": nodes, "edges": edges}
+
+
+class NetworkGraphChanges:
+    """
+    Changes to the network graph made by a transaction, and the assets and
+    network ports they touch.
+    """
+
+    def __init__(self):
+        self.updates = []
+        self.asset_ids = set()
+        self.port_ids = set()
+
+    def set_asset(self, asset_id, route_id, hostname, asset_number, chassis_id):
+        self.updates.append(
+            (
+                NetworkGraphIndex.set_asset,
+                (asset_id, route_id, hostname, asset_number, chassis_id),
+            )
+        )
+        self.asset_ids.add(asset_id)
+
+    def remove_asset(self, asset_id):
+        self.updates.append((NetworkGraphIndex.remove_asset, (asset_id,)))
+        self.asset_ids.add(asset_id)
+
+    def set_port(self, port_id, asset_id, connected_port_id):
+        self.updates.append(
+            (NetworkGraphIndex.set_port, (port_id, asset_id, connected_port_id))
+        )
+        self.port_ids.add(port_id)
+
+    def remove_port(self, port_id):
+        self.updates.append((NetworkGraphIndex.remove_port, (port_id,)))
+        self.port_ids.add(port_id)
+
+    def extend(self, changes):
+        self.updates.extend(changes.updates)
+        self.asset_ids.update(changes.asset_ids)
+        self.port_ids.update(changes.port_ids)
+
+    def apply(self, index):
+        for update, args in self.updates:
+            update(index, *args)
+
+
+class UnpublishedNetworkGraphChanges(threading.local):
+    """
+    Changes to the network graph made in this thread by a transaction that
+    has not committed yet.
+    """
+
+    def __init__(self):
+        self.changes = NetworkGraphChanges()
+
+
+live_network_graph_index = NetworkGraphIndex()
+unpublished_network_graph_changes = UnpublishedNetworkGraphChanges()
+
+
+def get_network_graph_index(change_plan=None):
+    """
+    Returns the live network graph index, rebuilding it first if its version
+    is behind the version in the database. Inside a transaction that changed
+    the network graph, returns a copy of it with the changes applied. With a
+    change plan, returns an overlay index of the change plan's assets and
+    connections on top of it, loaded with two queries.
+    """
+    index = live_network_graph_index
+    version = get_network_graph_version()
+    with index.lock:
+        if not index.is_built or index.version != version:
+            index.build(version)
+        if has_commit_hook(unpublished_network_graph_changes):
+            # the live index cannot reflect changes not yet committed
+            index = index.copy()
+            unpublished_network_graph_changes.changes.apply(index)
+    if not change_plan:
+        return index
+    overlay = NetworkGraphIndex(fallback=index)
+    overlay.load(
+        AssetCP.objects.filter(change_plan=change_plan).values_list(
+            "id", "related_asset_id", "hostname", "asset_number", "chassis_id"
+        ),
+        NetworkPortCP.objects.filter(
+            change_plan=change_plan, connected_port__isnull=False
+        ).values_list("id", "asset_id", "connected_port_id"),
+    )
+    return overlay
+
+
+def get_network_graph_version():
+    return (
+        NetworkGraphVersion.objects.filter(id=NETWORK_GRAPH_VERSION_ID)
+        .values_list("version", flat=True)
+        .first()
+        or 0
+    )
+
+
+def increment_network_graph_version():
+    """
+    Increments the network graph version and returns it. Run outside of a
+    transaction, so the version's row is only locked for the one statement.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO "
+            + NetworkGraphVersion._meta.db_table
+            + " (id, version) VALUES (%s, 1) ON CONFLICT (id) DO UPDATE "
+            + "SET version = "
+            + NetworkGraphVersion._meta.db_table
+            + ".version + 1 RETURNING version",
+            [NETWORK_GRAPH_VERSION_ID],
+        )
+        return cursor.fetchone()[0]
+
+
+def record_network_graph_change(changes):
+    """
+    Records changes to the network graph made by the surrounding transaction,
+    published once it commits. If the transaction rolls back, the changes
+    are dropped.
+    """
+    if not has_commit_hook(unpublished_network_graph_changes):
+        # changes recorded by a transaction that was rolled back were not made
+        unpublished_network_graph_changes.changes = NetworkGraphChanges()
+        unpublished_network_graph_changes.changes.extend(changes)
+        schedule_on_commit(
+            unpublished_network_graph_changes, publish_network_graph_changes
+        )
+    else:
+        unpublished_network_graph_changes.changes.extend(changes)
+
+
+def publish_network_graph_changes():
+    """
+    Increments the network graph version, so that other processes rebuild
+    their index, and updates the assets and network ports that changed in
+    this process's index from the database. The index is rebuilt instead if
+    it was not current before the change.
+    """
+    changes = unpublished_network_graph_changes.changes
+    unpublished_network_graph_changes.changes = NetworkGraphChanges()
+    version = increment_network_graph_version()
+    # read after the commit, so transactions that commit in any order all
+    # leave the latest state in the index
+    asset_rows = Asset.objects.filter(id__in=changes.asset_ids).values_list(
+        "id", "id", "hostname", "asset_number", "chassis_id"
+    )
+    port_rows = NetworkPort.objects.filter(id__in=changes.port_ids).values_list(
+        "id", "asset_id", "connected_port_id"
+    )
+    index = live_network_graph_index
+    with index.lock:
+        if index.is_built and index.version == version - 1:
+            # no other process changed the graph since this index was current
+            for asset_id in changes.asset_ids:
+                index.remove_asset(asset_id)
+            for port_id in changes.port_ids:
+                index.remove_port(port_id)
+            index.load(asset_rows, port_rows)
+            index.version = version
+        else:
+            index.is_built = False
+
+
+@receiver(post_save, sender=Asset)
+def update_network_graph_asset(sender, instance, **kwargs):
+    changes = NetworkGraphChanges()
+    changes.set_asset(
+        instance.id,
+        instance.id,
+        instance.hostname,
+        instance.asset_number,
+        instance.chassis_id,
+    )
+    record_network_graph_change(changes)
+
+
+@receiver(post_delete, sender=Asset)
+def remove_network_graph_asset(sender, instance, **kwargs):
+    changes = NetworkGraphChanges()
+    changes.remove_asset(instance.id)
+    record_network_graph_change(changes)
+
+
+@receiver(post_save, sender=NetworkPort)
+def update_network_graph_port(sender, instance, **kwargs):
+    changes = NetworkGraphChanges()
+    changes.set_port(instance.id, instance.asset_id, instance.connected_port_id)
+    record_network_graph_change(changes)
+
+
+@receiver(post_delete, sender=NetworkPort)
+def remove_network_graph_port(sender, instance, **kwargs):
+    changes = NetworkGraphChanges()
+    changes.remove_port(instance.id)
+    record_network_graph_change(changes)
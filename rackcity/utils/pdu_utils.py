@@ -0,0 +1,185 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+import re
+import requests
+import threading
+from uuid import uuid4
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, RequestException
+from rackcity.utils.cache_utils import is_cache_shared
+
+PDU_URL = "http://hyposoft-mgt.colab.duke.edu:8005/"
+# Need to specify rack + side in request, e.g. for A1 left, use A01L
+GET_PDU = "pdu.php?pdu=hpdu-rtp1-"
+TOGGLE_PDU = "power.php"
+PDU_NAME_PREFIX = "hpdu-rtp1-"
+# Seconds to wait for the PDU network controller to connect and to respond
+PDU_TIMEOUT = (3, 5)
+PDU_POOL_SIZE = 16
+PDU_CACHE_KEY_PREFIX = "rackcity:pdu:"
+PDU_GENERATION_KEY_PREFIX = "rackcity:pdu_generation:"
+PDU_CACHE_HITS_KEY = "rackcity:pdu_cache_hits"
+PDU_CACHE_MISSES_KEY = "rackcity:pdu_cache_misses"
+
+PORT_STATUS_PATTERN = re.compile(r"<td>(\d+)<td><span.+?(ON|OFF)")
+
+
+def create_pdu_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PDU_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared by all requests so that connections to the PDU controller are reused
+pdu_session = create_pdu_session()
+# One lock per PDU, so that concurrent cache misses share a single fetch
+pdu_fetch_locks = {}
+pdu_fetch_locks_lock = threading.Lock()
+
+
+def get_rack_pdu_ext(rack, left_right):
+    """
+    Returns the rack and side part of a PDU name, e.g. A01L for the left PDU
+    of rack A1.
+    """
+    rack_str = str(rack.row_letter)
+    if (rack.rack_num / 10) < 1:
+        rack_str = rack_str + "0"
+    rack_str = rack_str + str(rack.rack_num)
+    return rack_str + left_right
+
+
+def parse_pdu_port_states(html):
+    """
+    Returns the state ("ON" or "OFF") of every port on a PDU page, keyed by
+    port number.
+    """
+    return {
+        int(port_number): state
+        for port_number, state in PORT_STATUS_PATTERN.findall(html)
+    }
+
+
+def fetch_pdu_port_states(pdu_ext):
+    """
+    Fetches one PDU page and returns the state of every port on it. Raises
+    ConnectionError if the PDU network controller cannot be reached or
+    answers with an error.
+    """
+    try:
+        response = pdu_session.get(PDU_URL + GET_PDU + pdu_ext, timeout=PDU_TIMEOUT)
+        response.raise_for_status()
+    except RequestException:
+        raise ConnectionError("Cannot contact PDU Network Controller")
+    return parse_pdu_port_states(response.text)
+
+
+def get_pdu_cache_key(pdu_ext):
+    return PDU_CACHE_KEY_PREFIX + PDU_NAME_PREFIX + pdu_ext
+
+
+def get_pdu_fetch_lock(pdu_ext):
+    with pdu_fetch_locks_lock:
+        return pdu_fetch_locks.setdefault(pdu_ext, threading.Lock())
+
+
+def count_pdu_cache_lookup(counter_key):
+    try:
+        cache.incr(counter_key)
+    except ValueError:
+        if not cache.add(counter_key, 1, timeout=None):
+            cache.incr(counter_key)
+
+
+def get_pdu_port_states(pdu_ext):
+    """
+    Returns the state of every port on a PDU. With a cache shared by all
+    workers, states fetched less than PDU_CACHE_TTL seconds ago are reused.
+    """
+    if not is_cache_shared():
+        # a toggle made through another worker could not invalidate this cache
+        return fetch_pdu_port_states(pdu_ext)
+    port_states = cache.get(get_pdu_cache_key(pdu_ext))
+    if port_states is None:
+        with get_pdu_fetch_lock(pdu_ext):
+            # another request may have fetched the page while this one waited
+            port_states = cache.get(get_pdu_cache_key(pdu_ext))
+            if port_states is None:
+                count_pdu_cache_lookup(PDU_CACHE_MISSES_KEY)
+                return refresh_pdu_port_states(pdu_ext)
+    count_pdu_cache_lookup(PDU_CACHE_HITS_KEY)
+    return port_states
+
+
+def refresh_pdu_port_states(pdu_ext):
+    """
+    Fetches one PDU page and returns its port states. With a cache shared by
+    all workers, the states are cached unless a port on the PDU was toggled
+    while the page was being fetched.
+    """
+    if not is_cache_shared():
+        return fetch_pdu_port_states(pdu_ext)
+    generation_key = PDU_GENERATION_KEY_PREFIX + PDU_NAME_PREFIX + pdu_ext
+    generation = cache.get(generation_key)
+    port_states = fetch_pdu_port_states(pdu_ext)
+    if cache.get(generation_key) == generation:
+        cache.set(
+            get_pdu_cache_key(pdu_ext), port_states, timeout=settings.PDU_CACHE_TTL
+        )
+    return port_states
+
+
+def invalidate_pdu_port_states(pdu_ext):
+    """
+    Drops the cached port states of a PDU, and keeps fetches that started
+    before this from caching the states they read.
+    """
+    cache.set(
+        PDU_GENERATION_KEY_PREFIX + PDU_NAME_PREFIX + pdu_ext,
+        uuid4().hex,
+        timeout=None,
+    )
+    cache.delete(get_pdu_cache_key(pdu_ext))
+
+
+def get_pdu_cache_stats():
+    return {
+        "hits": cache.get(PDU_CACHE_HITS_KEY, 0),
+        "misses": cache.get(PDU_CACHE_MISSES_KEY, 0),
+    }
+
+
+def get_many_pdu_port_states(pdu_exts, refresh=False):
+    """
+    Gets each distinct PDU page once, all concurrently, and returns the
+    port states keyed by PDU ext and then by port number. With refresh, every
+    page is fetched from the PDU network controller instead of the cache.
+    """
+    pdu_exts = list(set(pdu_exts))
+    if not pdu_exts:
+        return {}
+    get_port_states = refresh_pdu_port_states if refresh else get_pdu_port_states
+    with ThreadPoolExecutor(max_workers=min(len(pdu_exts), PDU_POOL_SIZE)) as pool:
+        port_states = pool.map(get_port_states, pdu_exts)
+        return dict(zip(pdu_exts, port_states))
+
+
+def set_pdu_port_power(pdu_ext, port_number, goal_state):
+    """
+    Turns a PDU port "on" or "off". Raises ConnectionError if the PDU network
+    controller cannot be reached or answers with an error.
+    """
+    try:
+        response = pdu_session.post(
+            PDU_URL + TOGGLE_PDU,
+            {"pdu": PDU_NAME_PREFIX + pdu_ext, "port": port_number, "v": goal_state},
+            timeout=PDU_TIMEOUT,
+        )
+        response.raise_for_status()
+    except RequestException:
+        raise ConnectionError("Cannot contact PDU Network Controller")
+    finally:
+        invalidate_pdu_port_states(pdu_ext)
@@ -0,0 +1,186 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+import logging
+import threading
+import time
+from uuid import uuid4
+from rackcity.models import PowerBatchJob
+from rackcity.utils.bcman_utils import make_bcman_request
+from rackcity.utils.pdu_utils import set_pdu_port_power
+
+POWER_JOB_WORKERS = 8
+# Seconds between turning power off and back on when cycling
+POWER_CYCLE_DELAY = 2
+# Seconds for which a finished job's results can still be looked up
+POWER_JOB_TIMEOUT = 60 * 60
+# Seconds without progress after which a running job is assumed to have
+# stopped with the worker that ran it
+POWER_JOB_STALE_TIMEOUT = 10 * 60
+POWER_JOB_STALE_ERROR = "The power job stopped before this port was toggled."
+
+logger = logging.getLogger(__name__)
+
+# Bounds the number of PDU and BCMAN toggles in flight across all jobs
+power_job_executor = ThreadPoolExecutor(max_workers=POWER_JOB_WORKERS)
+
+
+class PowerJob:
+    """
+    Turns power on, off, or cycles it for many PDU ports and blade slots
+    in the background. Progress and per-port results are saved to a
+    PowerBatchJob row under the job's id, so any worker can look the job up.
+    """
+
+    def __init__(self, action, pdu_ports, blade_slots):
+        """
+        pdu_ports are dicts with asset_id, port_name, pdu_ext and port_number;
+        blade_slots are dicts with chassis_id, chassis_hostname and blade_slot.
+        """
+        self.id = uuid4().hex
+        self.action = action
+        self.lock = threading.Lock()
+        self.status = "running"
+        self.results = [
+            dict(pdu_port, result="pending", errors=None) for pdu_port in pdu_ports
+        ] + [
+            dict(blade_slot, result="pending", errors=None)
+            for blade_slot in blade_slots
+        ]
+
+    def start(self):
+        PowerBatchJob.objects.filter(
+            created__lt=timezone.now() - timedelta(seconds=POWER_JOB_TIMEOUT)
+        ).delete()
+        self.save()
+        # the job's row must be committed before the job thread updates it
+        transaction.on_commit(
+            lambda: threading.Thread(target=self.run_in_thread, daemon=True).start()
+        )
+
+    def run_in_thread(self):
+        close_old_connections()
+        try:
+            self.run()
+        finally:
+            connection.close()
+
+    def run(self):
+        """
+        Runs the job to the end. Whatever fails, the job is saved as done
+        and every port is saved with a result.
+        """
+        try:
+            if self.action == "cycle":
+                self.run_phase("off", is_last_phase=False)
+                time.sleep(POWER_CYCLE_DELAY)
+                self.run_phase("on", is_last_phase=True)
+            else:
+                self.run_phase(self.action, is_last_phase=True)
+            unfinished_result = "success"
+            errors = None
+        except Exception as error:
+            logger.exception("Power job %s failed", self.id)
+            unfinished_result = "failure"
+            errors = str(error)
+        with self.lock:
+            self.status = "done"
+            for result in self.results:
+                if result["result"] == "pending":
+                    result["result"] = unfinished_result
+                    result["errors"] = errors
+        self.save()
+
+    def run_phase(self, goal_state, is_last_phase):
+        futures = [
+            power_job_executor.submit(self.toggle, result, goal_state, is_last_phase)
+            for result in self.results
+            if result["result"] == "pending"
+        ]
+        # progress is saved from the job's thread as each toggle finishes
+        for future in as_completed(futures):
+            future.result()
+            self.save()
+
+    def toggle(self, result, goal_state, is_last_phase):
+        """
+        Records the outcome of the toggle in result. A port stays pending
+        until the last phase of a cycle toggles it.
+        """
+        try:
+            if "pdu_ext" in result:
+                set_pdu_port_power(
+                    result["pdu_ext"], result["port_number"], goal_state
+                )
+            else:
+                make_bcman_request(
+                    result["chassis_hostname"], str(result["blade_slot"]), goal_state
+                )
+        except Exception as error:
+            with self.lock:
+                result["result"] = "failure"
+                result["errors"] = str(error)
+            return
+        if is_last_phase:
+            with self.lock:
+                result["result"] = "success"
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "action": self.action,
+                "status": self.status,
+                "results": [
+                    {key: value for key, value in result.items() if key != "pdu_ext"}
+                    for result in self.results
+                ],
+            }
+
+    def save(self):
+        job = self.to_dict()
+        PowerBatchJob.objects.update_or_create(
+            job_id=self.id,
+            defaults={
+                "action": self.action,
+                "status": job["status"],
+                "results": job["results"],
+            },
+        )
+
+
+def get_power_job(job_id):
+    """
+    Returns the progress and results of a power job, or None if no job with
+    the id was started in the last POWER_JOB_TIMEOUT seconds. A running job
+    that made no progress for POWER_JOB_STALE_TIMEOUT seconds is saved as
+    done first, with its pending ports failed.
+    """
+    now = timezone.now()
+    job = PowerBatchJob.objects.filter(
+        job_id=job_id, created__gte=now - timedelta(seconds=POWER_JOB_TIMEOUT),
+    ).first()
+    if job is None:
+        return None
+    if job.status == "running" and job.updated < now - timedelta(
+        seconds=POWER_JOB_STALE_TIMEOUT
+    ):
+        results = [
+            dict(result, result="failure", errors=POWER_JOB_STALE_ERROR)
+            if result["result"] == "pending"
+            else result
+            for result in job.results
+        ]
+        # the job may have saved progress since it was read
+        if PowerBatchJob.objects.filter(id=job.id, updated=job.updated).update(
+            status="done", results=results, updated=now
+        ):
+            job.status = "done"
+            job.results = results
+    return {
+        "job_id": job.job_id,
+        "action": job.action,
+        "status": job.status,
+        "results": job.results,
+    }
@@ -1,7 +1,15 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
 from http import HTTPStatus
+import json
 import math
 
-from django.db.models import Q
+from django.contrib.postgres.fields import JSONField
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection
+from django.db.models import F, IntegerField, Q, TextField, Value
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+from django.db.models.functions import Cast
 from django.http import JsonResponse
 from rackcity.api.objects import RackRangeSerializer
 from rackcity.utils.errors_utils import (
@@ -9,8 +17,18 @@ from rackcity.utils.errors_utils import (
     Status,
     get_invalid_paginated_request_response,
 )
+from rackcity.utils.search_utils import (
+    SEARCH_ANNOTATION,
+    SEARCH_RANK_ANNOTATION,
+    annotate_search,
+    get_search_query,
+)
 from rest_framework.pagination import PageNumberPagination
-from rackcity.models import Asset
+from rackcity.models import Asset, Site
+
+# Queries the planner estimates to return more rows than this have their
+# page counts estimated instead of counted
+ESTIMATED_COUNT_THRESHOLD = 100000
 
 
 def get_sort_arguments(data):
@@ -80,6 +98,11 @@ def get_filter_arguments(data):
                             }
                         )
 
+            elif filter_type == "search":
+                filter_args.append(
+                    {SEARCH_ANNOTATION: get_search_query(filter_dict["value"])}
+                )
+
             elif filter_type == "numeric":
                 if (
                     filter_dict["min"] is not None
@@ -202,40 +225,26 @@ def get_filter_arguments(data):
             else:
                 raise Exception(
                     "String field 'filter_type' must be either 'text', "
-                    + "'numeric', 'rack_range', or 'datetime'."
+                    + "'search', 'numeric', 'rack_range', or 'datetime'."
                 )
 
     return filter_args
 
 
 def get_datacenter_filter_arguments(match_type, value):
-    datacenter_filter_args = []
-    datacenter_filter_fields = [
-        "rack__datacenter__name",
-        "rack__datacenter__abbreviation",
-        "chassis__rack__datacenter__name",
-        "chassis__rack__datacenter__abbreviation",
-    ]
-    for datacenter_filter_field in datacenter_filter_fields:
-        datacenter_filter_args.append(
-            {"{0}__i{1}".format(datacenter_filter_field, match_type): value}
-        )
-    return datacenter_filter_args
+    datacenters = Site.objects.filter(
+        Q(**{"name__i{0}".format(match_type): value})
+        | Q(**{"abbreviation__i{0}".format(match_type): value})
+    )
+    return {"effective_site__in": datacenters, "is_offline": False}
 
 
 def get_offline_site_filter_arguments(match_type, value):
-    offline_site_filter_args = []
-    offline_site_filter_fields = [
-        "offline_storage_site__name",
-        "offline_storage_site__abbreviation",
-        "chassis__offline_storage_site__name",
-        "chassis__offline_storage_site__abbreviation",
-    ]
-    for offline_site_filter_field in offline_site_filter_fields:
-        offline_site_filter_args.append(
-            {"{0}__i{1}".format(offline_site_filter_field, match_type): value}
-        )
-    return offline_site_filter_args
+    offline_sites = Site.objects.filter(
+        Q(**{"name__i{0}".format(match_type): value})
+        | Q(**{"abbreviation__i{0}".format(match_type): value})
+    )
+    return {"effective_site__in": offline_sites, "is_offline": True}
 
 
 def apply_filters_or(object_query, filter_args):
@@ -268,8 +277,13 @@ def apply_filters(object_query, q_objects):
 
 
 def get_filtered_query(object_query, data, or_filters=False):
+    """
+    Returns object_query filtered by the filters in data. Queries with search
+    filters are annotated with the rank of each object as search_rank.
+    """
     try:
         filter_args = get_filter_arguments(data)
+        object_query, filter_args = annotate_search(object_query, filter_args)
     except Exception as error:
         return (
             None,
@@ -302,13 +316,169 @@ def get_sorted_query(object_query, data, default_order=None):
                 status=HTTPStatus.BAD_REQUEST,
             ),
         )
-    if len(sort_args) == 0 and default_order:
+    is_searched = SEARCH_RANK_ANNOTATION in object_query.query.annotations
+    if len(sort_args) == 0 and is_searched:
+        objects = object_query.order_by(
+            "-" + SEARCH_RANK_ANNOTATION,
+            *([default_order] if default_order else object_query.model._meta.ordering)
+        )
+    elif len(sort_args) == 0 and default_order:
         objects = object_query.order_by(default_order)
     else:
         objects = object_query.order_by(*sort_args)
     return (objects, None)
 
 
+def get_ordering_fields(model, field_name):
+    """
+    Expands a sort field into the (field path, field, descending) columns it
+    orders by, following relations to the related model's default ordering
+    as order_by does. Returns None if model cannot be sorted by the field.
+    """
+    path = field_name.split("__")
+    current_model = model
+    for index, name in enumerate(path):
+        try:
+            field = current_model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete:
+            return None
+        if isinstance(field, JSONField):
+            if index == len(path) - 1:
+                return None
+            # sorts by the text at the key path within the JSON
+            return [(field_name, field, False)]
+        if not field.is_relation:
+            if index != len(path) - 1:
+                return None
+            return [(field_name, field, False)]
+        current_model = field.related_model
+    ordering = current_model._meta.ordering or [current_model._meta.pk.name]
+    ordering_fields = []
+    for order in ordering:
+        related_fields = get_ordering_fields(
+            current_model, order.lstrip("-")
+        )
+        if related_fields is None:
+            return None
+        ordering_fields += [
+            (field_name + "__" + path, field, descending != order.startswith("-"))
+            for path, field, descending in related_fields
+        ]
+    return ordering_fields
+
+
+def get_merged_sort_columns(object_queries, sort_args):
+    """
+    Returns the sort columns shared by every query, as (descending,
+    expressions) pairs with one expression per query. A query that cannot
+    be sorted by a column, or stores it with a different type, sorts as if
+    the column were null. A key path into a JSON field is cast to the type
+    of the column it stands in for.
+    """
+    columns = []
+    for sort_arg in sort_args:
+        descending = sort_arg.startswith("-")
+        fields_per_query = [
+            get_ordering_fields(object_query.model, sort_arg.lstrip("-"))
+            for object_query in object_queries
+        ]
+        sortable_fields = [fields for fields in fields_per_query if fields is not None]
+        if not sortable_fields:
+            continue
+        # a column's own type wins over the text of a JSON key path
+        reference_fields = next(
+            (
+                fields
+                for fields in sortable_fields
+                if not isinstance(fields[0][1], JSONField)
+            ),
+            sortable_fields[0],
+        )
+        for index, (_, reference_field, reference_descending) in enumerate(
+            reference_fields
+        ):
+            if isinstance(reference_field, JSONField):
+                output_field = TextField()
+            else:
+                output_field = reference_field.__class__()
+            expressions = []
+            for fields in fields_per_query:
+                if fields is None or len(fields) != len(reference_fields):
+                    expressions.append(Cast(Value(None), output_field=output_field))
+                    continue
+                path, field, _ = fields[index]
+                if isinstance(field, JSONField):
+                    expressions.append(Cast(get_json_key_text(path), output_field))
+                elif isinstance(reference_field, JSONField):
+                    expressions.append(Cast(F(path), output_field))
+                elif field.db_type(connection) == reference_field.db_type(connection):
+                    expressions.append(F(path))
+                else:
+                    expressions.append(Cast(Value(None), output_field=output_field))
+            columns.append((descending != reference_descending, expressions))
+    return columns
+
+
+def get_json_key_text(path):
+    """
+    Returns the text at the key path within the JSON field that starts path,
+    such as "rack__datacenter__abbreviation", or null if it is missing.
+    """
+    field_name, *keys = path.split("__")
+    expression = field_name
+    for key in keys[:-1]:
+        expression = KeyTransform(key, expression)
+    return KeyTextTransform(keys[-1], expression)
+
+
+def get_merged_page(object_queries, data, default_order, page=None, page_size=None):
+    """
+    Returns the objects of several querysets, possibly of different models,
+    sorted together by the sort arguments in data and paginated. Sorting and
+    paging run in the database over a UNION ALL of each object's primary key
+    and sort columns, so only the objects on the page are loaded. Objects
+    that sort equally keep the order of object_queries. Raises Exception if
+    the sort arguments are invalid or the page does not exist.
+    """
+    sort_args = get_sort_arguments(data) or [default_order]
+    columns = get_merged_sort_columns(object_queries, sort_args)
+    merged_queries = []
+    for query_index, object_query in enumerate(object_queries):
+        annotations = {
+            "sort_" + str(column_index): expressions[query_index]
+            for column_index, (_, expressions) in enumerate(columns)
+        }
+        annotations["query_index"] = Value(query_index, output_field=IntegerField())
+        merged_queries.append(
+            object_query.order_by()
+            .annotate(**annotations)
+            .values("pk", *annotations.keys())
+        )
+    order_by = [
+        ("-" if descending else "") + "sort_" + str(column_index)
+        for column_index, (descending, _) in enumerate(columns)
+    ] + ["query_index", "pk"]
+    merged_query = merged_queries[0].union(*merged_queries[1:], all=True)
+    merged_query = merged_query.order_by(*order_by)
+    if page is not None:
+        start = (page - 1) * page_size
+        merged_query = merged_query[start : start + page_size]
+    rows = list(merged_query)
+    if page is not None and not rows and start > 0:
+        count = sum(object_query.count() for object_query in object_queries)
+        if start > count:
+            raise Exception("Page " + str(start) + " does not exist")
+    objects_per_query = [
+        object_query.model.objects.in_bulk(
+            [row["pk"] for row in rows if row["query_index"] == query_index]
+        )
+        for query_index, object_query in enumerate(object_queries)
+    ]
+    return [objects_per_query[row["query_index"]][row["pk"]] for row in rows]
+
+
 def get_paginated_query(objects, request):
     paginator = PageNumberPagination()
     paginator.page_size = request.query_params.get("page_size")
@@ -400,13 +570,16 @@ def get_page_count_response(
     data_for_filters=None,
     or_filters=False,
     premade_object_query=None,
+    allow_estimate=False,
 ):
     """
     Returns response for a get page count view.  Optional parameters: use
     data_for_filters to specify what filters should be applied; use or_filters
     to specify if the filters should be applied as OR (instead of default AND);
     use premade_object_query if custom query manipulation needs to be performed
-    before this method (instead of using the default model.objects.all()).
+    before this method (instead of using the default model.objects.all()); use
+    allow_estimate to estimate the page count of large queries with the query
+    planner instead of counting every row.
     """
     if not query_params.get("page_size") or int(query_params.get("page_size")) <= 0:
         return JsonResponse(
@@ -427,11 +600,114 @@ def get_page_count_response(
         )
         if filter_failure_response:
             return filter_failure_response
-    count = object_query.count()
+    if allow_estimate:
+        count, is_estimate = get_count(object_query)
+    else:
+        count, is_estimate = object_query.count(), False
     page_count = math.ceil(count / page_size)
+    if is_estimate:
+        return JsonResponse({"page_count": page_count, "is_estimate": True})
     return JsonResponse({"page_count": page_count})
 
 
+def get_estimated_count(object_query):
+    """
+    Returns the number of rows the query planner expects object_query to
+    return, without running it.
+    """
+    sql, params = object_query.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def get_count(object_query):
+    """
+    Returns the number of rows object_query returns, and whether it was
+    estimated. Queries expected to return more than ESTIMATED_COUNT_THRESHOLD
+    rows are estimated by the query planner instead of counted.
+    """
+    estimated_count = get_estimated_count(object_query)
+    if estimated_count > ESTIMATED_COUNT_THRESHOLD:
+        return estimated_count, True
+    return object_query.count(), False
+
+
+def get_cursor_page_response(
+    object_query, model_serializer, response_key, request, order_field,
+):
+    """
+    Returns a page of objects ordered by order_field and id, both descending,
+    along with the cursor of the next page, or None on the last page. The
+    page starts after the object encoded in the cursor query parameter, or at
+    the first object if the cursor is empty. Pages are found by seeking an
+    index on (order_field, id) rather than with an OFFSET, so deep pages are
+    as fast as the first one. Filters in request data are applied; sorts are
+    not supported.
+    """
+    errors = []
+    try:
+        page_size = int(request.query_params.get("page_size"))
+        if page_size <= 0:
+            errors.append("Field 'page_size' must be an integer greater than 0.")
+    except (TypeError, ValueError):
+        errors.append("Must specify integer 'page_size' on paginated requests.")
+    if request.data.get("sort_by"):
+        errors.append("Sorting is not supported on requests with a cursor.")
+    cursor = request.query_params.get("cursor")
+    cursor_value, cursor_id = None, None
+    if cursor:
+        try:
+            cursor_value, cursor_id = json.loads(urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            errors.append("Cursor '" + cursor + "' is not valid.")
+    if errors:
+        return JsonResponse(
+            {
+                "failure_message": Status.ERROR.value + GenericFailure.PAGE_ERROR.value,
+                "errors": " ".join(errors),
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    object_query, filter_failure_response = get_filtered_query(
+        object_query, request.data
+    )
+    if filter_failure_response:
+        return filter_failure_response
+    try:
+        if cursor:
+            object_query = object_query.filter(
+                Q(**{order_field + "__lte": cursor_value})
+                & (Q(**{order_field + "__lt": cursor_value}) | Q(id__lt=cursor_id))
+            )
+        objects = list(object_query.order_by("-" + order_field, "-id")[: page_size + 1])
+    except (TypeError, ValidationError, ValueError) as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.ERROR.value + GenericFailure.PAGE_ERROR.value,
+                "errors": "Cursor '" + cursor + "' is not valid. " + str(error),
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    next_cursor = None
+    if len(objects) > page_size:
+        objects = objects[:page_size]
+        last_object = objects[-1]
+        # str keeps the microseconds of dates, which the JSON encoder drops
+        cursor_value = str(getattr(last_object, order_field))
+        next_cursor = urlsafe_b64encode(
+            json.dumps([cursor_value, last_object.id]).encode()
+        ).decode()
+    serializer = model_serializer(objects, many=True)
+    return JsonResponse(
+        {response_key: serializer.data, "next_cursor": next_cursor},
+        status=HTTPStatus.OK,
+    )
+
+
 def assets_online_queryset():
     filter = get_online_filter()
     return Asset.objects.filter(filter)
@@ -443,21 +719,9 @@ def assets_offline_queryset():
 
 
 def get_offline_filter():
-    # An asset is in storage (offline) if:
-    # 1. it has a storage site
-    # OR
-    # 2. it has a chassis, and its chassis has a storage site
-    return Q(offline_storage_site__isnull=False) | (
-        Q(chassis__isnull=False) & Q(chassis__offline_storage_site__isnull=False)
-    )
+    # An asset is in storage (offline) if it or its chassis has a storage site
+    return Q(is_offline=True)
 
 
 def get_online_filter():
-    # An asset is not in storage (online) if:
-    # 1. it has no storage site
-    # AND
-    # 2a. it has no chassis OR 2b. it has a chassis, but its chassis has no storage site
-    return Q(offline_storage_site__isnull=True) & (
-        (Q(chassis__isnull=False) & Q(chassis__offline_storage_site__isnull=True))
-        | (Q(chassis__isnull=True))
-    )
+    return Q(is_offline=False)
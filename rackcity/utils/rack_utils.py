@@ -1,5 +1,6 @@
 from http import HTTPStatus
 
+from django.db.models import Count
 from django.http import JsonResponse
 
 from rackcity.api.serializers import (
@@ -18,13 +19,14 @@ def get_rack_detailed_response(racks, change_plan):
             status=HTTPStatus.BAD_REQUEST,
         )
 
+    if change_plan:
+        racked_assets, racked_assets_cp = get_racked_assets_for_cp(change_plan)
     racks_with_assets = []
     for rack in racks:
         rack_serializer = RackSerializer(rack)
         if change_plan:
-            assets, assets_cp = get_racked_assets_for_cp(change_plan)
-            assets = assets.filter(rack=rack.id).order_by("rack_position")
-            assets_cp = assets_cp.filter(rack=rack.id).order_by("rack_position")
+            assets = racked_assets.filter(rack=rack.id).order_by("rack_position")
+            assets_cp = racked_assets_cp.filter(rack=rack.id).order_by("rack_position")
             assets_serializer = RecursiveAssetSerializer(assets, many=True)
             assets_cp_serializer = RecursiveAssetCPSerializer(assets_cp,many=True)
             rack_detail = {
@@ -42,3 +44,82 @@ def get_rack_detailed_response(racks, change_plan):
         racks_with_assets.append(rack_detail)
 
     return JsonResponse({"racks": racks_with_assets}, status=HTTPStatus.OK)
+
+
+def get_rack_elevation_response(racks, change_plan):
+    """
+    Returns each rack with a compact slot for every asset in it, with just
+    enough to draw the rack elevation; full asset details are fetched from
+    the asset detail view. Assets of all racks are loaded in one query, plus
+    one for the change plan's assets.
+    """
+    racks = list(racks.select_related("datacenter"))
+    if len(racks) == 0:
+        return JsonResponse(
+            {"failure_message": "There are no existing racks within this range. "},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    rack_ids = [rack.id for rack in racks]
+    slots_by_rack = {rack_id: [] for rack_id in rack_ids}
+    if change_plan:
+        assets, assets_cp = get_racked_assets_for_cp(change_plan)
+        for slot in get_rack_slots(assets_cp.filter(rack__in=rack_ids), True):
+            slots_by_rack[slot.pop("rack_id")].append(slot)
+    else:
+        assets = Asset.objects.all()
+    for slot in get_rack_slots(assets.filter(rack__in=rack_ids), False):
+        slots_by_rack[slot.pop("rack_id")].append(slot)
+
+    racks_with_slots = []
+    for rack in racks:
+        slots = sorted(slots_by_rack[rack.id], key=lambda slot: slot["rack_position"])
+        racks_with_slots.append(
+            {"rack": RackSerializer(rack).data, "assets": slots}
+        )
+    return JsonResponse({"racks": racks_with_slots}, status=HTTPStatus.OK)
+
+
+def get_rack_slots(assets, is_change_plan):
+    """
+    Returns a slot for every asset in the query, in one query.
+    """
+    # the reverse relation from a chassis to its blades
+    blades = "assetcp" if is_change_plan else "asset"
+    rows = (
+        assets.order_by()
+        .values(
+            "id",
+            "asset_number",
+            "hostname",
+            "rack_id",
+            "rack_position",
+            "display_color",
+            "model__height",
+            "model__vendor",
+            "model__model_number",
+            "model__model_type",
+            "model__display_color",
+            *(["related_asset_id"] if is_change_plan else []),
+        )
+        .annotate(num_blades=Count(blades))
+    )
+    return [
+        {
+            "id": row["id"],
+            "related_asset_id": row.get("related_asset_id"),
+            "is_change_plan": is_change_plan,
+            "asset_number": row["asset_number"],
+            "hostname": row["hostname"],
+            "rack_id": row["rack_id"],
+            "rack_position": row["rack_position"],
+            "height": row["model__height"],
+            "model": {
+                "vendor": row["model__vendor"],
+                "model_number": row["model__model_number"],
+                "model_type": row["model__model_type"],
+            },
+            "display_color": row["display_color"] or row["model__display_color"],
+            "num_blades": row["num_blades"],
+        }
+        for row in rows
+    ]
@@ -1,8 +1,20 @@
 from django.core.exceptions import ObjectDoesNotExist
-from rackcity.models import Asset, AssetCP, ITModel, Rack, PowerPort, NetworkPort
+from rackcity.models import (
+    Asset,
+    AssetCP,
+    ITModel,
+    Rack,
+    PDUPort,
+    PDUPortCP,
+    PowerPort,
+    NetworkPort,
+)
 from rackcity.models.asset import get_assets_for_cp
 from rackcity.utils.exceptions import LocationException, AssetModificationException
 
+# Ports on each PDU of a rack
+PDU_PORT_NUMBERS = range(1, 25)
+
 
 def validate_asset_datacenter_move(data, asset):
     old_datacenter = asset.rack.datacenter
@@ -27,6 +39,142 @@ def validate_asset_datacenter_move(data, asset):
             )
 
 
+class RackOccupancy:
+    """
+    Records which assets occupy each U of a rack, so that checking a new
+    location only looks at the U's it covers.
+    """
+
+    def __init__(self, rack_height):
+        self.rack_height = rack_height
+        # occupants[u] lists (asset id, asset name) of every asset covering u
+        self.occupants = [[] for _ in range(rack_height + 1)]
+
+    def add(self, asset_id, asset_name, rack_position, height):
+        if rack_position is None or not height:
+            return
+        for location in range(
+            max(rack_position, 1), min(rack_position + height, self.rack_height + 1)
+        ):
+            self.occupants[location].append((asset_id, asset_name))
+
+    def get_conflict(self, rack_position, height, ignored_ids=()):
+        """
+        Returns (asset id, asset name) of an asset occupying any U of the
+        given location, other than assets with ignored ids, or None.
+        """
+        for location in range(
+            max(rack_position, 1), min(rack_position + height, self.rack_height + 1)
+        ):
+            for occupant in self.occupants[location]:
+                if occupant[0] is None or occupant[0] not in ignored_ids:
+                    return occupant
+        return None
+
+
+def get_rack_occupancy(rack_id, change_plan=None):
+    """
+    Returns the RackOccupancy of a rack, live or as on the change plan, read
+    along with each asset's model height in one query per asset table.
+    """
+    occupancy = RackOccupancy(Rack.objects.get(id=rack_id).height)
+    if change_plan:
+        assets, assets_cp = get_assets_for_cp(change_plan.id)
+        asset_queries = [assets, assets_cp]
+    else:
+        asset_queries = [Asset.objects.all()]
+    for asset_query in asset_queries:
+        for asset_id, asset_number, rack_position, height in asset_query.filter(
+            rack=rack_id
+        ).values_list("id", "asset_number", "rack_position", "model__height"):
+            occupancy.add(asset_id, asset_number, rack_position, height)
+    return occupancy
+
+
+def get_rack_occupancies(rack_ids):
+    """
+    Returns the live RackOccupancy of each rack, keyed by rack id, read for
+    all racks together in two queries.
+    """
+    occupancies = {
+        rack_id: RackOccupancy(height)
+        for rack_id, height in Rack.objects.filter(id__in=rack_ids).values_list(
+            "id", "height"
+        )
+    }
+    for (
+        rack_id,
+        asset_id,
+        asset_number,
+        rack_position,
+        height,
+    ) in Asset.objects.filter(rack__in=rack_ids).values_list(
+        "rack_id", "id", "asset_number", "rack_position", "model__height"
+    ):
+        occupancies[rack_id].add(asset_id, asset_number, rack_position, height)
+    return occupancies
+
+
+class PDUOccupancy:
+    """
+    Records which ports of the left and right PDUs of a rack are connected to
+    a power port of an asset.
+    """
+
+    def __init__(self):
+        self.occupied = {"L": set(), "R": set()}
+
+    def add(self, left_right, port_number):
+        self.occupied[left_right].add(port_number)
+
+    def get_available(self, left_right):
+        return [
+            port_number
+            for port_number in PDU_PORT_NUMBERS
+            if port_number not in self.occupied[left_right]
+        ]
+
+    def get_paired_available(self):
+        """
+        Returns the port numbers free on both PDUs, for assets with a power
+        port on each side.
+        """
+        return [
+            port_number
+            for port_number in PDU_PORT_NUMBERS
+            if port_number not in self.occupied["L"]
+            and port_number not in self.occupied["R"]
+        ]
+
+
+def get_pdu_occupancies(rack_ids, change_plan=None):
+    """
+    Returns the PDUOccupancy of each rack, live or as on the change plan,
+    keyed by rack id, read for all racks together in one query.
+    """
+    occupancies = {rack_id: PDUOccupancy() for rack_id in rack_ids}
+    if change_plan:
+        assets, assets_cp = get_assets_for_cp(change_plan.id)
+        connected_ports = (
+            PDUPort.objects.filter(rack__in=rack_ids, powerport__asset__in=assets)
+            .values_list("rack_id", "left_right", "port_number")
+            .union(
+                PDUPortCP.objects.filter(
+                    rack__in=rack_ids,
+                    change_plan=change_plan,
+                    powerportcp__asset__in=assets_cp,
+                ).values_list("rack_id", "left_right", "port_number")
+            )
+        )
+    else:
+        connected_ports = PDUPort.objects.filter(
+            rack__in=rack_ids, powerport__isnull=False
+        ).values_list("rack_id", "left_right", "port_number")
+    for rack_id, left_right, port_number in connected_ports:
+        occupancies[rack_id].add(left_right, port_number)
+    return occupancies
+
+
 def validate_asset_location_in_rack(
     rack_id,
     asset_rack_position,
@@ -34,62 +182,38 @@ def validate_asset_location_in_rack(
     asset_id=None,
     change_plan=None,
     related_asset_id=None,
+    rack_occupancy=None,
 ):
+    """
+    Raises LocationException if the location is outside of the rack or
+    overlaps another asset, ignoring the asset itself and its related asset.
+    A rack_occupancy already read for the rack may be passed in to avoid
+    reading it again.
+    """
     if asset_rack_position is None:
         return
-    new_asset_location_range = [asset_rack_position + i for i in range(asset_height)]
-    rack_height = Rack.objects.get(id=rack_id).height
-    for location in new_asset_location_range:
-        if location <= 0 or location > rack_height:
-            raise LocationException("Cannot place asset outside of rack. ")
-    if change_plan:
-        assets, assets_cp = get_assets_for_cp(change_plan.id)
-    else:
-        assets = Asset.objects.all()
-
-    for asset_in_rack in assets.filter(rack=rack_id):
-        # Ignore if asset being modified conflicts with its old location
-
-        is_valid_conflict = asset_id is None or asset_in_rack.id != asset_id
-
-        if related_asset_id:
-            is_valid_conflict = asset_in_rack.id != related_asset_id
-
-        if is_valid_conflict:
-            for occupied_location in [
-                asset_in_rack.rack_position + i
-                for i in range(asset_in_rack.model.height)
-            ]:
-                if occupied_location in new_asset_location_range:
-                    if asset_in_rack.asset_number:
-                        raise LocationException(
-                            "Asset location conflicts with another asset: '"
-                            + str(asset_in_rack.asset_number)
-                            + "'. "
-                        )
-                    else:
-                        raise LocationException(
-                            "Asset location conflicts with another asset."
-                        )
-    if change_plan:
-        for asset_in_rack in assets_cp.filter(rack=rack_id):
-            # Ignore if asset being modified conflicts with its old location
-            if (asset_id is None) or (asset_in_rack.id != asset_id):
-                for occupied_location in [
-                    asset_in_rack.rack_position + i
-                    for i in range(asset_in_rack.model.height)
-                ]:
-                    if occupied_location in new_asset_location_range:
-                        if asset_in_rack.asset_number:
-                            raise LocationException(
-                                "Asset location conflicts with another asset: '"
-                                + str(asset_in_rack.asset_number)
-                                + "'. "
-                            )
-                        else:
-                            raise LocationException(
-                                "Asset location conflicts with another asset."
-                            )
+    if rack_occupancy is None:
+        rack_occupancy = get_rack_occupancy(rack_id, change_plan=change_plan)
+    if (
+        asset_rack_position <= 0
+        or asset_rack_position + asset_height - 1 > rack_occupancy.rack_height
+    ):
+        raise LocationException("Cannot place asset outside of rack. ")
+    conflict = rack_occupancy.get_conflict(
+        asset_rack_position,
+        asset_height,
+        ignored_ids={asset_id, related_asset_id} - {None},
+    )
+    if conflict:
+        conflicting_asset_number = conflict[1]
+        if conflicting_asset_number:
+            raise LocationException(
+                "Asset location conflicts with another asset: '"
+                + str(conflicting_asset_number)
+                + "'. "
+            )
+        else:
+            raise LocationException("Asset location conflicts with another asset.")
 
 
 def validate_asset_location_in_chassis(
@@ -271,40 +395,50 @@ def empty_vs_null_comparison(existing_value, new_value):
 
 
 def no_infile_location_conflicts(asset_datas):
-    rack_location_occupied_by = {}
+    models = ITModel.objects.in_bulk(
+        {int(asset_data["model"]) for asset_data in asset_datas}
+    )
+    rack_heights = dict(
+        Rack.objects.filter(
+            id__in={
+                int(asset_data["rack"])
+                for asset_data in asset_datas
+                if asset_data.get("rack")
+            }
+        ).values_list("id", "height")
+    )
+    rack_occupancies = {}
     chassis_slot_occupied_by = {}
     unnamed_asset_count = 0
     for asset_data in asset_datas:
         if asset_data["offline_storage_site"]:
             continue
-        model = ITModel.objects.get(id=asset_data["model"])
+        model = models[int(asset_data["model"])]
+        if ("asset_number" in asset_data) and (asset_data["asset_number"]):
+            asset_name = str(asset_data["asset_number"])
+        elif ("hostname" in asset_data) and (asset_data["hostname"]):
+            asset_name = asset_data["hostname"]
+        else:
+            asset_name = None
         if model.is_rackmount():
-            rack = asset_data["rack"]
+            rack = int(asset_data["rack"])
             height = model.height
             rack_position = int(asset_data["rack_position"])
-            asset_location_range = [  # THIS IS REPEATED! FACTOR OUT.
-                rack_position + i for i in range(height)
-            ]
-            if rack not in rack_location_occupied_by:
-                rack_location_occupied_by[rack] = {}
-            for location in asset_location_range:
-                if location in rack_location_occupied_by[rack]:
-                    raise LocationException(
-                        "Asset '"
-                        + str(asset_data["asset_number"])
-                        + "' conflicts with asset '"
-                        + rack_location_occupied_by[rack][location]
-                        + "'. "
-                    )
-                else:
-                    if ("asset_number" in asset_data) and (asset_data["asset_number"]):
-                        asset_name = asset_data["asset_number"]
-                    elif ("hostname" in asset_data) and (asset_data["hostname"]):
-                        asset_name = asset_data["hostname"]
-                    else:
-                        asset_name = "unnamed_asset_" + str(unnamed_asset_count)
-                        unnamed_asset_count += 1
-                    rack_location_occupied_by[rack][location] = asset_name
+            if rack not in rack_occupancies:
+                rack_occupancies[rack] = RackOccupancy(rack_heights[rack])
+            conflict = rack_occupancies[rack].get_conflict(rack_position, height)
+            if conflict:
+                raise LocationException(
+                    "Asset '"
+                    + str(asset_data["asset_number"])
+                    + "' conflicts with asset '"
+                    + conflict[1]
+                    + "'. "
+                )
+            if asset_name is None:
+                asset_name = "unnamed_asset_" + str(unnamed_asset_count)
+                unnamed_asset_count += 1
+            rack_occupancies[rack].add(None, asset_name, rack_position, height)
         else:
             if "chassis" in asset_data:
                 chassis = asset_data["chassis"]
@@ -322,11 +456,7 @@ def no_infile_location_conflicts(asset_datas):
                     + "'. "
                 )
             else:
-                if ("asset_number" in asset_data) and (asset_data["asset_number"]):
-                    asset_name = asset_data["asset_number"]
-                elif ("hostname" in asset_data) and (asset_data["hostname"]):
-                    asset_name = asset_data["hostname"]
-                else:
+                if asset_name is None:
                     asset_name = "unnamed_asset_" + str(unnamed_asset_count)
                     unnamed_asset_count += 1
                 chassis_slot_occupied_by[chassis][chassis_slot] = asset_name
@@ -0,0 +1,308 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Count, F, FloatField, Func, Q, Sum
+from django.db.models.functions import Floor
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+import threading
+from uuid import uuid4
+from rackcity.models import (
+    Asset,
+    ITModel,
+    Rack,
+    Site,
+    UtilizationCategory,
+    UtilizationSnapshot,
+)
+from rackcity.models.model_utils import ModelType
+from rackcity.utils.cache_utils import is_cache_shared
+from rackcity.utils.transaction_utils import has_commit_hook, schedule_on_commit
+
+# Seconds for which rack usage is kept in the cache
+RACK_USAGE_TIMEOUT = 60 * 60
+RACK_USAGE_KEY_PREFIX = "rackcity:rack_usage:"
+RACK_USAGE_VERSION_KEY = "rackcity:rack_usage_version"
+NO_OWNER = "(No owner)"
+# Points returned by a utilization history, unless fewer are asked for
+UTILIZATION_HISTORY_MAX_POINTS = 1000
+
+
+def get_rack_usage():
+    """
+    Returns the rack usage of every datacenter with racks, keyed by site id.
+    The usage is computed with a fixed number of queries. With a cache shared
+    by all workers, it is cached until an asset, model, rack or site changes.
+    """
+    if not is_cache_shared():
+        # other workers could not invalidate this worker's cache
+        return compute_rack_usage()
+    if has_unpublished_rack_usage_changes():
+        # the cache cannot reflect changes not yet committed
+        return compute_rack_usage()
+    version = cache.get(RACK_USAGE_VERSION_KEY)
+    if version is None:
+        cache.add(RACK_USAGE_VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(RACK_USAGE_VERSION_KEY)
+    usage_key = RACK_USAGE_KEY_PREFIX + version
+    rack_usage = cache.get(usage_key)
+    if rack_usage is None:
+        rack_usage = compute_rack_usage()
+        cache.set(usage_key, rack_usage, timeout=RACK_USAGE_TIMEOUT)
+    return rack_usage
+
+
+def compute_rack_usage():
+    """
+    Returns, keyed by site id, each datacenter with its number of rack slots
+    and the rack slots used by racked assets of each model and each owner.
+    """
+    rack_usage = {}
+    datacenters = (
+        Rack.objects.values(
+            "datacenter", "datacenter__abbreviation", "datacenter__name"
+        )
+        .annotate(num_rack_slots=Sum("height"))
+        .order_by("datacenter__abbreviation")
+    )
+    for datacenter in datacenters:
+        rack_usage[datacenter["datacenter"]] = {
+            "datacenter": {
+                "id": datacenter["datacenter"],
+                "abbreviation": datacenter["datacenter__abbreviation"],
+                "name": datacenter["datacenter__name"],
+            },
+            "num_rack_slots": datacenter["num_rack_slots"],
+            "models": [],
+            "owners": [],
+        }
+    racked_assets = Asset.objects.filter(
+        ~Q(model__model_type=ModelType.BLADE_ASSET.value)
+        & Q(is_offline=False)
+        & Q(effective_site__in=list(rack_usage))
+    )
+    model_usage = (
+        racked_assets.values("effective_site", "model__vendor", "model__model_number")
+        .annotate(num_rack_slots=Sum("model__height"))
+        .order_by("model__vendor", "model__model_number")
+    )
+    for model in model_usage:
+        rack_usage[model["effective_site"]]["models"].append(
+            (
+                model["model__vendor"],
+                model["model__model_number"],
+                model["num_rack_slots"],
+            )
+        )
+    owner_usage = (
+        racked_assets.values("effective_site", "owner")
+        .annotate(num_rack_slots=Sum("model__height"))
+        .order_by("owner")
+    )
+    for owner in owner_usage:
+        rack_usage[owner["effective_site"]]["owners"].append(
+            (owner["owner"] or NO_OWNER, owner["num_rack_slots"])
+        )
+    return rack_usage
+
+
+def get_rack_report(datacenter_usages):
+    """
+    Returns the summary of rack usage across the given datacenters: the
+    percentage of rackspace free versus used, allocated per vendor, allocated
+    per model, and allocated per owner. Returns None if the datacenters have
+    no racked assets.
+    """
+    total_num_rack_slots = 0
+    vendor_allocation = {}
+    model_allocation = {}
+    owner_allocation = {}
+    for datacenter_usage in datacenter_usages:
+        total_num_rack_slots += datacenter_usage["num_rack_slots"]
+        for vendor, model_number, num_rack_slots in datacenter_usage["models"]:
+            vendor_allocation[vendor] = (
+                vendor_allocation.get(vendor, 0) + num_rack_slots
+            )
+            model_allocation[(vendor, model_number)] = (
+                model_allocation.get((vendor, model_number), 0) + num_rack_slots
+            )
+        for owner, num_rack_slots in datacenter_usage["owners"]:
+            owner_allocation[owner] = owner_allocation.get(owner, 0) + num_rack_slots
+    num_full_rack_slots = sum(vendor_allocation.values())
+    if total_num_rack_slots == 0 or num_full_rack_slots == 0:
+        return None
+    return {
+        "free_rackspace_percent": 1 - (num_full_rack_slots / total_num_rack_slots),
+        "vendor_allocation": [
+            {
+                "vendor": vendor,
+                "allocation_percent": vendor_allocation[vendor] / num_full_rack_slots,
+            }
+            for vendor in sorted(vendor_allocation)
+        ],
+        "model_allocation": [
+            {
+                "vendor": vendor,
+                "model_number": model_number,
+                "allocation_percent": model_allocation[(vendor, model_number)]
+                / num_full_rack_slots,
+            }
+            for vendor, model_number in sorted(model_allocation)
+        ],
+        "owner_allocation": [
+            {
+                "owner": owner,
+                "allocation_percent": owner_allocation[owner] / num_full_rack_slots,
+            }
+            for owner in sorted(owner_allocation)
+        ],
+    }
+
+
+def take_utilization_snapshot(date):
+    """
+    Saves the rack usage of every datacenter with racks as utilization
+    snapshots taken at date, one row per datacenter and per vendor, owner
+    and model with racked assets in it. Returns the saved snapshots.
+    """
+    snapshots = []
+    for datacenter_id, datacenter_usage in compute_rack_usage().items():
+        abbreviation = datacenter_usage["datacenter"]["abbreviation"]
+        usages = [(UtilizationCategory.DATACENTER, abbreviation, 0)]
+        for vendor, model_number, num_rack_slots in datacenter_usage["models"]:
+            model_name = vendor + " " + model_number
+            usages += [
+                (UtilizationCategory.DATACENTER, abbreviation, num_rack_slots),
+                (UtilizationCategory.VENDOR, vendor, num_rack_slots),
+                (UtilizationCategory.MODEL, model_name, num_rack_slots),
+            ]
+        for owner, num_rack_slots in datacenter_usage["owners"]:
+            usages.append((UtilizationCategory.OWNER, owner, num_rack_slots))
+        used_rack_slots = {}
+        for category, name, num_rack_slots in usages:
+            used_rack_slots[(category, name)] = (
+                used_rack_slots.get((category, name), 0) + num_rack_slots
+            )
+        for (category, name), num_rack_slots in used_rack_slots.items():
+            snapshots.append(
+                UtilizationSnapshot(
+                    date=date,
+                    datacenter_id=datacenter_id,
+                    category=category.value,
+                    name=name,
+                    used_rack_slots=num_rack_slots,
+                    total_rack_slots=datacenter_usage["num_rack_slots"]
+                    if category == UtilizationCategory.DATACENTER
+                    else 0,
+                )
+            )
+    return UtilizationSnapshot.objects.bulk_create(snapshots)
+
+
+def get_utilization_history(category, start, end, num_points, datacenter_id=None):
+    """
+    Returns the utilization snapshots of category taken from start to end,
+    in all datacenters or in one, downsampled to at most num_points points
+    at equal intervals. Each point has the mean rack slots used and in total,
+    and used by each name of category, over the snapshots in its interval.
+    Intervals without snapshots have no point. Takes two queries.
+    """
+    interval_seconds = max((end - start).total_seconds() / num_points, 1)
+    snapshots = UtilizationSnapshot.objects.filter(date__gte=start, date__lt=end)
+    if datacenter_id is not None:
+        snapshots = snapshots.filter(datacenter=datacenter_id)
+    snapshots = snapshots.annotate(
+        interval=Floor(
+            (
+                Func(
+                    F("date"),
+                    template="EXTRACT(EPOCH FROM %(expressions)s)",
+                    output_field=FloatField(),
+                )
+                - start.timestamp()
+            )
+            / interval_seconds
+        )
+    )
+    datacenter_snapshots = snapshots.filter(
+        category=UtilizationCategory.DATACENTER.value
+    )
+    # every snapshot has a row per datacenter, so missing rows of a name
+    # count as no rack slots used
+    num_snapshots = {
+        row["interval"]: row["num_snapshots"]
+        for row in datacenter_snapshots.values("interval")
+        .annotate(num_snapshots=Count("date", distinct=True))
+        .order_by()
+    }
+    points = {}
+    rows = (
+        snapshots.filter(
+            category__in=[UtilizationCategory.DATACENTER.value, category.value]
+        )
+        .values("interval", "category", "name")
+        .annotate(
+            used_rack_slots=Sum("used_rack_slots"),
+            total_rack_slots=Sum("total_rack_slots"),
+        )
+        .order_by("interval", "name")
+    )
+    for row in rows:
+        interval = int(row["interval"])
+        point = points.setdefault(
+            interval,
+            {
+                "date": start + timedelta(seconds=interval * interval_seconds),
+                "used_rack_slots": 0,
+                "total_rack_slots": 0,
+                "allocation": [],
+            },
+        )
+        row_num_snapshots = num_snapshots[row["interval"]]
+        if row["category"] == UtilizationCategory.DATACENTER.value:
+            point["used_rack_slots"] += row["used_rack_slots"] / row_num_snapshots
+            point["total_rack_slots"] += row["total_rack_slots"] / row_num_snapshots
+        if row["category"] == category.value:
+            point["allocation"].append(
+                {
+                    "name": row["name"],
+                    "used_rack_slots": row["used_rack_slots"] / row_num_snapshots,
+                }
+            )
+    return [points[interval] for interval in sorted(points)]
+
+
+# Remembers whether this thread's transaction changed the rack usage
+unpublished_rack_usage_changes = threading.local()
+
+
+def record_rack_usage_change():
+    """
+    Invalidates the cached rack usage once the surrounding transaction
+    commits.
+    """
+    if not has_unpublished_rack_usage_changes():
+        schedule_on_commit(unpublished_rack_usage_changes, publish_rack_usage_changes)
+
+
+def has_unpublished_rack_usage_changes():
+    return has_commit_hook(unpublished_rack_usage_changes)
+
+
+def publish_rack_usage_changes():
+    cache.set(RACK_USAGE_VERSION_KEY, uuid4().hex, timeout=None)
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+@receiver(post_save, sender=ITModel)
+@receiver(post_delete, sender=ITModel)
+@receiver(post_save, sender=Rack)
+@receiver(post_delete, sender=Rack)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def mark_rack_usage_change(sender, **kwargs):
+    """
+    Invalidates the cached rack usage when an asset, model, rack or site
+    changes.
+    """
+    record_rack_usage_change()
@@ -0,0 +1,157 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import Case, F, FloatField, Q, Value, When
+import re
+from rackcity.models import Asset, ITModel, Log
+
+# Text search configuration of search vectors and queries; "simple" does not
+# stem words, so hostnames and usernames match as typed
+SEARCH_CONFIG = "simple"
+# Fields of each model matched by search filters. Migration
+# 0061_search_indexes indexes the search vector of each model, and the index
+# is only used while its expression matches get_search_vector exactly.
+SEARCH_FIELDS = {
+    Asset: ("hostname", "owner", "comment"),
+    ITModel: ("vendor", "model_number"),
+    Log: ("log_content",),
+}
+# Relations whose search fields are also matched by a model's search filters
+SEARCH_RELATIONS = {
+    Asset: {"model": ITModel},
+}
+# Annotations added to querysets with search filters
+SEARCH_ANNOTATION = "search"
+SEARCH_RANK_ANNOTATION = "search_rank"
+# Assets returned by a typeahead search
+TYPEAHEAD_LIMIT = 10
+
+
+def get_search_words(value):
+    return re.findall(r"\w+", value.lower())
+
+
+def get_search_query(value):
+    """
+    Returns a query matching text that contains a word starting with each
+    word of value. Raises Exception if value has no words.
+    """
+    words = get_search_words(value)
+    if not words:
+        raise Exception("Search filters must contain at least one word.")
+    return SearchQuery(
+        " & ".join(word + ":*" for word in words),
+        config=SEARCH_CONFIG,
+        search_type="raw",
+    )
+
+
+def get_search_vector(model, prefix=""):
+    return SearchVector(
+        *[prefix + field for field in SEARCH_FIELDS[model]], config=SEARCH_CONFIG
+    )
+
+
+def get_search_filter_arguments(model, search_query):
+    """
+    Returns the filter arguments, to be applied as OR, matching objects of
+    model by search_query, and the rank of each match. The search vector
+    must be annotated on the queryset they are applied to.
+    """
+    search_filter_args = [{SEARCH_ANNOTATION: search_query}]
+    rank = SearchRank(F(SEARCH_ANNOTATION), search_query)
+    for relation, related_model in SEARCH_RELATIONS.get(model, {}).items():
+        # matching ids are found first so that each table's index can be used
+        related_ids = list(
+            related_model.objects.annotate(
+                **{SEARCH_ANNOTATION: get_search_vector(related_model)}
+            )
+            .filter(**{SEARCH_ANNOTATION: search_query})
+            .values_list("id", flat=True)
+        )
+        search_filter_args.append({relation + "__in": related_ids})
+        rank += SearchRank(
+            get_search_vector(related_model, prefix=relation + "__"), search_query
+        )
+    return search_filter_args, rank
+
+
+def annotate_search(object_query, filter_args):
+    """
+    Annotates object_query with its search vector and the rank of each
+    object against the search filters in filter_args, which are expanded to
+    match related objects too. Returns the annotated query and filter
+    arguments. Raises Exception if the model cannot be searched.
+    """
+    search_queries = [
+        filter_arg[SEARCH_ANNOTATION]
+        for filter_arg in filter_args
+        if isinstance(filter_arg, dict) and SEARCH_ANNOTATION in filter_arg
+    ]
+    if not search_queries:
+        return object_query, filter_args
+    model = object_query.model
+    if model not in SEARCH_FIELDS:
+        raise Exception(
+            "Search filters are not supported on "
+            + str(model._meta.verbose_name_plural)
+            + "."
+        )
+    search_filters = []
+    rank = Value(0.0, output_field=FloatField())
+    for search_query in search_queries:
+        search_filter_args, search_rank = get_search_filter_arguments(
+            model, search_query
+        )
+        search_filters.append(search_filter_args)
+        rank += search_rank
+    filter_args = [
+        filter_arg
+        for filter_arg in filter_args
+        if not (isinstance(filter_arg, dict) and SEARCH_ANNOTATION in filter_arg)
+    ] + search_filters
+    object_query = object_query.annotate(
+        **{SEARCH_ANNOTATION: get_search_vector(model)}
+    ).annotate(**{SEARCH_RANK_ANNOTATION: rank})
+    return object_query, filter_args
+
+
+def get_asset_typeahead(value, limit=TYPEAHEAD_LIMIT):
+    """
+    Returns up to limit assets whose hostname contains value, whose search
+    fields or model match value as a search, or whose asset number starts
+    with value. Hostnames starting with value come first, then the best
+    search matches.
+    """
+    value = value.strip()
+    matches = Q(hostname__icontains=value)
+    rank = Case(
+        When(hostname__istartswith=value, then=Value(1.0)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    if get_search_words(value):
+        search_filter_args, search_rank = get_search_filter_arguments(
+            Asset, get_search_query(value)
+        )
+        for search_filter_arg in search_filter_args:
+            matches |= Q(**search_filter_arg)
+        rank += search_rank
+    if value.isdigit() and len(value) <= 6:
+        scale = 10 ** (6 - len(value))
+        matches |= Q(
+            asset_number__range=(int(value) * scale, (int(value) + 1) * scale - 1)
+        )
+    return (
+        Asset.objects.annotate(
+            **{SEARCH_ANNOTATION: get_search_vector(Asset)},
+            **{SEARCH_RANK_ANNOTATION: rank}
+        )
+        .filter(matches)
+        .order_by("-" + SEARCH_RANK_ANNOTATION, "asset_number")
+        .values(
+            "id",
+            "asset_number",
+            "hostname",
+            vendor=F("model__vendor"),
+            model_number=F("model__model_number"),
+        )[:limit]
+    )
@@ -0,0 +1,39 @@
+from django.db import transaction
+import weakref
+
+
+class CommitHook:
+    """
+    A function scheduled to run once the surrounding transaction commits.
+    Only the transaction's list of commit hooks holds the hook itself, so it
+    is freed as soon as the transaction commits or rolls back.
+    """
+
+    def __init__(self, state, function):
+        self.state = state
+        self.function = function
+
+    def __call__(self):
+        self.state.commit_hook = None
+        self.function()
+
+
+def schedule_on_commit(state, function):
+    """
+    Runs function once the surrounding transaction commits, or right away
+    outside of a transaction. state is the threading.local that remembers
+    the hook until then, for has_commit_hook.
+    """
+    hook = CommitHook(state, function)
+    state.commit_hook = weakref.ref(hook)
+    transaction.on_commit(hook)
+
+
+def has_commit_hook(state):
+    """
+    Returns whether a hook scheduled with state is waiting for the
+    surrounding transaction to commit. Once the transaction rolls back, its
+    hooks are freed and this returns False.
+    """
+    commit_hook = getattr(state, "commit_hook", None)
+    return commit_hook is not None and commit_hook() is not None
@@ -30,6 +30,7 @@ from .asset_views import (
     offline_storage_asset_page_count,
     asset_fields,
     asset_number,
+    asset_search,
     get_asset_from_barcode,
 )
 from .network_connections_views import (
@@ -49,7 +50,11 @@ from .rack_views import (
     rack_delete,
     rack_summary,
 )
-from .report_views import report_rack_usage_global, report_rack_usage_datacenter
+from .report_views import (
+    report_rack_usage_global,
+    report_rack_usage_datacenter,
+    report_rack_usage_history,
+)
 from .user_views import (
     netid_login,
     RegisterNameView,
@@ -78,14 +83,19 @@ from .site_views import (
 )
 from .power_views import (
     pdu_power_status,
+    pdu_power_status_bulk,
     pdu_power_on,
     pdu_power_off,
     pdu_power_cycle,
     pdu_port_availability,
+    pdu_cache_stats,
     chassis_power_status,
+    chassis_power_status_bulk,
     chassis_power_on,
     chassis_power_off,
     chassis_power_cycle,
+    power_batch_start,
+    power_batch_status,
 )
 from .change_plan_views import (
     change_plan_many,
@@ -1,6 +1,6 @@
 from base64 import b64decode
 import csv
-from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.core.exceptions import ObjectDoesNotExist
 from django.http import JsonResponse
 from http import HTTPStatus
 from io import StringIO, BytesIO
@@ -11,29 +11,25 @@ from rackcity.api.serializers import (
     RecursiveAssetSerializer,
     RecursiveAssetCPSerializer,
     BulkAssetSerializer,
-    ITModelSerializer,
-    RackSerializer,
+    annotate_bulk_asset_relations,
     normalize_bulk_asset_data,
-    ChassisSerializer,
-    SiteSerializer,
 )
 from rackcity.models import (
     Asset,
     DecommissionedAsset,
-    ITModel,
-    Rack,
-    Site,
-    validate_location_type,
 )
 from rackcity.models.asset import (
     get_assets_for_cp,
     get_next_available_asset_number,
     AssetCP,
 )
+from rackcity.utils.asset_import_utils import (
+    AssetImport,
+    approve_asset_modifications,
+)
 from rackcity.utils.asset_utils import (
     does_asset_exist,
     save_all_connection_data,
-    save_power_connections,
     save_all_field_data_live,
     save_all_field_data_cp,
     add_chassis_to_cp,
@@ -50,13 +46,12 @@ from rackcity.utils.errors_utils import (
     parse_serializer_errors,
     parse_save_validation_error,
     BulkFailure,
-    AuthFailure,
 )
 from rackcity.utils.exceptions import (
     LocationException,
-    PowerConnectionException,
     UserAssetPermissionException,
     AssetModificationException,
+    ImportSessionException,
 )
 from rackcity.utils.log_utils import (
     log_action,
@@ -66,6 +61,8 @@ from rackcity.utils.log_utils import (
     Action,
     ElementType,
 )
+from rackcity.utils.export_utils import EXPORT_CHUNK_SIZE, get_export_response
+from rackcity.utils.import_session_utils import pop_staged_rows, stage_import
 from rackcity.utils.query_utils import (
     get_sort_arguments,
     get_filter_arguments,
@@ -75,16 +72,14 @@ from rackcity.utils.query_utils import (
     assets_online_queryset,
     assets_offline_queryset,
 )
+from rackcity.utils.search_utils import get_asset_typeahead
 from rackcity.utils.rackcity_utils import (
     validate_asset_location_in_rack,
     validate_asset_location_in_chassis,
     validate_location_modification,
-    no_infile_location_conflicts,
-    records_are_identical,
     validate_hostname_deletion,
 )
 from rackcity.permissions.permissions import (
-    user_has_asset_permission,
     validate_user_permission_on_existing_asset,
     validate_user_permission_on_new_asset_data,
 )
@@ -631,427 +626,30 @@ def asset_bulk_upload(request):
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    bulk_asset_datas = []
-    for row in csv_reader:
-        bulk_asset_datas.append(dict(row))
-    assets_to_add = []
-    potential_modifications = []
-    hostnames_in_import = set()
-    asset_numbers_in_import = set()
-    asset_datas = []
-    chassis_asset_numbers = set()
-    warning_message = ""
-    for bulk_asset_data in bulk_asset_datas:
-        asset_data = normalize_bulk_asset_data(bulk_asset_data)
-        asset_datas.append(asset_data)
-        try:
-            model = ITModel.objects.get(
-                vendor=asset_data["vendor"], model_number=asset_data["model_number"]
-            )
-        except ObjectDoesNotExist:
-            failure_message = (
-                Status.IMPORT_ERROR.value
-                + "Model does not exist: "
-                + "vendor="
-                + asset_data["vendor"]
-                + ", model_number="
-                + asset_data["model_number"]
-            )
-            return JsonResponse(
-                {"failure_message": failure_message}, status=HTTPStatus.BAD_REQUEST
-            )
-        if model.is_blade_chassis():
-            if "asset_number" in asset_data and asset_data["asset_number"]:
-                chassis_asset_numbers.add(asset_data["asset_number"])
-        asset_data["model"] = model.id
-        del asset_data["vendor"]
-        del asset_data["model_number"]
-        if asset_data["chassis_number"]:
-            try:
-                chassis = Asset.objects.get(asset_number=asset_data["chassis_number"])
-                if not chassis.model.is_blade_chassis():
-                    failure_message = (
-                        Status.IMPORT_ERROR.value
-                        + "Asset is not a chassis: "
-                        + "asset_number="
-                        + asset_data["chassis_number"]
-                    )
-                    return JsonResponse(
-                        {"failure_message": failure_message},
-                        status=HTTPStatus.BAD_REQUEST,
-                    )
-            except ObjectDoesNotExist:
-                if not asset_data["chassis_number"] in chassis_asset_numbers:
-                    failure_message = (
-                        Status.IMPORT_ERROR.value
-                        + "Chassis does not exist: "
-                        + "asset_number="
-                        + asset_data["chassis_number"]
-                    )
-                    return JsonResponse(
-                        {"failure_message": failure_message},
-                        status=HTTPStatus.BAD_REQUEST,
-                    )
-            else:
-                asset_data["chassis"] = chassis.id
-                del asset_data["chassis_number"]
-        else:
-            asset_data["chassis"] = None
-            del asset_data["chassis_number"]
-        if asset_data["datacenter"]:
-            try:
-                datacenter = Site.objects.get(abbreviation=asset_data["datacenter"])
-            except ObjectDoesNotExist:
-                failure_message = (
-                    Status.IMPORT_ERROR.value
-                    + "Provided datacenter doesn't exist: "
-                    + asset_data["datacenter"]
-                )
-                return JsonResponse(
-                    {"failure_message": failure_message}, status=HTTPStatus.BAD_REQUEST
-                )
-            if asset_data["rack"]:
-                try:
-                    row_letter = asset_data["rack"][:1].upper()
-                    rack_num = asset_data["rack"][1:]
-                    rack = Rack.objects.get(
-                        datacenter=datacenter, row_letter=row_letter, rack_num=rack_num
-                    )
-                except ObjectDoesNotExist:
-                    failure_message = (
-                        Status.IMPORT_ERROR.value
-                        + "Provided rack doesn't exist: "
-                        + asset_data["rack"]
-                    )
-                    return JsonResponse(
-                        {"failure_message": failure_message},
-                        status=HTTPStatus.BAD_REQUEST,
-                    )
-                asset_data["rack"] = rack.id
-            else:
-                asset_data["rack"] = None
-        if asset_data["datacenter"]:
-            try:
-                datacenter = Site.objects.get(abbreviation=asset_data["datacenter"])
-            except ObjectDoesNotExist:
-                failure_message = (
-                    Status.IMPORT_ERROR.value
-                    + "Provided datacenter doesn't exist: "
-                    + asset_data["datacenter"]
-                )
-                return JsonResponse(
-                    {"failure_message": failure_message}, status=HTTPStatus.BAD_REQUEST
-                )
-            else:
-                asset_data["datacenter"] = datacenter.id
-        else:
-            asset_data["datacenter"] = None
-        if asset_data["offline_site"]:
-            try:
-                offline_storage_site = Site.objects.get(
-                    abbreviation=asset_data["offline_site"]
-                )
-            except ObjectDoesNotExist:
-                failure_message = (
-                    Status.IMPORT_ERROR.value
-                    + "Provided offline storage site doesn't exist: "
-                    + asset_data["offline_site"]
-                )
-                return JsonResponse(
-                    {"failure_message": failure_message}, status=HTTPStatus.BAD_REQUEST
-                )
-            else:
-                asset_data["offline_storage_site"] = offline_storage_site.id
-        else:
-            asset_data["offline_storage_site"] = None
-        del asset_data["offline_site"]
-
-        asset_serializer = AssetSerializer(data=asset_data)  # non-recursive to validate
-        if not asset_serializer.is_valid():
-            errors = asset_serializer.errors
-            if not (
-                # if the only errors are the asset number and/or
-                # hostname uniqueness, that's fine - it's a modify
-                (
-                    len(errors.keys()) == 2  # known bug here!
-                    and "hostname" in errors
-                    and len(errors["hostname"]) == 1
-                    and errors["hostname"][0].code == "unique"
-                    and "asset_number" in errors
-                    and len(errors["asset_number"]) == 1
-                    and errors["asset_number"][0].code == "unique"
-                )
-                or (
-                    len(errors.keys()) == 1
-                    and "asset_number" in errors
-                    and len(errors["asset_number"]) == 1
-                    and errors["asset_number"][0].code == "unique"
-                )
-            ):
-                return JsonResponse(
-                    {
-                        "failure_message": Status.IMPORT_ERROR.value
-                        + BulkFailure.ASSET_INVALID.value
-                        + parse_serializer_errors(asset_serializer.errors),
-                        "errors": str(asset_serializer.errors),
-                    },
-                    status=HTTPStatus.BAD_REQUEST,
-                )
-            else:
-                # HACKY FIX! There were validation errors with asset number and hostname but it's just because this is a modification. Let's try again
-                asset_number = asset_data["asset_number"]
-                del asset_data["asset_number"]
-                hostname = asset_data["hostname"]
-                del asset_data["hostname"]
-                asset_serializer = AssetSerializer(data=asset_data)
-                if not asset_serializer.is_valid():
-                    return JsonResponse(
-                        {
-                            "failure_message": Status.IMPORT_ERROR.value
-                            + BulkFailure.ASSET_INVALID.value
-                            + parse_serializer_errors(asset_serializer.errors),
-                            "errors": str(asset_serializer.errors),
-                        },
-                        status=HTTPStatus.BAD_REQUEST,
-                    )
-                else:
-                    asset_serializer.validated_data["asset_number"] = asset_number
-                    asset_serializer.validated_data["hostname"] = hostname
-                    asset_data["asset_number"] = asset_number
-                    asset_data["hostname"] = hostname
-        try:
-            validate_location_type(
-                asset_serializer.validated_data["model"],
-                asset_serializer.validated_data["rack"],
-                asset_serializer.validated_data["rack_position"],
-                asset_serializer.validated_data["chassis"],
-                asset_serializer.validated_data["chassis_slot"],
-                asset_serializer.validated_data["offline_storage_site"],
-            )
-        except ValidationError as error:
-            return JsonResponse(
-                {
-                    "failure_message": Status.IMPORT_ERROR.value
-                    + BulkFailure.ASSET_INVALID.value
-                    + str(error.message)
-                },
-                status=HTTPStatus.BAD_REQUEST,
-            )
-        # Check that all hostnames in file are case insensitive unique
-        if "hostname" in asset_data and asset_data["hostname"]:
-            asset_data_hostname_lower = asset_data["hostname"].lower()
-            if asset_data_hostname_lower in hostnames_in_import:
-                failure_message = (
-                    Status.IMPORT_ERROR.value
-                    + "Hostname must be unique, but '"
-                    + asset_data_hostname_lower
-                    + "' appears more than once in import. "
-                )
-                return JsonResponse(
-                    {"failure_message": failure_message}, status=HTTPStatus.BAD_REQUEST
-                )
-            else:
-                hostnames_in_import.add(asset_data_hostname_lower)
-        # Check that all asset_numbers in file are unique
-        if "asset_number" in asset_data and asset_data["asset_number"]:
-            asset_number = asset_data["asset_number"]
-            if asset_number in asset_numbers_in_import:
-                failure_message = (
-                    Status.IMPORT_ERROR.value
-                    + "Asset number must be unique, but '"
-                    + str(asset_number)
-                    + "' appears more than once in import. "
-                )
-                return JsonResponse(
-                    {"failure_message": failure_message}, status=HTTPStatus.BAD_REQUEST
-                )
-            else:
-                asset_numbers_in_import.add(asset_number)
-        asset_exists = False
-        if "asset_number" in asset_data and asset_data["asset_number"]:
-            try:
-                existing_asset = Asset.objects.get(
-                    asset_number=asset_data["asset_number"]
-                )
-            except ObjectDoesNotExist:
-                pass
-            else:
-                asset_exists = True
-        if asset_exists:
-            # asset number specfies existing asset
-            try:
-                validate_user_permission_on_new_asset_data(
-                    request.user, asset_data, data_is_validated=False
-                )
-            except UserAssetPermissionException as auth_error:
-                return JsonResponse(
-                    {"failure_message": Status.IMPORT_ERROR.value + str(auth_error)},
-                    status=HTTPStatus.BAD_REQUEST,
-                )
-            try:
-                validate_location_modification(asset_data, existing_asset)
-            except Exception as error:
-                failure_message = (
-                    Status.IMPORT_ERROR.value
-                    + "Asset "
-                    + str(asset_data["asset_number"])
-                    + " would conflict location with an existing asset. "
-                )
-                return JsonResponse(
-                    {"failure_message": failure_message, "errors": str(error)},
-                    status=HTTPStatus.BAD_REQUEST,
-                )
-            potential_modifications.append(
-                {"existing_asset": existing_asset, "new_data": asset_data}
-            )
-        else:
-            # asset number not provided or it is new
-            if (
-                "rack" in asset_serializer.validated_data
-                and asset_serializer.validated_data["rack"]
-            ):
-                site = asset_serializer.validated_data["rack"].datacenter
-            elif (
-                "chassis" in asset_serializer.validated_data
-                and asset_serializer.validated_data["chassis"]
-                and asset_serializer.validated_data["chassis"].rack
-            ):
-                site = asset_serializer.validated_data["chassis"].rack.datacenter
-            elif (
-                "chassis" in asset_serializer.validated_data
-                and asset_serializer.validated_data["chassis"]
-                and asset_serializer.validated_data["chassis"].offline_storage_site
-            ):
-                site = asset_serializer.validated_data["chassis"].offline_storage_site
-            elif (
-                "offline_storage_site" in asset_serializer.validated_data
-                and asset_serializer.validated_data["offline_storage_site"]
-            ):
-                site = asset_serializer.validated_data["offline_storage_site"]
-            if not user_has_asset_permission(request.user, site):
-                return JsonResponse(
-                    {
-                        "failure_message": Status.AUTH_ERROR.value
-                        + AuthFailure.ASSET.value,
-                        "errors": "User "
-                        + request.user.username
-                        + " does not have asset permission in site id="
-                        + str(site.id),
-                    },
-                    status=HTTPStatus.UNAUTHORIZED,
-                )
-            model = ITModel.objects.get(id=asset_data["model"])
-            try:
-                if (
-                    "rack" in asset_serializer.validated_data
-                    and asset_serializer.validated_data["rack"]
-                ):
-                    validate_asset_location_in_rack(
-                        asset_serializer.validated_data["rack"].id,
-                        asset_serializer.validated_data["rack_position"],
-                        model.height,
-                        asset_id=None,
-                    )
-                elif (
-                    "chassis" in asset_serializer.validated_data
-                    and asset_serializer.validated_data["chassis"]
-                ):
-                    validate_asset_location_in_chassis(
-                        asset_serializer.validated_data["chassis"].id,
-                        asset_serializer.validated_data["chassis_slot"],
-                    )
-            except LocationException as error:
-                if "asset_number" in asset_data and asset_data["asset_number"]:
-                    asset_name = str(asset_data["asset_number"])
-                elif "hostname" in asset_data and asset_data["hostname"]:
-                    asset_name = asset_data["hostname"]
-                else:
-                    asset_name = ""
-                return JsonResponse(
-                    {
-                        "failure_message": Status.IMPORT_ERROR.value
-                        + "Asset "
-                        + asset_name
-                        + " is invalid. "
-                        + str(error)
-                    },
-                    status=HTTPStatus.BAD_REQUEST,
-                )
-            else:
-                assets_to_add.append(
-                    {"asset_serializer": asset_serializer, "asset_data": asset_data}
-                )
+    asset_import = AssetImport(
+        request.user, [normalize_bulk_asset_data(dict(row)) for row in csv_reader]
+    )
+    failure_response = asset_import.validate()
+    if failure_response:
+        return failure_response
+    records_ignored, modifications_to_approve = (
+        asset_import.get_modifications_to_approve()
+    )
     try:
-        no_infile_location_conflicts(asset_datas)
-    except LocationException as error:
-        failure_message = (
-            Status.IMPORT_ERROR.value
-            + "Location conflicts among assets in import file. "
-            + str(error)
+        import_id = stage_import(
+            request.user, ElementType.ASSET, asset_import.staged_modifications
         )
+    except ImportSessionException as error:
         return JsonResponse(
-            {"failure_message": failure_message}, status=HTTPStatus.BAD_REQUEST
+            {"failure_message": Status.IMPORT_ERROR.value + str(error)},
+            status=HTTPStatus.BAD_REQUEST,
         )
-    records_added = 0
-    for asset_to_add in assets_to_add:
-        records_added += 1
-        asset_serializer = asset_to_add["asset_serializer"]
-        asset_data = asset_to_add["asset_data"]
-        if "chassis_number" in asset_data:
-            chassis = Asset.objects.get(asset_number=asset_data["chassis_number"])
-            asset_serializer.validated_data["chassis"] = chassis
-            asset_data["chassis"] = chassis.id
-            del asset_data["chassis_number"]
-        asset_added = asset_serializer.save()
-        try:
-            save_power_connections(asset_data=asset_data, asset_id=asset_added.id)
-        except PowerConnectionException as error:
-            warning_message += "Some power connections couldn't be saved. " + str(error)
-    records_ignored = 0
-    modifications_to_approve = []
-    for potential_modification in potential_modifications:
-        new_data = potential_modification["new_data"]
-        new_data["model"] = ITModelSerializer(
-            ITModel.objects.get(id=new_data["model"])
-        ).data
-        if new_data["rack"]:
-            new_data["rack"] = RackSerializer(
-                Rack.objects.get(id=new_data["rack"])
-            ).data
-        if new_data["chassis"]:
-            new_data["chassis"] = ChassisSerializer(
-                Asset.objects.get(id=new_data["chassis"])
-            ).data
-        if new_data["datacenter"]:
-            new_data["datacenter"] = SiteSerializer(
-                Site.objects.get(id=new_data["datacenter"])
-            ).data
-        if new_data["offline_storage_site"]:
-            new_data["offline_storage_site"] = SiteSerializer(
-                Site.objects.get(id=new_data["offline_storage_site"])
-            ).data
-        existing_data = RecursiveAssetSerializer(
-            potential_modification["existing_asset"]
-        ).data
-        # macs and connections aren't specified in this file, so ignore them
-        del existing_data["mac_addresses"]
-        del existing_data["network_connections"]
-        del existing_data["network_graph"]
-        del existing_data["blades"]
-        if records_are_identical(existing_data, new_data):
-            records_ignored += 1
-        else:
-            new_data["id"] = existing_data["id"]
-            for field in existing_data.keys():
-                if field not in new_data:
-                    new_data[field] = None
-            modifications_to_approve.append(
-                {"existing": existing_data, "modified": new_data}
-            )
+    records_added, warning_message = asset_import.add_assets()
     response = {
         "added": records_added,
         "ignored": records_ignored,
         "modifications": modifications_to_approve,
+        "import_id": import_id,
     }
     if warning_message:
         response["warning_message"] = warning_message
@@ -1072,50 +670,34 @@ def asset_bulk_approve(request):
     Bulk approve many assets to modify
     """
     data = JSONParser().parse(request)
-    if "approved_modifications" not in data:
+    if "import_id" not in data or "approved_modifications" not in data:
         return JsonResponse(
             {
                 "failure_message": Status.IMPORT_ERROR.value + BulkFailure.IMPORT.value,
-                "errors": "Bulk approve request should have a parameter "
-                + "'approved_modifications'",
+                "errors": "Bulk approve request should have parameters "
+                + "'import_id' and 'approved_modifications'",
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    asset_datas = data["approved_modifications"]
-    # Don't do any validation here because we know we sent valid assets to the
-    # frontend, and they should send the same ones back
-    warning_message = ""
-    for asset_data in asset_datas:
-        existing_asset = Asset.objects.get(id=asset_data["id"])
-        for field in asset_data.keys():
-            # This is assumed to have all fields, and with null values for
-            # blank ones. That's how it's returned in bulk-upload
-            if field == "model":
-                value = ITModel.objects.get(id=asset_data[field]["id"])
-            elif field == "rack":
-                if asset_data[field]:
-                    value = Rack.objects.get(id=asset_data[field]["id"])
-                else:
-                    value = None
-            elif field == "chassis":
-                if asset_data[field]:
-                    value = Asset.objects.get(id=asset_data[field]["id"])
-                else:
-                    value = None
-            elif field == "offline_storage_site":
-                if asset_data[field]:
-                    value = Site.objects.get(id=asset_data[field]["id"])
-                else:
-                    value = None
-            else:
-                value = asset_data[field]
-            setattr(existing_asset, field, value)
-        existing_asset.save()
-        try:
-            save_power_connections(asset_data=asset_data, asset_id=existing_asset.id)
-        except PowerConnectionException as error:
-            warning_message += "Some power connections couldn't be saved. " + str(error)
-    log_bulk_approve(request.user, ElementType.ASSET, len(asset_datas))
+    try:
+        staged_rows = pop_staged_rows(
+            request.user,
+            ElementType.ASSET,
+            data["import_id"],
+            data["approved_modifications"],
+        )
+    except ImportSessionException as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.IMPORT_ERROR.value
+                + BulkFailure.IMPORT_SESSION.value,
+                "errors": str(error),
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    # rows were validated when uploaded, and were never sent to the client
+    warning_message = approve_asset_modifications(staged_rows)
+    log_bulk_approve(request.user, ElementType.ASSET, len(staged_rows))
     if warning_message:
         return JsonResponse({"warning_message": warning_message}, status=HTTPStatus.OK)
     else:
@@ -1128,7 +710,8 @@ def asset_bulk_approve(request):
 @permission_classes([IsAuthenticated])
 def asset_bulk_export(request):
     """
-    List all assets in csv form, in accordance with Bulk Spec.
+    List all assets in csv form, in accordance with Bulk Spec. The export is
+    streamed as csv or ndjson if the export_format query parameter is given.
     """
     assets_query = assets_online_queryset()
     filtered_query, failure_response = get_filtered_query(assets_query, request.data)
@@ -1145,21 +728,25 @@ def asset_bulk_export(request):
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    assets = filtered_query.order_by(*sort_args)
-    serializer = BulkAssetSerializer(assets, many=True)
-    csv_string = StringIO()
-    fields = serializer.data[0].keys()
-    csv_writer = csv.DictWriter(csv_string, fields)
-    csv_writer.writeheader()
-    csv_writer.writerows(serializer.data)
-    return JsonResponse({"export_csv": csv_string.getvalue()}, status=HTTPStatus.OK)
+    assets = annotate_bulk_asset_relations(filtered_query.order_by(*sort_args))
+    return get_export_response(
+        request,
+        BulkAssetSerializer.Meta.fields,
+        (
+            BulkAssetSerializer(asset).data
+            for asset in assets.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        ),
+        "assets",
+    )
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def asset_bulk_export_offline(request):
     """
-    List all offline assets in csv form, in accordance with Bulk Spec.
+    List all offline assets in csv form, in accordance with Bulk Spec. The
+    export is streamed as csv or ndjson if the export_format query parameter
+    is given.
     """
     assets_query = assets_offline_queryset()
     filtered_query, failure_response = get_filtered_query(assets_query, request.data)
@@ -1176,14 +763,16 @@ def asset_bulk_export_offline(request):
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    assets = filtered_query.order_by(*sort_args)
-    serializer = BulkAssetSerializer(assets, many=True)
-    csv_string = StringIO()
-    fields = serializer.data[0].keys()
-    csv_writer = csv.DictWriter(csv_string, fields)
-    csv_writer.writeheader()
-    csv_writer.writerows(serializer.data)
-    return JsonResponse({"export_csv": csv_string.getvalue()}, status=HTTPStatus.OK)
+    assets = annotate_bulk_asset_relations(filtered_query.order_by(*sort_args))
+    return get_export_response(
+        request,
+        BulkAssetSerializer.Meta.fields,
+        (
+            BulkAssetSerializer(asset).data
+            for asset in assets.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        ),
+        "offline_assets",
+    )
 
 
 @api_view(["POST"])
@@ -1265,6 +854,29 @@ def asset_number(request):
     return JsonResponse({"asset_number": get_next_available_asset_number()})
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def asset_search(request):
+    """
+    Get the assets best matching the query parameter query, for typeahead
+    search. Assets match by hostname, owner, comment, model vendor, model
+    number, or the start of their asset number.
+    """
+    query = request.query_params.get("query")
+    if not query or not query.strip():
+        return JsonResponse(
+            {
+                "failure_message": Status.ERROR.value
+                + GenericFailure.INVALID_DATA.value,
+                "errors": "Must specify query parameter 'query'.",
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    return JsonResponse(
+        {"assets": list(get_asset_typeahead(query))}, status=HTTPStatus.OK,
+    )
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def get_asset_from_barcode(request):
@@ -1,6 +1,4 @@
-from datetime import datetime
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
 from django.http import JsonResponse
 from rackcity.api.serializers import (
     AddChangePlanSerializer,
@@ -11,31 +9,19 @@ from rackcity.models import (
     ChangePlan,
     AssetCP,
 )
-from rackcity.models.model_utils import ModelType
 from rackcity.utils.change_planner_utils import (
     get_change_plan,
     get_modifications_in_cp,
     get_cp_already_executed_response,
-    get_cp_modification_conflicts,
 )
-from rackcity.utils.asset_changes_utils import get_changes_on_asset
+from rackcity.utils.asset_changes_utils import compute_change_plan_diff
 from rackcity.utils.errors_utils import (
     Status,
     GenericFailure,
     parse_serializer_errors,
     parse_save_validation_error,
 )
-from rackcity.utils.execute_change_planner_utils import (
-    update_network_ports,
-    update_power_ports,
-    decommission_asset_cp,
-    get_updated_asset,
-)
-from rackcity.utils.log_utils import (
-    Action,
-    log_action,
-    log_execute_change_plan,
-)
+from rackcity.utils.execute_change_planner_utils import ChangePlanExecution
 from rackcity.utils.query_utils import (
     get_page_count_response,
     get_many_response,
@@ -140,9 +126,10 @@ def change_plan_remove_asset(request, id):
     try:
         if asset_cp_object.model.is_blade_chassis():
             blades = AssetCP.objects.filter(chassis=asset_cp_object, change_plan=change_plan)
+            change_plan_diff = compute_change_plan_diff(change_plan)
             remove_chassis = True
             for blade in blades:
-                if len(get_changes_on_asset(blade.related_asset, blade)) == 0:
+                if not change_plan_diff[blade.id]["changes"]:
                     remove_chassis = False
             if remove_chassis:
                 asset_cp_object.delete()
@@ -408,118 +395,22 @@ def change_plan_execute(request, id):
             status=HTTPStatus.BAD_REQUEST,
         )
 
-    assets_cp = AssetCP.objects.filter(change_plan=change_plan)
-    for asset_cp in assets_cp:
-        if get_cp_modification_conflicts(asset_cp):
-            return JsonResponse(
-                {
-                    "failure_message": Status.ERROR.value
-                    + "All conflicts must be resolved before a change "
-                    + "plan can be executed.",
-                    "errors": "Conflict found on AssetCP with id=" + str(asset_cp.id),
-                },
-                status=HTTPStatus.BAD_REQUEST,
-            )
-
-    change_plan.execution_time = datetime.now()
-    change_plan.save()
-
-    num_created = 0
-    num_modified = 0
-    num_decommissioned = 0
-    updated_asset_mappings = {}
-
-    # rackmount assets first
-    rackmount_assets_cp = assets_cp.filter(
-        ~Q(model__model_type=ModelType.BLADE_ASSET.value)
-    )
-    for asset_cp in rackmount_assets_cp:
-        changes = []
-        if asset_cp.related_asset:
-            changes = get_changes_on_asset(asset_cp.related_asset, asset_cp)
-        updated_asset, created = get_updated_asset(asset_cp)
-        updated_asset_mappings[asset_cp] = updated_asset
-        differs_from_live = True
-
-        if created and not asset_cp.is_decommissioned:
-            num_created += 1
-            log_action(
-                request.user, updated_asset, Action.CREATE, change_plan=change_plan,
-            )
-        elif not asset_cp.is_decommissioned:
-            if len(changes) > 0:
-                num_modified += 1
-                log_action(
-                    request.user, updated_asset, Action.MODIFY, change_plan=change_plan,
-                )
-            else:
-                differs_from_live = False
-        asset_cp.differs_from_live = differs_from_live
-        asset_cp.save()
-
-        update_network_ports(updated_asset, asset_cp, change_plan)
-        update_power_ports(updated_asset, asset_cp, change_plan)
-    ##blade assets
-    blade_assets_cp = assets_cp.filter(model__model_type=ModelType.BLADE_ASSET.value)
-    for asset_cp in blade_assets_cp:
-        changes = []
-        if asset_cp.related_asset:
-            changes = get_changes_on_asset(asset_cp.related_asset, asset_cp)
-        chassis_live = updated_asset_mappings[asset_cp.chassis]
-        updated_asset, created = get_updated_asset(asset_cp, chassis_live)
-        updated_asset_mappings[asset_cp] = updated_asset
-        differs_from_live = True
-
-        if created:
-            num_created += 1
-            log_action(
-                request.user, updated_asset, Action.CREATE, change_plan=change_plan,
-            )
-        elif not asset_cp.is_decommissioned:
-            if len(changes) > 0:
-                num_modified += 1
-                log_action(
-                    request.user, updated_asset, Action.MODIFY, change_plan=change_plan,
-                )
-            else:
-                differs_from_live = False
-        asset_cp.differs_from_live = differs_from_live
-        asset_cp.save()
-        update_network_ports(updated_asset, asset_cp, change_plan)
-        update_power_ports(updated_asset, asset_cp, change_plan)
-        updated_asset.save()
-    ## decomission blades first
-    blades_cp = assets_cp.filter(model__model_type=ModelType.BLADE_ASSET.value)
-    rackmount_cp = assets_cp.filter(~Q(model__model_type=ModelType.BLADE_ASSET.value))
-    for asset_cp_query in [blades_cp, rackmount_cp]:
-        for asset_cp in asset_cp_query:
-            # Decommission only after all changes have been made to all CP assets
-            updated_asset = updated_asset_mappings[asset_cp]
-            if asset_cp.is_decommissioned:
-                failure_response = decommission_asset_cp(
-                    updated_asset, asset_cp, change_plan,
-                )
-                if failure_response:
-                    return failure_response
-                num_decommissioned += 1
-                log_action(
-                    request.user, None, Action.DECOMMISSION, change_plan=change_plan,
-                )
-
-    log_execute_change_plan(
-        request.user, change_plan.name, num_created, num_modified, num_decommissioned,
-    )
+    # conflicts are checked inside the transaction of the execution
+    execution = ChangePlanExecution(request.user, change_plan)
+    failure_response = execution.execute()
+    if failure_response:
+        return failure_response
 
     return JsonResponse(
         {
             "success_message": "Change Plan '"
             + change_plan.name
             + "' executed: "
-            + str(num_created)
+            + str(execution.num_created)
             + " assets created, "
-            + str(num_modified)
+            + str(execution.num_modified)
             + " assets modified, "
-            + str(num_decommissioned)
+            + str(execution.num_decommissioned)
             + " assets decommissioned."
         },
         status=HTTPStatus.OK,
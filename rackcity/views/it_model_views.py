@@ -4,6 +4,7 @@ from django.http import HttpResponse, JsonResponse
 from django.core.exceptions import ValidationError
 from django.contrib.auth.decorators import permission_required
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from http import HTTPStatus
 from io import StringIO, BytesIO
 from rackcity.api.serializers import (
@@ -27,6 +28,7 @@ from rackcity.utils.errors_utils import (
 from rackcity.utils.exceptions import (
     LocationException,
     ModelModificationException,
+    ImportSessionException,
 )
 from rackcity.utils.log_utils import (
     log_action,
@@ -36,6 +38,8 @@ from rackcity.utils.log_utils import (
     Action,
     ElementType,
 )
+from rackcity.utils.export_utils import EXPORT_CHUNK_SIZE, get_export_response
+from rackcity.utils.import_session_utils import pop_staged_rows, stage_import
 from rackcity.utils.query_utils import (
     get_sort_arguments,
     get_filter_arguments,
@@ -504,18 +508,19 @@ def model_bulk_upload(request):
                     "new_data": model_serializer.validated_data,
                 }
             )
-    records_added = 0
-    for model_to_add in models_to_add:
-        records_added += 1
-        model_to_add.save()
     records_ignored = 0
     modifications_to_approve = []
+    staged_modifications = {}
     for potential_modification in potential_modifications:
         new_data = potential_modification["new_data"]
         existing_data = ITModelSerializer(potential_modification["existing_model"]).data
         if records_are_identical(existing_data, new_data):
             records_ignored += 1
         else:
+            staged_modifications[existing_data["id"]] = {
+                "id": existing_data["id"],
+                "fields": dict(new_data),
+            }
             new_data["id"] = potential_modification["existing_model"].id
             for field in existing_data.keys():
                 if field not in new_data:
@@ -523,6 +528,17 @@ def model_bulk_upload(request):
             modifications_to_approve.append(
                 {"existing": existing_data, "modified": new_data}
             )
+    try:
+        import_id = stage_import(request.user, ElementType.MODEL, staged_modifications)
+    except ImportSessionException as error:
+        return JsonResponse(
+            {"failure_message": Status.IMPORT_ERROR.value + str(error)},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    records_added = 0
+    for model_to_add in models_to_add:
+        records_added += 1
+        model_to_add.save()
     log_bulk_upload(
         request.user,
         ElementType.MODEL,
@@ -535,6 +551,7 @@ def model_bulk_upload(request):
             "added": records_added,
             "ignored": records_ignored,
             "modifications": modifications_to_approve,
+            "import_id": import_id,
         },
         status=HTTPStatus.OK,
     )
@@ -547,33 +564,56 @@ def model_bulk_approve(request):
     Bulk approve many models to modify
     """
     data = JSONParser().parse(request)
-    if "approved_modifications" not in data:
+    if "import_id" not in data or "approved_modifications" not in data:
         return JsonResponse(
             {
                 "failure_message": Status.IMPORT_ERROR.value + BulkFailure.IMPORT.value,
-                "errors": "Bulk approve request should have a parameter "
-                + "'approved_modifications'",
+                "errors": "Bulk approve request should have parameters "
+                + "'import_id' and 'approved_modifications'",
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    model_datas = data["approved_modifications"]
-    for model_data in model_datas:
-        model_serializer = ITModelSerializer(data=model_data)
-        if not model_serializer.is_valid():
-            failure_message = "At least one modification was not valid. " + str(
-                model_serializer.errors
-            )
-            return JsonResponse(
-                {"failure_message": failure_message}, status=HTTPStatus.BAD_REQUEST
-            )
-    for model_data in model_datas:
-        existing_model = ITModel.objects.get(id=model_data["id"])
-        for field in model_data.keys():
-            # This is assumed to have all fields, and with null values for blank ones,
-            # that's how it's returned in bulk-upload
-            setattr(existing_model, field, model_data[field])
-        existing_model.save()
-    log_bulk_approve(request.user, ElementType.MODEL, len(model_datas))
+    try:
+        staged_rows = pop_staged_rows(
+            request.user,
+            ElementType.MODEL,
+            data["import_id"],
+            data["approved_modifications"],
+        )
+    except ImportSessionException as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.IMPORT_ERROR.value
+                + BulkFailure.IMPORT_SESSION.value,
+                "errors": str(error),
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    # rows were never sent to the client, and save validates them again
+    # against the models as they are now
+    existing_models = ITModel.objects.in_bulk(
+        [staged_row["id"] for staged_row in staged_rows]
+    )
+    try:
+        with transaction.atomic():
+            for staged_row in staged_rows:
+                existing_model = existing_models.get(staged_row["id"])
+                if existing_model is None:
+                    continue
+                for field, value in staged_row["fields"].items():
+                    setattr(existing_model, field, value)
+                existing_model.save()
+    except ValidationError as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.IMPORT_ERROR.value
+                + BulkFailure.MODEL_INVALID.value
+                + parse_save_validation_error(error, "Model"),
+                "errors": str(error),
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    log_bulk_approve(request.user, ElementType.MODEL, len(staged_rows))
     return HttpResponse(status=HTTPStatus.OK)
 
 
@@ -581,7 +621,8 @@ def model_bulk_approve(request):
 @permission_classes([IsAuthenticated])
 def model_bulk_export(request):
     """
-    List all models in csv form, in accordance with Bulk Spec.
+    List all models in csv form, in accordance with Bulk Spec. The export is
+    streamed as csv or ndjson if the export_format query parameter is given.
     """
     models_query = ITModel.objects
     filtered_query, failure_response = get_filtered_query(models_query, request.data)
@@ -599,14 +640,15 @@ def model_bulk_export(request):
             status=HTTPStatus.BAD_REQUEST,
         )
     models = filtered_query.order_by(*sort_args)
-
-    serializer = BulkITModelSerializer(models, many=True)
-    csv_string = StringIO()
-    fields = serializer.data[0].keys()
-    csv_writer = csv.DictWriter(csv_string, fields)
-    csv_writer.writeheader()
-    csv_writer.writerows(serializer.data)
-    return JsonResponse({"export_csv": csv_string.getvalue()}, status=HTTPStatus.OK,)
+    return get_export_response(
+        request,
+        BulkITModelSerializer.Meta.fields,
+        (
+            BulkITModelSerializer(model).data
+            for model in models.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        ),
+        "models",
+    )
 
 
 @api_view(["POST"])
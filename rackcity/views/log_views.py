@@ -3,6 +3,7 @@ from rackcity.api.serializers import LogSerializer
 from rackcity.models import Log
 from rackcity.permissions.permissions import PermissionPath
 from rackcity.utils.query_utils import (
+    get_cursor_page_response,
     get_page_count_response,
     get_many_response,
 )
@@ -13,10 +14,17 @@ from rest_framework.decorators import api_view
 @permission_required(PermissionPath.AUDIT_READ.value, raise_exception=True)
 def log_many(request):
     """
-    List many logs. If page is not specified as a query parameter, all
-    logs are returned. If page is specified as a query parameter, page
-    size must also be specified, and a page of assets will be returned.
+    List many logs. If cursor is specified as a query parameter, page size
+    must also be specified, and the page of logs after the cursor is returned
+    newest first with the cursor of the next page; an empty cursor returns
+    the first page. Otherwise, if page is not specified as a query parameter,
+    all logs are returned. If page is specified as a query parameter, page
+    size must also be specified, and a page of logs will be returned.
     """
+    if "cursor" in request.query_params:
+        return get_cursor_page_response(
+            Log.objects.all(), LogSerializer, "logs", request, "date",
+        )
     return get_many_response(
         Log, LogSerializer, "logs", request, default_order="-date",
     )
@@ -27,8 +35,9 @@ def log_many(request):
 def log_page_count(request):
     """
     Return total number of pages according to page size, which must be
-    specified as query parameter.
+    specified as query parameter. Once there are many logs, the page count
+    is estimated.
     """
     return get_page_count_response(
-        Log, request.query_params, data_for_filters=request.data,
+        Log, request.query_params, data_for_filters=request.data, allow_estimate=True,
     )
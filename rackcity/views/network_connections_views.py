@@ -5,7 +5,6 @@ from django.http import JsonResponse
 from http import HTTPStatus
 from io import StringIO, BytesIO
 from rackcity.api.serializers import (
-    RecursiveAssetSerializer,
     BulkNetworkPortSerializer,
     normalize_bulk_network_data,
 )
@@ -20,6 +19,7 @@ from rackcity.utils.errors_utils import (
     BulkFailure,
 )
 from rackcity.utils.exceptions import (
+    ImportSessionException,
     MacAddressException,
     NetworkConnectionException,
     UserAssetPermissionException,
@@ -29,6 +29,12 @@ from rackcity.utils.log_utils import (
     log_bulk_approve,
     ElementType,
 )
+from rackcity.utils.export_utils import (
+    EXPORT_CHUNK_SIZE,
+    get_chunks,
+    get_export_response,
+)
+from rackcity.utils.import_session_utils import pop_staged_rows, stage_import
 from rackcity.utils.query_utils import (
     get_sort_arguments,
     get_filtered_query,
@@ -75,6 +81,7 @@ def network_bulk_upload(request):
         bulk_network_port_datas.append(dict(row))
     num_ports_ignored = 0
     modifications_to_approve = []
+    staged_modifications = {}
     for bulk_network_port_data in bulk_network_port_datas:
         if (
             "src_hostname" not in bulk_network_port_data
@@ -139,18 +146,33 @@ def network_bulk_upload(request):
         if records_are_identical(bulk_network_port_data, existing_port_serializer.data):
             num_ports_ignored += 1
         else:
+            staged_modifications[existing_port.id] = {
+                "id": existing_port.id,
+                "asset_id": source_asset.id,
+                "network_port_data": bulk_network_port_data,
+            }
             modifications_to_approve.append(
                 {
                     "existing": existing_port_serializer.data,
-                    "modified": bulk_network_port_data,
+                    "modified": dict(bulk_network_port_data, id=existing_port.id),
                 }
             )
+    try:
+        import_id = stage_import(
+            request.user, ElementType.NETWORK_CONNECTIONS, staged_modifications
+        )
+    except ImportSessionException as error:
+        return JsonResponse(
+            {"failure_message": Status.IMPORT_ERROR.value + str(error)},
+            status=HTTPStatus.BAD_REQUEST,
+        )
     # all network connections are modifications,
     # because bulk import can't be used to create new ports
     response = {
         "added": 0,
         "ignored": num_ports_ignored,
         "modifications": modifications_to_approve,
+        "import_id": import_id,
     }
     log_bulk_upload(
         request.user,
@@ -166,36 +188,53 @@ def network_bulk_upload(request):
 @permission_classes([IsAuthenticated])
 def network_bulk_approve(request):
     data = JSONParser().parse(request)
-    if "approved_modifications" not in data:
+    if "import_id" not in data or "approved_modifications" not in data:
         return JsonResponse(
             {
                 "failure_message": Status.IMPORT_ERROR.value + BulkFailure.IMPORT.value,
-                "errors": "Bulk approve request should have a parameter "
-                + "'approved_modifications'",
+                "errors": "Bulk approve request should have parameters "
+                + "'import_id' and 'approved_modifications'",
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    try:
+        staged_rows = pop_staged_rows(
+            request.user,
+            ElementType.NETWORK_CONNECTIONS,
+            data["import_id"],
+            data["approved_modifications"],
+        )
+    except ImportSessionException as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.IMPORT_ERROR.value
+                + BulkFailure.IMPORT_SESSION.value,
+                "errors": str(error),
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    network_datas = data["approved_modifications"]
     warning_message = ""
-    for network_data in network_datas:
-        source_asset = Asset.objects.get(hostname=network_data["src_hostname"])
-        source_asset_data = RecursiveAssetSerializer(source_asset).data
-        mac_address, network_connection = normalize_bulk_network_data(network_data)
-        source_asset_data["mac_addresses"] = mac_address
-        source_asset_data["network_connections"] = network_connection
+    for staged_row in staged_rows:
+        mac_address, network_connection = normalize_bulk_network_data(
+            staged_row["network_port_data"]
+        )
         try:
-            save_mac_addresses(asset_data=source_asset_data, asset_id=source_asset.id)
+            save_mac_addresses(
+                asset_data={"mac_addresses": mac_address},
+                asset_id=staged_row["asset_id"],
+            )
         except MacAddressException as error:
             warning_message += "Some mac addresses couldn't be saved. " + str(error)
         try:
             save_network_connections(
-                asset_data=source_asset_data, asset_id=source_asset.id
+                asset_data={"network_connections": network_connection},
+                asset_id=staged_row["asset_id"],
             )
         except NetworkConnectionException as error:
             warning_message += "Some network connections couldn't be saved. " + str(
                 error
             )
-    log_bulk_approve(request.user, ElementType.NETWORK_CONNECTIONS, len(network_datas))
+    log_bulk_approve(request.user, ElementType.NETWORK_CONNECTIONS, len(staged_rows))
     if warning_message:
         return JsonResponse({"warning_message": warning_message}, status=HTTPStatus.OK,)
     else:
@@ -224,17 +263,32 @@ def network_bulk_export(request):
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    assets = filtered_query.order_by(*sort_args)
-    all_ports = []
-    for asset in assets:
-        ports = NetworkPort.objects.filter(asset=asset)
-        for port in ports:
-            if port.asset.hostname:
-                all_ports.append(port)
-    serializer = BulkNetworkPortSerializer(all_ports, many=True)
-    csv_string = StringIO()
-    fields = BulkNetworkPortSerializer.Meta.fields
-    csv_writer = csv.DictWriter(csv_string, fields)
-    csv_writer.writeheader()
-    csv_writer.writerows(serializer.data)
-    return JsonResponse({"export_csv": csv_string.getvalue()}, status=HTTPStatus.OK)
+    assets = filtered_query.order_by(*sort_args).only("id", "hostname")
+    return get_export_response(
+        request,
+        BulkNetworkPortSerializer.Meta.fields,
+        (
+            BulkNetworkPortSerializer(network_port).data
+            for network_port in get_network_ports_of_assets(assets)
+        ),
+        "network_connections",
+    )
+
+
+def get_network_ports_of_assets(assets):
+    """
+    Yields the network ports of every asset with a hostname, in the order of
+    the assets, reading ports for a chunk of assets at a time.
+    """
+    for asset_chunk in get_chunks(assets.iterator(chunk_size=EXPORT_CHUNK_SIZE)):
+        network_ports = {}
+        for network_port in (
+            NetworkPort.objects.filter(
+                asset__in=[asset.id for asset in asset_chunk if asset.hostname]
+            )
+            .select_related("asset", "connected_port__asset")
+            .order_by("id")
+        ):
+            network_ports.setdefault(network_port.asset_id, []).append(network_port)
+        for asset in asset_chunk:
+            yield from network_ports.get(asset.id, [])
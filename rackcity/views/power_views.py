@@ -1,14 +1,17 @@
 from django.http import JsonResponse
-from rackcity.models import Rack, Asset, PowerPort, PowerPortCP
+from rackcity.models import Rack, Asset, PowerPort
+from rackcity.api.objects import RackRangeSerializer
 from rackcity.api.serializers import serialize_power_connections
 from rackcity.utils.errors_utils import (
     Status,
     GenericFailure,
     PowerFailure,
     AuthFailure,
+    parse_serializer_errors,
 )
 from rackcity.utils.log_utils import (
     log_power_action,
+    log_batch_power_action,
     PowerAction,
 )
 from rackcity.permissions.permissions import user_has_power_permission
@@ -16,25 +19,35 @@ from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import permission_classes, api_view
 from http import HTTPStatus
-import re
-import requests
-import time
 from requests.exceptions import ConnectionError
-from rackcity.models.asset import get_assets_for_cp
 from rackcity.utils.change_planner_utils import get_change_plan
+from rackcity.utils.bcman_utils import (
+    make_bcman_request,
+    get_bcman_blade_power_states,
+    parse_bcman_power_state,
+)
 from rackcity.utils.exceptions import (
+    BCMANException,
     PowerManagementException,
     UserPowerPermissionException,
 )
-import os
+from rackcity.utils.power_job_utils import PowerJob, get_power_job
+from rackcity.utils.rackcity_utils import get_pdu_occupancies
+from rackcity.utils.pdu_utils import (
+    get_rack_pdu_ext,
+    get_many_pdu_port_states,
+    get_pdu_cache_stats,
+    set_pdu_port_power,
+)
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import prefetch_related_objects
 
 
-BCMAN_URL = "hyposoft-mgt.colab.duke.edu"
-PDU_URL = "http://hyposoft-mgt.colab.duke.edu:8005/"
-# Need to specify rack + side in request, e.g. for A1 left, use A01L
-GET_PDU = "pdu.php?pdu=hpdu-rtp1-"
-TOGGLE_PDU = "power.php"
+POWER_ACTIONS = {
+    "on": PowerAction.ON,
+    "off": PowerAction.OFF,
+    "cycle": PowerAction.CYCLE,
+}
 
 
 @api_view(["GET"])
@@ -64,36 +77,121 @@ def pdu_power_status(request, id):
             status=HTTPStatus.BAD_REQUEST,
         )
     power_connections = serialize_power_connections(PowerPort, asset)
-    # Get string parameter representing rack number (i.e. A01<L/R>)
-    rack_str = str(asset.rack.row_letter)
-    if (asset.rack.rack_num / 10) < 1:
-        rack_str = rack_str + "0"
-    rack_str = rack_str + str(asset.rack.rack_num)
-    power_status = dict()
-    for power_connection in power_connections:
+    try:
+        power_status = get_pdu_power_status(asset, power_connections)
+    except ConnectionError:
+        return JsonResponse(
+            {
+                "failure_message": Status.CONNECTION.value
+                + PowerFailure.CONNECTION.value
+            },
+            status=HTTPStatus.REQUEST_TIMEOUT,
+        )
+    return JsonResponse(
+        {"power_connections": power_connections, "power_status": power_status},
+        status=HTTPStatus.OK,
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def pdu_power_status_bulk(request):
+    """
+    Get status of all power ports for every asset on network controlled racks
+    in the specified rack, rack range, or datacenter.
+    """
+    data = JSONParser().parse(request)
+    for parameter in ("rack_id", "datacenter"):
+        if parameter not in data:
+            continue
         try:
-            html = requests.get(
-                PDU_URL
-                + GET_PDU
-                + rack_str
-                + str(power_connections[power_connection]["left_right"]),
-                timeout=5,
+            data[parameter] = int(data[parameter])
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {
+                    "failure_message": Status.INVALID_INPUT.value
+                    + "Parameter '"
+                    + parameter
+                    + "' must be of type int. ",
+                    "errors": "Invalid " + parameter + "=" + str(data[parameter]),
+                },
+                status=HTTPStatus.BAD_REQUEST,
             )
-        except ConnectionError:
+    if "rack_id" in data:
+        racks = Rack.objects.filter(id=data["rack_id"])
+    elif "letter_start" in data:
+        range_serializer = RackRangeSerializer(data=data)
+        if not range_serializer.is_valid():
             return JsonResponse(
                 {
-                    "failure_message": Status.CONNECTION.value
-                    + PowerFailure.CONNECTION.value
+                    "failure_message": Status.INVALID_INPUT.value
+                    + parse_serializer_errors(range_serializer.errors),
+                    "errors": str(range_serializer.errors),
                 },
-                status=HTTPStatus.REQUEST_TIMEOUT,
+                status=HTTPStatus.BAD_REQUEST,
             )
-        power_status[power_connection] = regex_power_status(
-            html.text, power_connections[power_connection]["port_number"]
-        )[0]
-    return JsonResponse(
-        {"power_connections": power_connections, "power_status": power_status},
-        status=HTTPStatus.OK,
+        racks = Rack.objects.filter(
+            datacenter=range_serializer.get_datacenter(),
+            rack_num__range=range_serializer.get_number_range(),  # inclusive range
+            row_letter__range=range_serializer.get_row_range(),
+        )
+    elif "datacenter" in data:
+        racks = Rack.objects.filter(datacenter=data["datacenter"])
+    else:
+        return JsonResponse(
+            {
+                "failure_message": Status.ERROR.value + GenericFailure.INTERNAL.value,
+                "errors": "Must specify 'rack_id', a rack range, or 'datacenter'",
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    power_ports = (
+        PowerPort.objects.filter(
+            asset__rack__in=racks,
+            asset__rack__is_network_controlled=True,
+            power_connection__isnull=False,
+        )
+        .select_related("asset__rack", "power_connection")
+        .order_by("asset__rack", "asset__rack_position", "asset", "port_name")
     )
+    try:
+        port_states = get_many_pdu_port_states(
+            get_pdu_status_ext(
+                power_port.asset, power_port.power_connection.left_right
+            )
+            for power_port in power_ports
+        )
+    except ConnectionError:
+        return JsonResponse(
+            {
+                "failure_message": Status.CONNECTION.value
+                + PowerFailure.CONNECTION.value
+            },
+            status=HTTPStatus.REQUEST_TIMEOUT,
+        )
+    assets = {}
+    for power_port in power_ports:
+        asset = power_port.asset
+        if asset.id not in assets:
+            assets[asset.id] = {
+                "id": asset.id,
+                "hostname": asset.hostname,
+                "asset_number": asset.asset_number,
+                "rack_id": asset.rack.id,
+                "rack_position": asset.rack_position,
+                "power_connections": {},
+                "power_status": {},
+            }
+        left_right = power_port.power_connection.left_right
+        port_number = power_port.power_connection.port_number
+        assets[asset.id]["power_connections"][power_port.port_name] = {
+            "left_right": left_right,
+            "port_number": port_number,
+        }
+        assets[asset.id]["power_status"][power_port.port_name] = port_states[
+            get_pdu_status_ext(asset, left_right)
+        ].get(port_number)
+    return JsonResponse({"assets": list(assets.values())}, status=HTTPStatus.OK)
 
 
 @api_view(["POST"])
@@ -118,38 +216,20 @@ def pdu_power_on(request):
             status=HTTPStatus.UNAUTHORIZED,
         )
     power_connections = serialize_power_connections(PowerPort, asset)
-    # Check power is off
-    for connection in power_connections:
-        try:
-            html = requests.get(
-                PDU_URL
-                + GET_PDU
-                + get_pdu_status_ext(
-                    asset, str(power_connections[connection]["left_right"])
-                )
-            )
-        except ConnectionError:
-            return JsonResponse(
-                {
-                    "failure_message": Status.CONNECTION.value
-                    + PowerFailure.CONNECTION.value
-                },
-                status=HTTPStatus.REQUEST_TIMEOUT,
-            )
-        power_status = regex_power_status(
-            html.text, power_connections[connection]["port_number"]
-        )[0]
-        if power_status != "ON":
-            try:
-                toggle_pdu_power(asset, connection, "on")
-            except ConnectionError:
-                return JsonResponse(
-                    {
-                        "failure_message": Status.CONNECTION.value
-                        + PowerFailure.CONNECTION.value
-                    },
-                    status=HTTPStatus.REQUEST_TIMEOUT,
-                )
+    try:
+        # a cached state could hide a toggle made through another worker
+        power_status = get_pdu_power_status(asset, power_connections, refresh=True)
+        for connection in power_connections:
+            if power_status[connection] != "ON":
+                toggle_pdu_power(asset, power_connections[connection], "on")
+    except ConnectionError:
+        return JsonResponse(
+            {
+                "failure_message": Status.CONNECTION.value
+                + PowerFailure.CONNECTION.value
+            },
+            status=HTTPStatus.REQUEST_TIMEOUT,
+        )
     log_power_action(
         request.user, PowerAction.ON, asset,
     )
@@ -181,38 +261,20 @@ def pdu_power_off(request):
             status=HTTPStatus.UNAUTHORIZED,
         )
     power_connections = serialize_power_connections(PowerPort, asset)
-    # Check power is off
-    for connection in power_connections:
-        try:
-            html = requests.get(
-                PDU_URL
-                + GET_PDU
-                + get_pdu_status_ext(
-                    asset, str(power_connections[connection]["left_right"])
-                )
-            )
-        except ConnectionError:
-            return JsonResponse(
-                {
-                    "failure_message": Status.CONNECTION.value
-                    + PowerFailure.CONNECTION.value
-                },
-                status=HTTPStatus.REQUEST_TIMEOUT,
-            )
-        power_status = regex_power_status(
-            html.text, power_connections[connection]["port_number"]
-        )[0]
-        if power_status == "ON":
-            try:
-                toggle_pdu_power(asset, connection, "off")
-            except ConnectionError:
-                return JsonResponse(
-                    {
-                        "failure_message": Status.CONNECTION.value
-                        + PowerFailure.CONNECTION.value
-                    },
-                    status=HTTPStatus.REQUEST_TIMEOUT,
-                )
+    try:
+        # a cached state could hide a toggle made through another worker
+        power_status = get_pdu_power_status(asset, power_connections, refresh=True)
+        for connection in power_connections:
+            if power_status[connection] == "ON":
+                toggle_pdu_power(asset, power_connections[connection], "off")
+    except ConnectionError:
+        return JsonResponse(
+            {
+                "failure_message": Status.CONNECTION.value
+                + PowerFailure.CONNECTION.value
+            },
+            status=HTTPStatus.REQUEST_TIMEOUT,
+        )
     log_power_action(
         request.user, PowerAction.OFF, asset,
     )
@@ -240,36 +302,17 @@ def pdu_power_cycle(request):
             },
             status=HTTPStatus.UNAUTHORIZED,
         )
-    power_connections = serialize_power_connections(PowerPort, asset)
-    for connection in power_connections:
-        try:
-            toggle_pdu_power(asset, connection, "off")
-        except ConnectionError:
-            return JsonResponse(
-                {
-                    "failure_message": Status.CONNECTION.value
-                    + PowerFailure.CONNECTION.value
-                },
-                status=HTTPStatus.REQUEST_TIMEOUT,
-            )
-    time.sleep(2)
-    for connection in power_connections:
-        try:
-            toggle_pdu_power(asset, connection, "on")
-        except ConnectionError:
-            return JsonResponse(
-                {
-                    "failure_message": Status.CONNECTION.value
-                    + PowerFailure.CONNECTION.value
-                },
-                status=HTTPStatus.REQUEST_TIMEOUT,
-            )
+    # the delay between turning power off and on runs in the background
+    prefetch_related_objects([asset], "powerport_set__power_connection")
+    job = PowerJob("cycle", get_power_job_pdu_ports([asset]), [])
+    job.start()
     log_power_action(request.user, PowerAction.CYCLE, asset)
     return JsonResponse(
-        {
-            "success_message": Status.SUCCESS.value
-            + "Power cycled, all asset power ports reset."
-        },
+        dict(
+            job.to_dict(),
+            success_message=Status.SUCCESS.value
+            + "Power cycle started, all asset power ports will be reset.",
+        ),
         status=HTTPStatus.OK,
     )
 
@@ -277,127 +320,126 @@ def pdu_power_cycle(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def pdu_port_availability(request):
+    """
+    Get the free ports on the left and right PDUs of the rack in query parameter id,
+    live or as on query parameter change_plan, with a suggested port free on both.
+    Given a rack range in query parameters instead, get the same for every rack in it.
+    """
+    (change_plan, failure_response) = get_change_plan(
+        request.query_params.get("change_plan")
+    )
+    if failure_response:
+        return failure_response
     rack_id = request.query_params.get("id")
-    if not rack_id:
+    if rack_id:
+        try:
+            rack = Rack.objects.get(id=rack_id)
+        except (Rack.DoesNotExist, ValueError):
+            return JsonResponse(
+                {
+                    "failure_message": Status.ERROR.value
+                    + "Rack"
+                    + GenericFailure.DOES_NOT_EXIST.value,
+                    "errors": "No existing rack with id=" + str(rack_id),
+                },
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        occupancy = get_pdu_occupancies([rack.id], change_plan=change_plan)[rack.id]
+        return JsonResponse(get_pdu_port_availability(occupancy), status=HTTPStatus.OK)
+    if "letter_start" not in request.query_params:
         return JsonResponse(
             {
                 "failure_message": Status.ERROR.value + GenericFailure.INTERNAL.value,
-                "errors": "Query parameter 'id' is required",
+                "errors": "Query parameter 'id' or a rack range is required",
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    try:
-        rack = Rack.objects.get(id=rack_id)
-    except Rack.DoesNotExist:
+    range_serializer = RackRangeSerializer(data=request.query_params)
+    if not range_serializer.is_valid():
         return JsonResponse(
             {
-                "failure_message": Status.ERROR.value
-                + "Rack"
-                + GenericFailure.DOES_NOT_EXIST.value,
-                "errors": "No existing rack with id=" + str(rack_id),
+                "failure_message": Status.INVALID_INPUT.value
+                + parse_serializer_errors(range_serializer.errors),
+                "errors": str(range_serializer.errors),
             },
             status=HTTPStatus.BAD_REQUEST,
         )
-    (change_plan, failure_response) = get_change_plan(
-        request.query_params.get("change_plan")
-    )
-    if failure_response:
-        return failure_response
-    if change_plan:
-        assets, assets_cp = get_assets_for_cp(change_plan.id)
-        assets_cp = assets_cp.filter(rack=rack.id)
-        assets = assets.filter(rack=rack.id)
-    else:
-        assets_cp = None
-        assets = Asset.objects.filter(rack=rack.id)
-    available_left = list(range(1, 25))
-    available_right = list(range(1, 25))
-    try:
-        remove_unavailable_pdu_ports(available_left, available_right, assets, PowerPort)
-    except Exception as error:
-        return JsonResponse(
-            {"failure_message": Status.ERROR.value + str(error)},
-            status=HTTPStatus.BAD_REQUEST,
+    racks = list(
+        Rack.objects.filter(
+            datacenter=range_serializer.get_datacenter(),
+            rack_num__range=range_serializer.get_number_range(),  # inclusive range
+            row_letter__range=range_serializer.get_row_range(),
         )
-    if change_plan:
-        try:
-            remove_unavailable_pdu_ports(
-                available_left, available_right, assets_cp, PowerPortCP
-            )
-        except Exception as error:
-            return JsonResponse(
-                {"failure_message": Status.ERROR.value + str(error)},
-                status=HTTPStatus.BAD_REQUEST,
-            )
-    suggest = None
-    for index in available_left:
-        if index in available_right:
-            suggest = index
-            break
+        .order_by("row_letter", "rack_num")
+        .values("id", "row_letter", "rack_num")
+    )
+    occupancies = get_pdu_occupancies(
+        [rack["id"] for rack in racks], change_plan=change_plan
+    )
     return JsonResponse(
         {
-            "left_available": available_left,
-            "right_available": available_right,
-            "left_suggest": suggest,
-            "right_suggest": suggest,
+            "racks": [
+                {**rack, **get_pdu_port_availability(occupancies[rack["id"]])}
+                for rack in racks
+            ]
         },
         status=HTTPStatus.OK,
     )
 
 
-def remove_unavailable_pdu_ports(
-    available_left, available_right, assets, power_port_model
-):
-    for asset in assets:
-        asset_power = serialize_power_connections(power_port_model, asset)
-        for port_num in asset_power.keys():
-            if asset_power[port_num]["left_right"] == "L":
-                try:
-                    available_left.remove(asset_power[port_num]["port_number"])
-                except ValueError:
-                    raise Exception(
-                        "Port "
-                        + asset_power[port_num]["port_number"]
-                        + " does not exist on PDU. "
-                    )
-            else:
-                try:
-                    available_right.remove(asset_power[port_num]["port_number"])
-                except ValueError:
-                    raise Exception(
-                        "Port "
-                        + asset_power[port_num]["port_number"]
-                        + " does not exist on PDU. "
-                    )
-
-
-def regex_power_status(html, port):
-    status_pattern = re.search("<td>" + str(port) + "<td><span.+(ON|OFF)", html)
-    return status_pattern.groups(1)
+def get_pdu_port_availability(occupancy):
+    paired_available = occupancy.get_paired_available()
+    suggest = paired_available[0] if paired_available else None
+    return {
+        "left_available": occupancy.get_available("L"),
+        "right_available": occupancy.get_available("R"),
+        "paired_available": paired_available,
+        "left_suggest": suggest,
+        "right_suggest": suggest,
+    }
 
 
-def get_pdu_status_ext(asset, left_right):
-    rack_str = str(asset.rack.row_letter)
-    if (asset.rack.rack_num / 10) < 1:
-        rack_str = rack_str + "0"
-    rack_str = rack_str + str(asset.rack.rack_num)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def pdu_cache_stats(request):
+    """
+    Get hit and miss counts of the PDU port state cache.
+    """
+    return JsonResponse(get_pdu_cache_stats(), status=HTTPStatus.OK)
 
-    return rack_str + left_right
 
+def get_pdu_power_status(asset, power_connections, refresh=False):
+    """
+    Returns the state of each power connection of the asset, keyed by asset
+    power port name. Each PDU side used by the asset is fetched once, and
+    both sides are fetched concurrently. With refresh, the states are read
+    from the PDU network controller instead of the cache.
+    """
+    port_states = get_many_pdu_port_states(
+        (
+            get_pdu_status_ext(asset, str(power_connection["left_right"]))
+            for power_connection in power_connections.values()
+        ),
+        refresh=refresh,
+    )
+    return {
+        port_name: port_states[
+            get_pdu_status_ext(asset, str(power_connection["left_right"]))
+        ].get(power_connection["port_number"])
+        for port_name, power_connection in power_connections.items()
+    }
 
-def toggle_pdu_power(asset, asset_port_number, goal_state):
-    power_connections = serialize_power_connections(PowerPort, asset)
-    pdu_port = power_connections[asset_port_number]["port_number"]
-    pdu = "hpdu-rtp1-" + get_pdu_status_ext(
-        asset, str(power_connections[asset_port_number]["left_right"])
+
+def get_pdu_status_ext(asset, left_right):
+    return get_rack_pdu_ext(asset.rack, left_right)
+
+
+def toggle_pdu_power(asset, power_connection, goal_state):
+    set_pdu_port_power(
+        get_pdu_status_ext(asset, str(power_connection["left_right"])),
+        power_connection["port_number"],
+        goal_state,
     )
-    try:
-        requests.post(
-            PDU_URL + TOGGLE_PDU, {"pdu": pdu, "port": pdu_port, "v": goal_state}
-        )
-    except ConnectionError:
-        raise ConnectionError("Cannot contact PDU Network Controller")
-    return
 
 
 @api_view(["POST"])
@@ -420,24 +462,19 @@ def chassis_power_status(request):
             },
             status=HTTPStatus.UNAUTHORIZED,
         )
-    result, exit_status = make_bcman_request(chassis.hostname, str(blade_slot), "")
-    if (exit_status != 0) or (result is None):
+    try:
+        result = make_bcman_request(chassis.hostname, str(blade_slot), "")
+    except BCMANException as error:
         return JsonResponse(
             {
                 "failure_message": Status.CONNECTION.value
                 + "Unable to contact network controlled blade chassis power management.",
-                "errors": "Request to bcman exited with status: "
-                + str(exit_status)
-                + ", result: "
-                + str(result),
+                "errors": str(error),
             },
             status=HTTPStatus.REQUEST_TIMEOUT,
         )
-    if "is ON" in result:
-        blade_slot_power_status = "ON"
-    elif "is OFF" in result:
-        blade_slot_power_status = "OFF"
-    else:
+    blade_slot_power_status = parse_bcman_power_state(result)
+    if blade_slot_power_status is None:
         return JsonResponse(
             {
                 "failure_message": Status.CONNECTION.value
@@ -451,6 +488,41 @@ def chassis_power_status(request):
     )
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def chassis_power_status_bulk(request):
+    """
+    Get status of all blade slots of a network controlled blade chassis.
+    """
+    try:
+        chassis = get_chassis_power_request_chassis(request, permission_needed=False)
+    except PowerManagementException as error:
+        return JsonResponse(
+            {"failure_message": Status.ERROR.value + str(error)},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    except UserPowerPermissionException as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.AUTH_ERROR.value + AuthFailure.POWER.value,
+                "errors": str(error),
+            },
+            status=HTTPStatus.UNAUTHORIZED,
+        )
+    try:
+        power_status = get_bcman_blade_power_states(chassis.hostname)
+    except BCMANException as error:
+        return JsonResponse(
+            {
+                "failure_message": Status.CONNECTION.value
+                + "Unable to contact network controlled blade chassis power management.",
+                "errors": str(error),
+            },
+            status=HTTPStatus.REQUEST_TIMEOUT,
+        )
+    return JsonResponse({"power_status": power_status}, status=HTTPStatus.OK)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def chassis_power_on(request):
@@ -469,14 +541,14 @@ def chassis_power_on(request):
             },
             status=HTTPStatus.UNAUTHORIZED,
         )
-    result, exit_status = make_bcman_request(chassis.hostname, str(blade_slot), "on")
-    if exit_status != 0:
+    try:
+        result = make_bcman_request(chassis.hostname, str(blade_slot), "on")
+    except BCMANException as error:
         return JsonResponse(
             {
                 "failure_message": Status.CONNECTION.value
                 + "Unable to contact network controlled blade chassis power management.",
-                "errors": "Request to bcman exited with non-zero status: "
-                + str(exit_status),
+                "errors": str(error),
             },
             status=HTTPStatus.REQUEST_TIMEOUT,
         )
@@ -504,14 +576,14 @@ def chassis_power_off(request):
             },
             status=HTTPStatus.UNAUTHORIZED,
         )
-    result, exit_status = make_bcman_request(chassis.hostname, str(blade_slot), "off")
-    if exit_status != 0:
+    try:
+        result = make_bcman_request(chassis.hostname, str(blade_slot), "off")
+    except BCMANException as error:
         return JsonResponse(
             {
                 "failure_message": Status.CONNECTION.value
                 + "Unable to contact network controlled blade chassis power management.",
-                "errors": "Request to bcman exited with non-zero status: "
-                + str(exit_status),
+                "errors": str(error),
             },
             status=HTTPStatus.REQUEST_TIMEOUT,
         )
@@ -539,57 +611,100 @@ def chassis_power_cycle(request):
             },
             status=HTTPStatus.UNAUTHORIZED,
         )
-    result_off, exit_status_off = make_bcman_request(
-        chassis.hostname, str(blade_slot), "off"
+    # the delay between turning power off and on runs in the background
+    job = PowerJob("cycle", [], get_power_job_blade_slots([(chassis, blade_slot)]))
+    job.start()
+    result = (
+        "chassis '"
+        + chassis.hostname
+        + "' blade "
+        + str(blade_slot)
+        + " power cycle started"
+    )
+    log_power_action(request.user, PowerAction.CYCLE, chassis, blade_slot=blade_slot)
+    return JsonResponse(
+        dict(job.to_dict(), success_message=Status.SUCCESS.value + result),
+        status=HTTPStatus.OK,
     )
-    if exit_status_off != 0:
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def power_batch_start(request):
+    """
+    Turn power on, off, or cycle it for many assets and blades at once. The
+    toggles run in the background; returns a job id to check results with.
+    """
+    try:
+        action, assets, blades = get_power_batch_request_parameters(request)
+    except PowerManagementException as error:
+        return JsonResponse(
+            {"failure_message": Status.ERROR.value + str(error)},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    except UserPowerPermissionException as error:
         return JsonResponse(
             {
-                "failure_message": Status.CONNECTION.value
-                + "Unable to contact network controlled blade chassis power management.",
-                "errors": "Request to bcman exited with non-zero status: "
-                + str(exit_status_off),
+                "failure_message": Status.AUTH_ERROR.value + AuthFailure.POWER.value,
+                "errors": str(error),
             },
-            status=HTTPStatus.REQUEST_TIMEOUT,
+            status=HTTPStatus.UNAUTHORIZED,
         )
-    time.sleep(2)
-    result_on, exit_status_on = make_bcman_request(
-        chassis.hostname, str(blade_slot), "on"
+    job = PowerJob(
+        action, get_power_job_pdu_ports(assets), get_power_job_blade_slots(blades)
     )
-    if exit_status_on != 0:
+    job.start()
+    log_batch_power_action(request.user, POWER_ACTIONS[action], assets, blades)
+    return JsonResponse(job.to_dict(), status=HTTPStatus.OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def power_batch_status(request, job_id):
+    """
+    Get progress and per-port results of a batch power operation.
+    """
+    job = get_power_job(job_id)
+    if job is None:
         return JsonResponse(
             {
-                "failure_message": Status.CONNECTION.value
-                + "Unable to contact network controlled blade chassis power management.",
-                "errors": "Request to bcman exited with non-zero status: "
-                + str(exit_status_on),
+                "failure_message": Status.ERROR.value
+                + "Power job"
+                + GenericFailure.DOES_NOT_EXIST.value,
+                "errors": "No existing power job with id=" + str(job_id),
             },
-            status=HTTPStatus.REQUEST_TIMEOUT,
+            status=HTTPStatus.BAD_REQUEST,
         )
-    result = (
-        "chassis '" + chassis.hostname + "' blade " + str(blade_slot) + "' power cycled"
-    )
-    log_power_action(request.user, PowerAction.CYCLE, chassis, blade_slot=blade_slot)
-    return JsonResponse(
-        {"success_message": Status.SUCCESS.value + result}, status=HTTPStatus.OK,
-    )
+    return JsonResponse(job, status=HTTPStatus.OK)
 
 
-def make_bcman_request(chassis, blade, power_command):
-    user = os.environ["BCMAN_USERNAME"]
-    options = os.environ["BCMAN_OPTIONS"]
-    password = os.environ["BCMAN_PASSWORD"]
-    cmd = "rackcity/utils/bcman.expect '{}' '{}' '{}' '{}' '{}' '{}' '{}' > temp.txt".format(
-        user, BCMAN_URL, options, password, chassis, blade, power_command,
-    )
-    exit_status = os.system(cmd)
-    result = None
-    if os.path.exists("temp.txt"):
-        fp = open("temp.txt", "r")
-        result = fp.read().splitlines()[0]
-        fp.close()
-        os.remove("temp.txt")
-    return result, exit_status
+def get_power_job_pdu_ports(assets):
+    """
+    Returns the PowerJob pdu_ports of every connected power port of the
+    assets, which should have their power ports and connections prefetched.
+    """
+    return [
+        {
+            "asset_id": asset.id,
+            "port_name": power_port.port_name,
+            "pdu_ext": get_pdu_status_ext(asset, power_port.power_connection.left_right),
+            "port_number": power_port.power_connection.port_number,
+        }
+        for asset in assets
+        for power_port in asset.powerport_set.all()
+        if power_port.power_connection
+    ]
+
+
+def get_power_job_blade_slots(blades):
+    return [
+        {
+            "chassis_id": chassis.id,
+            "chassis_hostname": chassis.hostname,
+            "blade_slot": blade_slot,
+        }
+        for chassis, blade_slot in blades
+    ]
 
 
 def get_chassis_power_request_parameters(request, permission_needed=True):
@@ -600,11 +715,31 @@ def get_chassis_power_request_parameters(request, permission_needed=True):
         )
     try:
         blade_slot = int(data["blade_slot"])
-        chassis_id = int(data["chassis_id"])
     except ValueError:
         raise PowerManagementException(
             "Parameters 'chassis_id' and 'blade_slot' must be of type int. "
         )
+    chassis = get_chassis_power_request_chassis(
+        request, permission_needed=permission_needed, data=data
+    )
+    if (blade_slot < 1) or (blade_slot > 14):
+        raise PowerManagementException(
+            "Blade slot " + str(blade_slot) + " does not exist on chassis. "
+        )
+    return chassis, blade_slot
+
+
+def get_chassis_power_request_chassis(request, permission_needed=True, data=None):
+    if data is None:
+        data = JSONParser().parse(request)
+    if "chassis_id" not in data:
+        raise PowerManagementException(
+            "Must specify 'chassis_id' on chassis power request. "
+        )
+    try:
+        chassis_id = int(data["chassis_id"])
+    except ValueError:
+        raise PowerManagementException("Parameter 'chassis_id' must be of type int. ")
     try:
         chassis = Asset.objects.get(id=chassis_id)
     except ObjectDoesNotExist:
@@ -622,11 +757,100 @@ def get_chassis_power_request_parameters(request, permission_needed=True):
             "Power is only network controllable for blade chassis "
             + "that are of vendor 'BMI', have valid hostnames, and are not in storage. "
         )
-    if (blade_slot < 1) or (blade_slot > 14):
+    return chassis
+
+
+def get_power_batch_request_parameters(request):
+    data = JSONParser().parse(request)
+    if data.get("action") not in POWER_ACTIONS:
         raise PowerManagementException(
-            "Blade slot " + str(blade_slot) + " does not exist on chassis. "
+            "Must specify 'action' as one of "
+            + ", ".join(POWER_ACTIONS.keys())
+            + " on batch power request. "
         )
-    return chassis, blade_slot
+    asset_ids = data.get("asset_ids", [])
+    blade_requests = data.get("blades", [])
+    if not asset_ids and not blade_requests:
+        raise PowerManagementException(
+            "Must specify 'asset_ids' or 'blades' on batch power request. "
+        )
+    try:
+        if not isinstance(asset_ids, list):
+            raise TypeError
+        asset_ids = [int(asset_id) for asset_id in asset_ids]
+    except (TypeError, ValueError):
+        raise PowerManagementException(
+            "Parameter 'asset_ids' must be a list of type int. "
+        )
+    if not isinstance(blade_requests, list) or not all(
+        isinstance(blade_request, dict) for blade_request in blade_requests
+    ):
+        raise PowerManagementException(
+            "Parameter 'blades' must be a list of objects with 'chassis_id' and "
+            + "'blade_slot'. "
+        )
+    try:
+        blade_requests = [
+            dict(blade_request, chassis_id=int(blade_request.get("chassis_id")))
+            for blade_request in blade_requests
+        ]
+    except (TypeError, ValueError):
+        raise PowerManagementException("Parameter 'chassis_id' must be of type int. ")
+    assets = list(
+        Asset.objects.filter(id__in=asset_ids)
+        .select_related("model", "rack")
+        .prefetch_related("powerport_set__power_connection")
+    )
+    if len(assets) != len(set(asset_ids)):
+        raise PowerManagementException("Asset" + GenericFailure.DOES_NOT_EXIST.value)
+    chassis_by_id = Asset.objects.select_related("model").in_bulk(
+        [blade_request.get("chassis_id") for blade_request in blade_requests]
+    )
+    blades = []
+    for blade_request in blade_requests:
+        chassis = chassis_by_id.get(blade_request.get("chassis_id"))
+        if chassis is None:
+            raise PowerManagementException(
+                "Chassis" + GenericFailure.DOES_NOT_EXIST.value
+            )
+        try:
+            blade_slot = int(blade_request.get("blade_slot"))
+        except (TypeError, ValueError):
+            raise PowerManagementException(
+                "Parameter 'blade_slot' must be of type int. "
+            )
+        if (blade_slot < 1) or (blade_slot > 14):
+            raise PowerManagementException(
+                "Blade slot " + str(blade_slot) + " does not exist on chassis. "
+            )
+        blades.append((chassis, blade_slot))
+    unpermitted_ids = [
+        str(asset.id)
+        for asset in assets + [chassis for chassis, _ in blades]
+        if not user_has_power_permission(request.user, asset=asset)
+    ]
+    if unpermitted_ids:
+        raise UserPowerPermissionException(
+            "User "
+            + request.user.username
+            + " does not have power permission and does not own assets with ids="
+            + ", ".join(unpermitted_ids)
+            + ". "
+        )
+    for asset in assets:
+        if not is_asset_power_controllable_by_pdu(asset):
+            raise PowerManagementException(
+                "Power is not network controllable on the rack of asset with id="
+                + str(asset.id)
+                + ". "
+            )
+    for chassis, _ in blades:
+        if not is_asset_power_controllable_by_bcman(chassis):
+            raise PowerManagementException(
+                "Power is only network controllable for blade chassis "
+                + "that are of vendor 'BMI', have valid hostnames, and are not in storage. "
+            )
+    return data["action"], assets, blades
 
 
 def get_pdu_power_request_parameters(request):
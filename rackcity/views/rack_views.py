@@ -22,14 +22,18 @@ from rackcity.utils.errors_utils import (
 from rest_framework.decorators import permission_classes, api_view
 from rest_framework.permissions import IsAuthenticated
 from http import HTTPStatus
-from rackcity.utils.rack_utils import get_rack_detailed_response
+from rackcity.utils.rack_utils import (
+    get_rack_detailed_response,
+    get_rack_elevation_response,
+)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def rack_get_all(request):
     """
-    List all racks
+    List all racks. If elevation is specified as a query parameter, the
+    assets in each rack are listed as compact slots for drawing the rack.
     """
 
     datacenter_id = request.query_params.get("datacenter")
@@ -47,6 +51,8 @@ def rack_get_all(request):
     if failure_response:
         return failure_response
     racks = Rack.objects.filter(datacenter=datacenter_id)
+    if request.query_params.get("elevation"):
+        return get_rack_elevation_response(racks, change_plan)
     return get_rack_detailed_response(racks,change_plan)
 
 
@@ -54,7 +60,9 @@ def rack_get_all(request):
 @permission_classes([IsAuthenticated])
 def rack_get(request):
     """
-    List all racks within specified range.
+    List all racks within specified range. If elevation is specified as a
+    query parameter, the assets in each rack are listed as compact slots for
+    drawing the rack.
     """
     range_serializer = RackRangeSerializer(data=request.data)
 
@@ -78,6 +86,8 @@ def rack_get(request):
         row_letter__range=range_serializer.get_row_range(),
     )
 
+    if request.query_params.get("elevation"):
+        return get_rack_elevation_response(racks, change_plan)
     return get_rack_detailed_response(racks,change_plan)
 
 
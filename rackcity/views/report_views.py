@@ -1,8 +1,16 @@
-from django.db.models.query_utils import Q
+from datetime import timedelta
 from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from http import HTTPStatus
-from rackcity.models import Rack, Asset
-from rackcity.models.model_utils import ModelType
+from rackcity.models import UtilizationCategory
+from rackcity.utils.errors_utils import GenericFailure, Status
+from rackcity.utils.report_utils import (
+    UTILIZATION_HISTORY_MAX_POINTS,
+    get_rack_report,
+    get_rack_usage,
+    get_utilization_history,
+)
 from rest_framework.decorators import permission_classes, api_view
 from rest_framework.permissions import IsAuthenticated
 
@@ -12,19 +20,23 @@ from rest_framework.permissions import IsAuthenticated
 def report_rack_usage_global(request):
     """
     Get summary of rack usage across ALL site: the percentage of rackspace free versus used,
-    allocated per vendor, allocated per model, and allocated per owner.
+    allocated per vendor, allocated per model, and allocated per owner. The same summary
+    for each datacenter with racked assets is under "datacenters".
     """
-    racks = Rack.objects.all()
-    assets = Asset.objects.filter(
-        ~Q(model__model_type=ModelType.BLADE_ASSET.value)
-        & Q(offline_storage_site__isnull=True)
-    )
-    if len(racks) == 0 or len(assets) == 0:
+    rack_usage = get_rack_usage()
+    rack_report = get_rack_report(rack_usage.values())
+    if rack_report is None:
         return JsonResponse(
             {"failure_message": "There are no racked assets."},
             status=HTTPStatus.BAD_REQUEST,
         )
-    return compute_rack_report(racks, assets)
+    rack_report["datacenters"] = []
+    for datacenter_usage in rack_usage.values():
+        datacenter_report = get_rack_report([datacenter_usage])
+        if datacenter_report is not None:
+            datacenter_report["datacenter"] = datacenter_usage["datacenter"]
+            rack_report["datacenters"].append(datacenter_report)
+    return JsonResponse(rack_report, status=HTTPStatus.OK)
 
 
 @api_view(["GET"])
@@ -34,72 +46,74 @@ def report_rack_usage_datacenter(request, id):
     Get summary of rack usage for ONE datacenter: the percentage of rackspace free versus used,
     allocated per vendor, allocated per model, and allocated per owner.
     """
-    racks = Rack.objects.filter(datacenter=id)
-    assets = Asset.objects.filter(
-        ~Q(model__model_type=ModelType.BLADE_ASSET.value)
-        & Q(offline_storage_site__isnull=True)
-        & Q(rack__datacenter=id)
-    )
-    if len(racks) == 0 or len(assets) == 0:
+    datacenter_usage = get_rack_usage().get(id)
+    rack_report = None
+    if datacenter_usage is not None:
+        rack_report = get_rack_report([datacenter_usage])
+    if rack_report is None:
         return JsonResponse(
             {"failure_message": "There are no racked assets in this datacenter."},
             status=HTTPStatus.BAD_REQUEST,
         )
-    return compute_rack_report(racks, assets)
-
-
-def compute_rack_report(racks, assets):
-    total_num_rack_slots = 0
-    for rack in racks:
-        total_num_rack_slots += rack.height
+    return JsonResponse(rack_report, status=HTTPStatus.OK)
 
-    model_allocation = {}
-    vendor_allocation = {}
-    owner_allocation = {}
-    num_full_rack_slots = 0
-    assets = assets.order_by("model__vendor", "model__model_number")
-    for asset in assets:
-        vendor = asset.model.vendor
-        model = asset.model
-        height = asset.model.height
-        owner = asset.owner
-        num_full_rack_slots += height
-        if vendor not in vendor_allocation:
-            vendor_allocation[vendor] = 0
-        vendor_allocation[vendor] += height
-        if model not in model_allocation:
-            model_allocation[model] = 0
-        model_allocation[model] += height
-        if owner is None or owner == "":
-            owner = "(No owner)"
-        if owner not in owner_allocation:
-            owner_allocation[owner] = 0
-        owner_allocation[owner] += height
 
-    rack_usage_data = {
-        "free_rackspace_percent": 1 - (num_full_rack_slots / total_num_rack_slots),
-        "vendor_allocation": [
-            {
-                "vendor": vendor,
-                "allocation_percent": vendor_allocation[vendor] / num_full_rack_slots,
-            }
-            for vendor in vendor_allocation
-        ],
-        "model_allocation": [
-            {
-                "vendor": model.vendor,
-                "model_number": model.model_number,
-                "allocation_percent": model_allocation[model] / num_full_rack_slots,
-            }
-            for model in model_allocation
-        ],
-        "owner_allocation": [
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def report_rack_usage_history(request):
+    """
+    Get rack usage over time from utilization snapshots, across ALL sites or for the
+    datacenter in query parameter datacenter: rack slots used and in total, and used
+    per name of query parameter category (datacenter, vendor, owner or model). Query
+    parameters start and end bound the range, one year up to now by default, and
+    query parameter points bounds the number of points returned.
+    """
+    try:
+        category = UtilizationCategory(
+            request.query_params.get("category", UtilizationCategory.DATACENTER.value)
+        )
+        end = get_history_datetime(request.query_params.get("end"), timezone.now())
+        start = get_history_datetime(
+            request.query_params.get("start"), end - timedelta(days=365)
+        )
+        num_points = int(
+            request.query_params.get("points", UTILIZATION_HISTORY_MAX_POINTS)
+        )
+        datacenter_id = request.query_params.get("datacenter")
+        if datacenter_id is not None:
+            datacenter_id = int(datacenter_id)
+        if start >= end or not 0 < num_points <= UTILIZATION_HISTORY_MAX_POINTS:
+            raise ValueError(
+                "Range must end after it starts, with between 1 and "
+                + str(UTILIZATION_HISTORY_MAX_POINTS)
+                + " points."
+            )
+    except ValueError as error:
+        return JsonResponse(
             {
-                "owner": owner,
-                "allocation_percent": owner_allocation[owner] / num_full_rack_slots,
-            }
-            for owner in owner_allocation
-        ],
-    }
+                "failure_message": Status.ERROR.value
+                + GenericFailure.INVALID_DATA.value,
+                "errors": str(error),
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    return JsonResponse(
+        {
+            "category": category.value,
+            "points": get_utilization_history(
+                category, start, end, num_points, datacenter_id=datacenter_id
+            ),
+        },
+        status=HTTPStatus.OK,
+    )
+
 
-    return JsonResponse(rack_usage_data, status=HTTPStatus.OK)
+def get_history_datetime(value, default):
+    if value is None:
+        return default
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError("'" + value + "' is not a valid date and time.")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
@@ -12,6 +12,9 @@ from rackcity.permissions.groups import (
     update_user_site_permissions,
 )
 from rackcity.permissions.permissions import PermissionPath, RegisterUserPermission
+from rackcity.utils.asset_changes_utils import record_change_plan_diff_change
+from rackcity.utils.change_planner_utils import queue_conflict_detection_cp
+from rackcity.utils.report_utils import record_rack_usage_change
 from rackcity.utils.query_utils import (
     get_page_count_response,
     get_many_response,
@@ -160,10 +163,13 @@ def user_delete(request):
             status=HTTPStatus.BAD_REQUEST,
         )
     else:
-        deleted_user_assets = Asset.objects.filter(owner=username)
-        for asset in deleted_user_assets:
-            asset.owner = None
-            asset.save()
+        deleted_user_asset_ids = list(
+            Asset.objects.filter(owner=username).values_list("id", flat=True)
+        )
+        Asset.objects.filter(id__in=deleted_user_asset_ids).update(owner=None)
+        queue_conflict_detection_cp(deleted_user_asset_ids)
+        record_change_plan_diff_change()
+        record_rack_usage_change()
         return JsonResponse(
             {
                 "success_message": Status.SUCCESS.value
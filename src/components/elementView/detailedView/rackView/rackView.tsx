@@ -14,11 +14,10 @@ import { connect } from "react-redux";
 import { RouteComponentProps, withRouter } from "react-router";
 import { API_ROOT } from "../../../../utils/api-config";
 import {
-  AssetCPObject,
-  AssetObject,
-  getHeaders, isAssetCPObject,
+  getHeaders,
   MountTypes,
   RackResponseObject,
+  RackSlotObject,
   ROUTES,
 } from "../../../../utils/utils";
 import "./rackView.scss";
@@ -52,7 +51,7 @@ class RackView extends React.PureComponent<
     let unit = 1;
     let currHeight = 0;
     const { height } = rackResp.rack;
-    let assets: Array<AssetObject|AssetCPObject> = Object.assign([], rackResp.assets);
+    let assets: Array<RackSlotObject> = Object.assign([], rackResp.assets);
 
     let maxHeight: number = +height;
 
@@ -63,9 +62,9 @@ class RackView extends React.PureComponent<
         assets[0] &&
         currHeight === +assets[0].rack_position - 1
       ) {
-        const width = +assets[0].model.height;
+        const width = +assets[0].height;
         const asset = assets[0]
-        const id = isAssetCPObject(asset)? asset.related_asset.id : +assets[0].id;
+        const id = asset.related_asset_id ? asset.related_asset_id : asset.id;
 
         if (width + currHeight > maxHeight) {
 
@@ -83,10 +82,10 @@ class RackView extends React.PureComponent<
             : " ";
           let display = hostname;
           if (assets[0].model.model_type === MountTypes.BLADE_CHASSIS) {
-            if (assets[0].blades.length === 1) {
-              display += " | " +  assets[0].blades.length + " blade";
+            if (assets[0].num_blades === 1) {
+              display += " | " +  assets[0].num_blades + " blade";
             } else {
-              display += " | " +  assets[0].blades.length + " blades";
+              display += " | " +  assets[0].num_blades + " blades";
             }
 
             display +=
@@ -101,7 +100,7 @@ class RackView extends React.PureComponent<
               className="rack-row"
               style={{
                 lineHeight: unit * width,
-                backgroundColor: assets[0].display_color? assets[0].display_color : assets[0].model.display_color,
+                backgroundColor: assets[0].display_color,
               }}
             >
               <td
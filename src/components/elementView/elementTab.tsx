@@ -132,20 +132,29 @@ class ElementTab extends React.Component<ElementTabProps, ElementViewState> {
       this.props.assetType === AssetType.STORED
         ? "/bulk-export-offline"
         : "/bulk-export";
+    const exportConfig = {
+      ...config,
+      params: { export_format: "csv" },
+      responseType: "blob" as "blob",
+    };
     let url = API_ROOT + "api/" + path + endpoint;
     axios
-      .post(url, body, config)
+      .post(url, body, exportConfig)
       .then((res) => {
-        fs(res.data.export_csv, file);
+        fs(res.data, file);
         return 0;
       })
       .catch((err) => this.addErrorToast("Failed to export data to " + file));
 
     if (path === "assets" && this.props.assetType !== AssetType.STORED) {
       axios
-        .post(API_ROOT + "api/" + path + "/network-bulk-export", body, config)
+        .post(
+          API_ROOT + "api/" + path + "/network-bulk-export",
+          body,
+          exportConfig
+        )
         .then((res) => {
-          fs(res.data.export_csv, networkFile);
+          fs(res.data, networkFile);
           return 0;
         })
         .catch((err) => this.addErrorToast("Failed to export data to " + file));
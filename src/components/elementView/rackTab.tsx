@@ -108,12 +108,18 @@ class RackTab extends React.Component<
 
       let config;
   if (!this.props.changePlan) {
-    config = headers;
+    config = {
+      headers: headers["headers"],
+      params: {
+        elevation: true,
+      },
+    };
   } else {
     config = {
       headers: headers["headers"],
       params: {
         change_plan: this.props.changePlan.id,
+        elevation: true,
       },
     };
   }
@@ -256,6 +262,7 @@ class RackTab extends React.Component<
       },
       params: {
         datacenter: datacenter.id,
+        elevation: true,
       },
     };
     }
@@ -266,7 +273,8 @@ class RackTab extends React.Component<
       },
       params: {
         datacenter: datacenter.id,
-        change_plan: this.props.changePlan.id
+        change_plan: this.props.changePlan.id,
+        elevation: true,
       },
     };
     }
@@ -51,6 +51,7 @@ interface AlertState {
   addedModels?: number;
   addedAssets?: number;
   addedNetwork?: number;
+  importId?: string;
   uploading: boolean;
   notify: boolean;
   assetUploadType: string;
@@ -210,6 +211,7 @@ export class BulkImport extends React.PureComponent<
               modelsModified={this.state.modifiedModels}
               modelsAdded={this.state.addedModels}
               modelsIgnored={this.state.ignoredModels}
+              importId={this.state.importId!}
               callback={(toast: Array<string>, messageType: Array<string>) => {
                 this.setState({
                   modelAlterationsIsOpen: false,
@@ -250,6 +252,7 @@ export class BulkImport extends React.PureComponent<
               modelsModified={this.state.modifiedAssets}
               modelsAdded={this.state.addedAssets}
               modelsIgnored={this.state.ignoredAssets}
+              importId={this.state.importId!}
               callback={(toast: Array<string>, messageType: Array<string>) => {
                 this.setState({
                   assetAlterationsIsOpen: false,
@@ -281,6 +284,7 @@ export class BulkImport extends React.PureComponent<
               modelsModified={this.state.modifiedNetwork}
               modelsAdded={this.state.addedNetwork}
               modelsIgnored={this.state.ignoredNetwork}
+              importId={this.state.importId!}
               callback={(toast: Array<string>, messageType: Array<string>) => {
                 this.setState({
                   networkAlterationsIsOpen: false,
@@ -348,6 +352,7 @@ export class BulkImport extends React.PureComponent<
                 modifiedModels: res.modifications,
                 ignoredModels: res.ignored,
                 addedModels: res.added,
+                importId: res.import_id,
               });
             } else if (uploadType === "assets") {
               this.setState({
@@ -356,6 +361,7 @@ export class BulkImport extends React.PureComponent<
                 modifiedAssets: res.modifications,
                 ignoredAssets: res.ignored,
                 addedAssets: res.added,
+                importId: res.import_id,
               });
             } else {
               this.setState({
@@ -364,6 +370,7 @@ export class BulkImport extends React.PureComponent<
                 modifiedNetwork: res.modifications,
                 ignoredNetwork: res.ignored,
                 addedNetwork: res.added,
+                importId: res.import_id,
               });
             }
           } else {
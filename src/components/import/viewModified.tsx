@@ -21,6 +21,7 @@ interface ModifierProps {
   modelsModified?: Array<any>;
   modelsIgnored?: number;
   modelsAdded?: number;
+  importId: string;
   callback: (toasts: Array<string>, types: Array<string>) => void;
   operation: string;
   markTablesStale(staleTables: TableType[]): void;
@@ -69,6 +70,7 @@ export interface ModelObjectMod {
 }
 
 export interface NetworkConnection {
+  id: string;
   source_port: string;
   destination_hostname: string;
   destination_port: string;
@@ -382,9 +384,10 @@ export class Modifier extends React.PureComponent<
                     modified.push(this.state.modifiedModels[i].model);
                 }
                 uploadModified(
-                  modified,
+                  modified.map((obj) => obj.id),
                   this.props.token,
-                  this.props.operation
+                  this.props.operation,
+                  this.props.importId
                 ).then(
                   (res) => {
                     console.log(this.props);
@@ -431,9 +434,10 @@ export class Modifier extends React.PureComponent<
                     modified.push(this.state.modifiedModels[i].model);
                 }
                 uploadModified(
-                  modified,
+                  modified.map((obj) => obj.id),
                   this.props.token,
-                  this.props.operation
+                  this.props.operation,
+                  this.props.importId
                 ).then(
                   (res) => {
                     let toasts: Array<string>;
@@ -475,9 +479,10 @@ export class Modifier extends React.PureComponent<
                     modified.push(this.state.modifiedModels[i].model);
                 }
                 uploadModified(
-                  modified,
+                  modified.map((obj) => obj.id),
                   this.props.token,
-                  this.props.operation
+                  this.props.operation,
+                  this.props.importId
                 ).then(
                   (res) => {
                     // this.addSuccessToast(
@@ -536,38 +541,34 @@ export class Modifier extends React.PureComponent<
     }
   }
 }
-// TODO make Array<ModelObjectMod any, assuming the POST header format is the same
 async function uploadModified(
-  modelList: Array<any>,
+  approvedIds: Array<string>,
   token: string,
-  operation: string
+  operation: string,
+  importId: string
 ) {
   console.log(API_ROOT + "api/" + operation + "/bulk-approve");
   console.log(token);
-  console.log(modelList);
+  console.log(approvedIds);
   const headers = {
     headers: {
       Authorization: "Token " + token,
     },
   };
+  const postBody = {
+    import_id: importId,
+    approved_modifications: approvedIds,
+  };
   if (operation === "network") {
     return await axios
-      .post(
-        API_ROOT + "api/assets/network-bulk-approve",
-        { approved_modifications: modelList },
-        headers
-      )
+      .post(API_ROOT + "api/assets/network-bulk-approve", postBody, headers)
       .then((res) => {
         const data = res.data;
         return data;
       });
   }
   return await axios
-    .post(
-      API_ROOT + "api/" + operation + "/bulk-approve",
-      { approved_modifications: modelList },
-      headers
-    )
+    .post(API_ROOT + "api/" + operation + "/bulk-approve", postBody, headers)
     .then((res) => {
       console.log(res.data);
       const data = res.data;
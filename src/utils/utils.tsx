@@ -233,9 +233,26 @@ export interface RackObject extends ElementObject {
   is_network_controlled?: boolean;
 }
 
+export interface RackSlotObject {
+  id: string;
+  related_asset_id: string | null;
+  is_change_plan: boolean;
+  asset_number: string;
+  hostname: string;
+  rack_position: string;
+  height: string;
+  model: {
+    vendor: string;
+    model_number: string;
+    model_type: string;
+  };
+  display_color: string;
+  num_blades: number;
+}
+
 export interface RackResponseObject {
   rack: RackObject;
-  assets: Array<AssetObject>;
+  assets: Array<RackSlotObject>;
 }
 
 export interface DatacenterObject extends ElementObject {